@@ -1,55 +1,160 @@
 import sqlite3
 from pydantic import TypeAdapter
 
+from app.core.sqlite import ThreadLocalConnections
 from app.models.geocode import SimpleLocation
 
+# Applied to every new connection. WAL lets readers run while a writer commits,
+# synchronous=NORMAL is durable in WAL mode and avoids an fsync per commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",  # KiB, i.e. 8 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Statements are kept as constants so each pooled connection's statement cache
+# prepares them once and reuses them afterwards. Locations are upserted rather
+# than replaced: REPLACE deletes the old row without firing the delete trigger
+# that keeps the spatial index in sync.
+INSERT_USER = "INSERT OR IGNORE INTO users (username) VALUES (?)"
+UPSERT_LOCATION = """
+    INSERT INTO locations (username, name, lat, lon) VALUES (?, ?, ?, ?)
+    ON CONFLICT (username) DO UPDATE SET name = excluded.name, lat = excluded.lat, lon = excluded.lon
+"""
+SELECT_LOCATION = "SELECT name, lat, lon FROM locations WHERE username = ?"
+SELECT_FIRST_LOCATIONS_PAGE = "SELECT username, name, lat, lon FROM locations ORDER BY username LIMIT ?"
+SELECT_LOCATIONS_PAGE = "SELECT username, name, lat, lon FROM locations WHERE username > ? ORDER BY username LIMIT ?"
+# The R*Tree stores 32-bit floats rounded outwards, so matches are re-checked on the exact columns
+SELECT_LOCATIONS_IN_BOX = """
+    SELECT l.username, l.name, l.lat, l.lon
+    FROM location_index AS i JOIN locations AS l ON l.id = i.id
+    WHERE i.max_lat >= ? AND i.min_lat <= ? AND i.max_lon >= ? AND i.min_lon <= ?
+      AND l.lat BETWEEN ? AND ? AND l.lon BETWEEN ? AND ?
+    ORDER BY l.username
+"""
+
+# PRAGMA user_version of the current schema; 0 is the original location_json table
+SCHEMA_VERSION = 1
+
+location_adapter = TypeAdapter(SimpleLocation)
+
+LocationRow = tuple[str, str, float, float]  # username, name, lat, lon
+
 
 class Database:
     def __init__(self, db_name="app.sqlite"):
         self.db_name = db_name
+        self._connections = ThreadLocalConnections(db_name, PRAGMAS)
 
     def connect(self):
-        return sqlite3.connect(self.db_name)
+        """Returns this thread's long-lived connection, opening it on first use."""
+        return self._connections.connect()
+
+    def close(self):
+        """Closes this thread's connection and releases those of other threads."""
+        self._connections.close()
 
     def setup_db(self):
-        with self.connect() as con:
+        con = self.connect()
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        with con:
+            con.execute("BEGIN")  # DDL does not open a transaction on its own
             con.execute("""
                 CREATE TABLE IF NOT EXISTS users (
                     username TEXT PRIMARY KEY
                 );
             """)
 
+            legacy = con.execute(
+                "SELECT 1 FROM pragma_table_info('locations') WHERE name = 'location_json'"
+            ).fetchone()
+            if legacy:
+                con.execute("ALTER TABLE locations RENAME TO locations_v0")
+
             con.execute("""
                 CREATE TABLE IF NOT EXISTS locations (
-                    username TEXT PRIMARY KEY,
-                    location_json TEXT NOT NULL,
+                    id INTEGER PRIMARY KEY,
+                    username TEXT NOT NULL UNIQUE,
+                    name TEXT NOT NULL,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
                     FOREIGN KEY (username) REFERENCES users(username)
                 );
             """)
-    def save_location(self, username: str, location: SimpleLocation):
-        location_json = location.model_dump_json()  # Pydantic → JSON string
+            con.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS location_index
+                USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+            """)
+            # keep the spatial index in step with the table
+            con.execute("""
+                CREATE TRIGGER IF NOT EXISTS locations_index_insert AFTER INSERT ON locations BEGIN
+                    INSERT INTO location_index VALUES (new.id, new.lat, new.lat, new.lon, new.lon);
+                END;
+            """)
+            con.execute("""
+                CREATE TRIGGER IF NOT EXISTS locations_index_update AFTER UPDATE OF lat, lon ON locations BEGIN
+                    UPDATE location_index SET min_lat = new.lat, max_lat = new.lat,
+                        min_lon = new.lon, max_lon = new.lon WHERE id = new.id;
+                END;
+            """)
+            con.execute("""
+                CREATE TRIGGER IF NOT EXISTS locations_index_delete AFTER DELETE ON locations BEGIN
+                    DELETE FROM location_index WHERE id = old.id;
+                END;
+            """)
 
-        with self.connect() as con:
-            con.execute(
-                "INSERT OR IGNORE INTO users (username) VALUES (?)",
-                (username,)
-            )
+            if legacy:
+                rows = con.execute("SELECT username, location_json FROM locations_v0").fetchall()
+                con.executemany(UPSERT_LOCATION, [
+                    (username, location.name, location.lat, location.lon)
+                    for username, location in ((u, location_adapter.validate_json(j)) for u, j in rows)
+                ])
+                con.execute("DROP TABLE locations_v0")
 
-            con.execute(
-                "INSERT OR REPLACE INTO locations (username, location_json) VALUES (?, ?)",
-                (username, location_json)
-            )
+            con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
-    def get_location(self, username: str) -> SimpleLocation | None:
-        adapter = TypeAdapter(SimpleLocation)
+    def save_location(self, username: str, location: SimpleLocation):
+        self.save_locations([(username, location)])
+
+    def save_locations(self, items: list[tuple[str, SimpleLocation]]):
+        """Saves several user locations in one transaction; later items win."""
         with self.connect() as con:
-            cur = con.execute(
-                "SELECT location_json FROM locations WHERE username = ?",
-                (username,)
-            )
+            con.executemany(INSERT_USER, [(username,) for username, _ in items])
+            con.executemany(UPSERT_LOCATION, [
+                (username, location.name, location.lat, location.lon) for username, location in items
+            ])
 
-            row = cur.fetchone()
+    def get_location(self, username: str) -> SimpleLocation | None:
+        con = self.connect()
+        row = con.execute(SELECT_LOCATION, (username,)).fetchone()
         if row is None:
             return None
 
-        return adapter.validate_json(row[0])
+        name, lat, lon = row
+        return SimpleLocation(name=name, lat=lat, lon=lon)
+
+    def export_locations_page(self, after: str | None, limit: int) -> list[LocationRow]:
+        """Location rows ordered by username, starting after the given one."""
+        con = self.connect()
+        if after is None:
+            return con.execute(SELECT_FIRST_LOCATIONS_PAGE, (limit,)).fetchall()
+        return con.execute(SELECT_LOCATIONS_PAGE, (after, limit)).fetchall()
+
+    def export_locations(self, usernames: list[str]) -> list[LocationRow]:
+        """Location rows for the given users that have a saved location."""
+        if not usernames:
+            return []
+        return self.connect().execute(
+            f"SELECT username, name, lat, lon FROM locations WHERE username IN ({','.join('?' * len(usernames))})",
+            usernames
+        ).fetchall()
+
+    def locations_in_box(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> list[LocationRow]:
+        """Location rows inside the bounding box (edges included), found through the R*Tree index."""
+        box = (min_lat, max_lat, min_lon, max_lon)
+        return self.connect().execute(SELECT_LOCATIONS_IN_BOX, (*box, *box)).fetchall()
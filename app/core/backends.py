@@ -0,0 +1,252 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import sqlite3
+import struct
+import time
+from collections import OrderedDict
+
+from .sqlite import ThreadLocalConnections
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """Byte store for cached upstream payloads, every entry with an absolute expiry (epoch seconds).
+
+    Expired entries are never returned; sweep() deletes them and enforces the
+    backend's size limit. start_sweeping() runs it periodically.
+    """
+
+    _sweeper: asyncio.Task | None = None
+
+    @abstractmethod
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[bytes, float]]:
+        """(content, expires_at) of every key with an unexpired entry."""
+
+    @abstractmethod
+    async def set_many(self, items: dict[str, bytes], expires_at: float):
+        """Stores every item with the same expiry, replacing existing entries."""
+
+    async def sweep(self) -> int:
+        """Deletes expired entries, then the soonest expiring ones while over the size limit."""
+        return 0
+
+    async def ping(self):
+        """Opens the connection to the store, raising if it is unreachable."""
+
+    def start_sweeping(self, interval: float):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_every(interval))
+
+    async def _sweep_every(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Cache sweep failed")
+
+    async def aclose(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+
+class MemoryBackend(CacheBackend):
+    """Per-process LRU holding at most max_bytes of content."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[bytes, float]]:
+        now = time.time()
+        found = {}
+        for key in keys:
+            item = self._data.get(key)
+            if item is not None and item[1] > now:
+                self._data.move_to_end(key)
+                found[key] = item
+        return found
+
+    async def set_many(self, items: dict[str, bytes], expires_at: float):
+        for key, content in items.items():
+            self._discard(key)
+            self._data[key] = (content, expires_at)
+            self.size += len(content)
+        while self.size > self.max_bytes and self._data:
+            self._discard(next(iter(self._data)))
+
+    def _discard(self, key: str):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= len(item[0])
+
+    async def sweep(self) -> int:
+        now = time.time()
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at <= now]
+        for key in expired:
+            self._discard(key)
+        return len(expired)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend(CacheBackend):
+    """One SQLite file in WAL mode, shared by every worker process on the host.
+
+    Each thread keeps its own connection. The size limit counts content bytes;
+    the database uses incremental auto-vacuum, so pages freed by a sweep are
+    returned to the file system.
+    """
+
+    PRAGMAS = (
+        "PRAGMA auto_vacuum=INCREMENTAL",  # only takes effect on a new, empty file
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+    )
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connections = ThreadLocalConnections(path, self.PRAGMAS, self._create_schema)
+
+    @staticmethod
+    def _create_schema(con: sqlite3.Connection):
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            );
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS cache_entries_expires_at ON cache_entries (expires_at)")
+
+    def connect(self) -> sqlite3.Connection:
+        return self._connections.connect()
+
+    def _get_many(self, keys: list[str]) -> dict[str, tuple[bytes, float]]:
+        if not keys:
+            return {}
+        rows = self.connect().execute(
+            f"SELECT key, content, expires_at FROM cache_entries "
+            f"WHERE key IN ({','.join('?' * len(keys))}) AND expires_at > ?",
+            (*keys, time.time())
+        ).fetchall()
+        return {key: (content, expires_at) for key, content, expires_at in rows}
+
+    def _set_many(self, items: dict[str, bytes], expires_at: float):
+        with self.connect() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO cache_entries (key, content, expires_at, size) VALUES (?, ?, ?, ?)",
+                [(key, content, expires_at, len(content)) for key, content in items.items()]
+            )
+
+    def _sweep(self) -> int:
+        con = self.connect()
+        with con:
+            removed = con.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)).rowcount
+            excess = con.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0] - self.max_bytes
+            if excess > 0:
+                # the shortest prefix, by expiry, whose sizes add up to the excess
+                removed += con.execute("""
+                    DELETE FROM cache_entries WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, size, SUM(size) OVER (ORDER BY expires_at, key) AS running
+                            FROM cache_entries
+                        ) WHERE running - size < ?
+                    )
+                """, (excess,)).rowcount
+        if removed:
+            # execute() steps the pragma once, freeing a single page; executescript runs it to completion
+            con.executescript("PRAGMA incremental_vacuum;")
+        return removed
+
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[bytes, float]]:
+        return await asyncio.to_thread(self._get_many, keys)
+
+    async def set_many(self, items: dict[str, bytes], expires_at: float):
+        await asyncio.to_thread(self._set_many, items, expires_at)
+
+    async def sweep(self) -> int:
+        return await asyncio.to_thread(self._sweep)
+
+    async def ping(self):
+        await asyncio.to_thread(self.connect)
+
+    async def aclose(self):
+        await super().aclose()
+        self._connections.close()
+
+
+class RedisBackend(CacheBackend):
+    """Entries in a Redis-protocol server, shared by every worker that can reach it.
+
+    Redis expires keys itself and bounds its memory with maxmemory and an
+    eviction policy, so sweep() has nothing to do. Values are the expiry as a
+    little-endian double followed by the content. Requires the redis package.
+    """
+
+    _EXPIRY = struct.Struct("<d")
+
+    def __init__(self, url: str, prefix: str = "openmeteo:", client=None):
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis.asyncio  # optional dependency, only needed for this backend
+            self._client = redis.asyncio.Redis.from_url(self.url)
+        return self._client
+
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[bytes, float]]:
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        for key, value in zip(keys, await self.client.mget([self.prefix + key for key in keys])):
+            if value is not None:
+                expires_at = self._EXPIRY.unpack_from(value)[0]
+                if expires_at > now:
+                    found[key] = (value[self._EXPIRY.size:], expires_at)
+        return found
+
+    async def set_many(self, items: dict[str, bytes], expires_at: float):
+        ttl_ms = int((expires_at - time.time()) * 1000)
+        if ttl_ms <= 0 or not items:
+            return
+        header = self._EXPIRY.pack(expires_at)
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, content in items.items():
+                pipe.set(self.prefix + key, header + content, px=ttl_ms)
+            await pipe.execute()
+
+    async def ping(self):
+        await self.client.ping()
+
+    async def aclose(self):
+        await super().aclose()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_backend(kind: str, *, path: str, url: str, max_bytes: int) -> CacheBackend:
+    if kind == "memory":
+        return MemoryBackend(max_bytes)
+    if kind == "sqlite":
+        return SQLiteBackend(path, max_bytes)
+    if kind == "redis":
+        return RedisBackend(url)
+    raise ValueError(f"Unknown cache backend: {kind}")
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from pydantic import BaseModel
+
+from .compression import compress
+from .packing import packb
+
+
+class TTLCache:
+    """Bounded in-memory LRU cache whose entries expire after a TTL.
+
+    With keep_stale, expired entries stay around that many more seconds; get()
+    no longer returns them, but get_stale() does. With sizeof, the cache also
+    holds at most max_bytes as measured by it; values are measured again on
+    every read, so one that grew since it was stored counts from then on.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, keep_stale: float = 0,
+                 max_bytes: float = math.inf, sizeof: Callable[[Any], int] | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.keep_stale = keep_stale
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any, int]] = OrderedDict()
+
+    def get(self, key: Hashable, default=None):
+        item = self._data.get(key)
+        now = time.time()
+        if item is None or item[0] <= now:
+            if item is not None and item[0] + self.keep_stale <= now:
+                self._discard(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        self._measure(key, item)
+        return item[1]
+
+    def get_stale(self, key: Hashable, max_stale: float, default=None):
+        """Returns the value even if expired, as long as it expired less than max_stale seconds ago."""
+        item = self._data.get(key)
+        if item is None or item[0] + min(max_stale, self.keep_stale) <= time.time():
+            return default
+        self._measure(key, item)
+        return item[1]
+
+    def set(self, key: Hashable, value, expires_at: float | None = None):
+        """Stores value until expires_at (epoch seconds), or for the default TTL."""
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+        self._discard(key)
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        self._data[key] = (expires_at, value, size)
+        self.size += size
+        self._evict()
+
+    def pop(self, key: Hashable, default=None):
+        item = self._discard(key)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+
+    def _measure(self, key: Hashable, item: tuple[float, Any, int]):
+        if self.sizeof is None:
+            return
+        size = self.sizeof(item[1])
+        if size != item[2]:
+            self._data[key] = (item[0], item[1], size)
+            self.size += size - item[2]
+            self._evict()
+
+    def _evict(self):
+        while self._data and (len(self._data) > self.maxsize or self.size > self.max_bytes):
+            self._discard(next(iter(self._data)))
+
+    def _discard(self, key: Hashable):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item[2]
+        return item
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CachedResponse:
+    """A mapped response, serialized to JSON once and shared by every hit.
+
+    Only the body is kept, not the model: for a 7-day hourly forecast the
+    model takes several times the memory of its body. `model` parses it back
+    for the few callers that need objects. The strong ETag and the MessagePack
+    and compressed variants of the body are derived lazily and cached with it,
+    so repeated hits neither rehash nor recompress.
+    """
+    __slots__ = ("model_type", "expires_at", "_body", "_packed", "_etag", "_encoded")
+
+    def __init__(self, model: BaseModel, expires_at: float = math.inf):
+        self.model_type = type(model)
+        self.expires_at = expires_at
+        # fields a mapper did not set, like unselected forecast variables, are left out
+        self._body = model.model_dump_json(exclude_unset=True).encode()
+        self._packed: bytes | None = None
+        self._etag: str | None = None
+        self._encoded: dict[str, bytes] = {}
+
+    @property
+    def stale(self) -> bool:
+        """True once the upstream data behind this response has expired."""
+        return self.expires_at <= time.time()
+
+    @property
+    def max_age(self) -> int | None:
+        """Seconds until the upstream data expires, for Cache-Control; None if it never does."""
+        if math.isinf(self.expires_at):
+            return None
+        return max(0, int(self.expires_at - time.time()))
+
+    @property
+    def body(self) -> bytes:
+        return self._body
+
+    @property
+    def model(self) -> BaseModel:
+        """The response model, parsed again from the body on every access."""
+        return self.model_type.model_validate_json(self._body)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the body and every variant derived from it so far."""
+        return len(self._body) + len(self._packed or b"") + sum(map(len, self._encoded.values()))
+
+    @property
+    def packed(self) -> bytes:
+        """The body as MessagePack, floats as float32; needs the msgpack package."""
+        if self._packed is None:
+            self._packed = packb(json.loads(self._body), single_float=True)
+        return self._packed
+
+    @property
+    def etag(self) -> str:
+        """Strong entity tag of the uncompressed body, quoted; equal bodies share it."""
+        if self._etag is None:
+            self._etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+        return self._etag
+
+    def encoded(self, coding: str) -> bytes:
+        """The body compressed with a content coding from app.core.compression.CODINGS."""
+        data = self._encoded.get(coding)
+        if data is None:
+            data = self._encoded[coding] = compress(self.body, coding)
+        return data
@@ -11,3 +11,8 @@ class ExternalApiError(AppError):
 class MappingError(AppError):
     """Raised when mapping from external or internal data fails."""
     pass
+
+
+class RateLimitExceededError(AppError):
+    """Raised when a request is shed because an upstream rate budget is exhausted."""
+    pass
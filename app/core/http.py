@@ -0,0 +1,32 @@
+import httpx
+
+
+class SharedHttpClient:
+    """Holds the keep-alive httpx.AsyncClient that all calls to one upstream share.
+
+    The app lifespan installs a client at startup and closes it at shutdown.
+    Outside the lifespan (scripts, direct service calls) one is created on
+    first use. `client_kwargs` are passed to every client created.
+    """
+
+    def __init__(self, **client_kwargs):
+        self.client_kwargs = client_kwargs
+        self.client: httpx.AsyncClient | None = None
+
+    def create(self, transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+        """A new client; pass a transport to stub the upstream in tests."""
+        return httpx.AsyncClient(transport=transport, **self.client_kwargs)
+
+    def set(self, client: httpx.AsyncClient | None):
+        """Installs the shared client; the app lifespan calls this at startup."""
+        self.client = client
+
+    def get(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.set(self.create())
+        return self.client
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
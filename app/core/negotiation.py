@@ -0,0 +1,59 @@
+def parse_accept(accept: str) -> list[tuple[str, float]]:
+    """(media range, q) pairs of an Accept header; malformed q-values count as 1."""
+    ranges = []
+    for part in accept.split(","):
+        media_range, *params = (item.strip() for item in part.split(";"))
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    pass
+        ranges.append((media_range.lower(), q))
+    return ranges
+
+
+def negotiate(accept: str | None, offers: list[str]) -> str:
+    """The offered media type the client accepts most, preferring earlier offers on ties.
+
+    The most specific matching range decides the q of an offer (type/subtype over
+    type/* over */*). Without an Accept header, or if nothing offered is acceptable,
+    the first offer is returned, so clients that send nothing keep getting JSON.
+    """
+    if not accept:
+        return offers[0]
+    ranges = parse_accept(accept)
+    best, best_q = offers[0], 0.0
+    for offer in offers:
+        candidates = (offer, offer.split("/")[0] + "/*", "*/*")
+        q = next((q for candidate in candidates for media_range, q in ranges if media_range == candidate), 0.0)
+        if q > best_q:
+            best, best_q = offer, q
+    return best
+
+
+def negotiate_coding(accept_encoding: str | None, codings: tuple[str, ...]) -> str | None:
+    """The offered content coding the client accepts most, preferring earlier offers on ties;
+    None for the identity coding, also when nothing offered is acceptable."""
+    if not accept_encoding:
+        return None
+    ranges = parse_accept(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in codings:
+        q = next((q for candidate in (coding, "*") for name, q in ranges if name == candidate), 0.0)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an entity tag, as a 304 requires."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
@@ -0,0 +1,17 @@
+try:
+    import msgpack  # optional dependency; without it every route answers JSON only
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def packb(obj, single_float: bool = False) -> bytes:
+    """MessagePack of plain data. With single_float every float is packed as float32,
+    so a numeric field has the same wire type in every response, whatever its value."""
+    return msgpack.packb(obj, use_single_float=single_float)
+
+
+def pack_array_header(n: int) -> bytes:
+    """Header of an n-element array; the packed elements follow it back to back."""
+    return msgpack.Packer().pack_array_header(n)
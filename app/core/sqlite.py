@@ -0,0 +1,43 @@
+import sqlite3
+import threading
+from typing import Callable, Iterable
+
+
+class ThreadLocalConnections:
+    """Long-lived connections to one SQLite file, one per thread.
+
+    A thread's connection is opened on its first connect(): the pragmas are
+    applied, then `setup` (e.g. CREATE TABLE IF NOT EXISTS) runs on it in a
+    transaction.
+    """
+
+    def __init__(self, path: str, pragmas: Iterable[str] = (),
+                 setup: Callable[[sqlite3.Connection], None] | None = None):
+        self.path = path
+        self.pragmas = tuple(pragmas)
+        self.setup = setup
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        """Returns this thread's connection, opening it on first use."""
+        con = getattr(self._local, "connection", None)
+        if con is None:
+            con = sqlite3.connect(self.path)
+            for pragma in self.pragmas:
+                con.execute(pragma)
+            if self.setup is not None:
+                with con:
+                    self.setup(con)
+            self._local.connection = con
+        return con
+
+    def close(self):
+        """Closes this thread's connection and releases those of other threads.
+
+        SQLite connections can only be closed by the thread that opened them;
+        dropping the thread-local store frees the others, which closes them.
+        """
+        con = getattr(self._local, "connection", None)
+        if con is not None:
+            con.close()
+        self._local = threading.local()
@@ -1,54 +1,270 @@
-from fastapi import FastAPI, Query
-from httpx import Request
-from starlette.responses import JSONResponse
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request
+import json
+from typing import Annotated, AsyncIterator
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from fastapi import Body
-from app.core.errors import MappingError, ExternalApiError
+from fastapi.encoders import jsonable_encoder
+from app.core.errors import MappingError, ExternalApiError, RateLimitExceededError
 from app.models.geocode import LocationRequest, SimpleLocation, UserLocation, User
+from app.models.weather import HourlyForecastQuery, DailyForecastQuery, HourlyForecastRequest, DailyForecastRequest
+from app.services import geocode, openmeteo
 from app.services.geocode import search_location
 import sqlite3
-from app.Database import Database
-from app.services.weather import get_overview, get_hourly_data, get_daily_data
+from app.Database import Database, LocationRow
+from app.services.locations import LocationStore
+from app.services.prewarm import PrewarmScheduler
+from app.services.stream import ForecastStream
+from app.services.weather import forecast_cache, get_overview_response, get_hourly_response, get_daily_response
+from app.services.weather import get_overview_responses, get_hourly_responses, get_daily_responses
+from app.services.weather import get_hourly_columns_response, get_daily_columns_response
+from app.services.config import BATCH_MAX_LOCATIONS, LOCATION_BULK_MAX, PREWARM_ENABLED, FORECAST_CACHE_SWEEP_INTERVAL
+from app.services.config import RESPONSE_COMPRESS_MIN_BYTES
+from app.core.cache import CachedResponse
+from app.core.compression import CODINGS
+from app.core.packing import MSGPACK_MEDIA_TYPE, msgpack, packb, pack_array_header
+from app.core.negotiation import negotiate, negotiate_coding, etag_matches
 
-app = FastAPI(title="Weather & Location Microservice")
+logger = logging.getLogger(__name__)
+
+# Created at import without any I/O; connections, clients and tasks belong to the lifespan
 db = Database()
+locations = LocationStore(db)
+prewarm = PrewarmScheduler(locations)
+forecast_stream = ForecastStream()
+
+async def warm_up(app: FastAPI):
+    """Opens what the first requests would otherwise wait for, then reports ready."""
+    try:
+        await forecast_cache.ping()
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        app.state.readiness = {"status": "failed", "message": str(e)}
+    else:
+        app.state.readiness = {"status": "ready"}
 
-@app.on_event("startup")
-def setup_db_at_startup():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.readiness = {"status": "starting"}
     db.setup_db()  # creates tables once at startup
+    locations.open()  # closed by the shutdown of a previous lifespan
+    geocode.set_http_client(geocode.create_http_client())
+    openmeteo.set_http_client(openmeteo.create_http_client())
+    forecast_cache.start_sweeping(FORECAST_CACHE_SWEEP_INTERVAL)
+    if PREWARM_ENABLED:
+        prewarm.start()
+    forecast_stream.start()
+    warming = asyncio.create_task(warm_up(app))
+    yield
+    warming.cancel()
+    app.state.readiness = {"status": "stopping"}
+    await forecast_stream.stop()
+    await prewarm.stop()
+    await geocode.close_http_client()
+    geocode.geocode_cache.close()
+    await openmeteo.close_http_client()
+    await forecast_cache.aclose()
+    await locations.aclose()
+
+app = FastAPI(title="Weather & Location Microservice", lifespan=lifespan)
 
 @app.get("/weather/hello")
 async def root():
     return {"message": "Hello, Weather Microservice!"}
 
+# Readiness probe: 200 once the worker is warm, 503 while starting, stopping or if warm-up failed.
+# The body also carries this worker's location cache size, hits and misses.
+@app.get("/weather/ready")
+async def ready_route():
+    readiness = getattr(app.state, "readiness", {"status": "starting"})
+    return JSONResponse(status_code=200 if readiness["status"] == "ready" else 503,
+                        content={**readiness, "location_cache": locations.stats})
+
+STALE_HEADER = "X-Forecast-Stale"
+
+def stale_headers(entries: list[CachedResponse]) -> dict[str, str]:
+    # marks responses built from a forecast past its expiry (revalidating, or upstream failed)
+    return {STALE_HEADER: "true"} if any(entry.stale for entry in entries) else {}
+
+# Every weather and location route answers JSON by default and MessagePack to clients
+# preferring MSGPACK_MEDIA_TYPE (when the msgpack package is installed)
+JSON_MEDIA_TYPE = "application/json"
+MEDIA_TYPES = [JSON_MEDIA_TYPE, *([MSGPACK_MEDIA_TYPE] if msgpack is not None else [])]
+VARY = {"Vary": "Accept"}
+
+def cached_response(request: Request, entry: CachedResponse, media_type: str = JSON_MEDIA_TYPE) -> Response:
+    """The cached body with its ETag and a max-age following the upstream expiry.
+
+    JSON bodies from RESPONSE_COMPRESS_MIN_BYTES on are sent compressed if the client accepts
+    it, with the bytes compressed once per cache entry. A GET whose If-None-Match holds the
+    ETag gets 304 Not Modified.
+    """
+    # bodies are serialized once per cache entry, hits skip FastAPI's encoder
+    packed = media_type.endswith("msgpack")
+    body = entry.packed if packed else entry.body
+    coding = None
+    if not packed and len(body) >= RESPONSE_COMPRESS_MIN_BYTES:  # float32 MessagePack barely compresses
+        coding = negotiate_coding(request.headers.get("accept-encoding"), CODINGS)
+    # a strong ETag differs per representation
+    suffix = "-msgpack" if packed else f"-{coding}" if coding else ""
+    etag = f'{entry.etag[:-1]}{suffix}"' if suffix else entry.etag
+    headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding", **stale_headers([entry])}
+    if entry.max_age is not None:
+        headers["Cache-Control"] = f"max-age={entry.max_age}"
+    if request.method in ("GET", "HEAD") and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if coding is None:
+        return Response(content=body, media_type=media_type, headers=headers)
+    return Response(content=entry.encoded(coding), media_type=media_type, headers={**headers, "Content-Encoding": coding})
+
+def cached_response_list(request: Request, entries: list[CachedResponse]) -> Response:
+    headers = {**VARY, **stale_headers(entries)}
+    if negotiate(request.headers.get("accept"), MEDIA_TYPES) == MSGPACK_MEDIA_TYPE:
+        content = pack_array_header(len(entries)) + b"".join(entry.packed for entry in entries)
+        return Response(content=content, media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+    return Response(content=b"[" + b",".join(entry.body for entry in entries) + b"]", media_type=JSON_MEDIA_TYPE,
+                    headers=headers)
+
+def negotiated(request: Request, content) -> Response:
+    # location data keeps double precision floats in MessagePack, coordinates need them
+    content = jsonable_encoder(content)
+    if negotiate(request.headers.get("accept"), MEDIA_TYPES) == MSGPACK_MEDIA_TYPE:
+        return Response(content=packb(content), media_type=MSGPACK_MEDIA_TYPE, headers=VARY)
+    return JSONResponse(content=content, headers=VARY)
+
+def coordinates_of(locations: list[SimpleLocation]) -> list[tuple[float, float]]:
+    return [(location.lat, location.lon) for location in locations]
+
+# Weather routes take the location as a JSON body (POST) or as query parameters (GET);
+# GET responses can be revalidated with If-None-Match
 @app.post("/weather/overview")
-async def get_overview_route(location: SimpleLocation = Body(...)):
-    return await get_overview(location.lat, location.lon)
+async def get_overview_route(request: Request, location: SimpleLocation = Body(...)):
+    media_type = negotiate(request.headers.get("accept"), MEDIA_TYPES)
+    return cached_response(request, await get_overview_response(location.lat, location.lon), media_type)
+
+@app.get("/weather/overview")
+async def get_overview_query_route(request: Request, lat: float, lon: float):
+    media_type = negotiate(request.headers.get("accept"), MEDIA_TYPES)
+    return cached_response(request, await get_overview_response(lat, lon), media_type)
+
+# Server-sent events instead of polling: the current overview and hourly forecast of the
+# location's grid cell, then an event each time either changes (see ForecastStream)
+@app.get("/weather/overview/stream")
+async def overview_stream_route(lat: float, lon: float):
+    # cached before the stream starts, so upstream errors still get an error response
+    await get_overview_response(lat, lon)
+    await get_hourly_response(lat, lon)
+    return StreamingResponse(forecast_stream.events(lat, lon), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Forecasts come as nested objects by default, or as parallel arrays per variable
+# (ColumnarHourlyWeatherData / ColumnarDailyWeatherData) for clients that accept a columnar media type
+COLUMNAR_MEDIA_TYPE = "application/vnd.voltcast.columnar+json"
+COLUMNAR_MSGPACK_MEDIA_TYPE = "application/vnd.voltcast.columnar+msgpack"
+FORECAST_MEDIA_TYPES = [
+    JSON_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE,
+    *([MSGPACK_MEDIA_TYPE, COLUMNAR_MSGPACK_MEDIA_TYPE] if msgpack is not None else []),
+]
+
+async def hourly_forecast(request: Request, query: HourlyForecastQuery) -> Response:
+    media_type = negotiate(request.headers.get("accept"), FORECAST_MEDIA_TYPES)
+    if media_type in (COLUMNAR_MEDIA_TYPE, COLUMNAR_MSGPACK_MEDIA_TYPE):
+        entry = await get_hourly_columns_response(query.lat, query.lon, query.hours, query.variables)
+    else:
+        entry = await get_hourly_response(query.lat, query.lon, query.hours, query.variables)
+    return cached_response(request, entry, media_type)
 
+async def daily_forecast(request: Request, query: DailyForecastQuery) -> Response:
+    media_type = negotiate(request.headers.get("accept"), FORECAST_MEDIA_TYPES)
+    if media_type in (COLUMNAR_MEDIA_TYPE, COLUMNAR_MSGPACK_MEDIA_TYPE):
+        entry = await get_daily_columns_response(query.lat, query.lon, query.days, query.variables)
+    else:
+        entry = await get_daily_response(query.lat, query.lon, query.days, query.variables)
+    return cached_response(request, entry, media_type)
+
+# Optional "hours"/"days" and "variables" fields narrow the forecast to what the client renders
 @app.post("/weather/forecast/hourly")
-async def get_hourly_route(location: SimpleLocation = Body(...)):
-    return await get_hourly_data(location.lat, location.lon)
+async def get_hourly_route(request: Request, location: HourlyForecastRequest = Body(...)):
+    return await hourly_forecast(request, location)
+
+@app.get("/weather/forecast/hourly")
+async def get_hourly_query_route(request: Request, query: Annotated[HourlyForecastQuery, Query()]):
+    return await hourly_forecast(request, query)
 
 @app.post("/weather/forecast/daily")
-async def get_daily_route(location: SimpleLocation = Body(...)):
-    return await get_daily_data(location.lat, location.lon)
+async def get_daily_route(request: Request, location: DailyForecastRequest = Body(...)):
+    return await daily_forecast(request, location)
+
+@app.get("/weather/forecast/daily")
+async def get_daily_query_route(request: Request, query: Annotated[DailyForecastQuery, Query()]):
+    return await daily_forecast(request, query)
+
+# Batch variants answer a list of locations in as few upstream calls as possible,
+# in request order
+@app.post("/weather/overview/batch")
+async def get_overview_batch_route(request: Request, locations: list[SimpleLocation] = Body(..., max_length=BATCH_MAX_LOCATIONS)):
+    return cached_response_list(request, await get_overview_responses(coordinates_of(locations)))
+
+@app.post("/weather/forecast/hourly/batch")
+async def get_hourly_batch_route(request: Request, locations: list[SimpleLocation] = Body(..., max_length=BATCH_MAX_LOCATIONS)):
+    return cached_response_list(request, await get_hourly_responses(coordinates_of(locations)))
+
+@app.post("/weather/forecast/daily/batch")
+async def get_daily_batch_route(request: Request, locations: list[SimpleLocation] = Body(..., max_length=BATCH_MAX_LOCATIONS)):
+    return cached_response_list(request, await get_daily_responses(coordinates_of(locations)))
 
 @app.post("/weather/location/search")
-async def search_location_route(data: LocationRequest = Body(...)):
+async def search_location_route(request: Request, data: LocationRequest = Body(...)):
     result = await search_location(data)
     #logger.info(f"Sending result to client: {result}")
-    return result
+    return negotiated(request, result)
 
 @app.put("/weather/location")
-async def set_location_route(data: UserLocation = Body(...)):
-    db.save_location(data.username, data.location)
-    return {"status": "success", "location": data.location.model_dump()}
+async def set_location_route(request: Request, data: UserLocation = Body(...)):
+    await locations.save(data.username, data.location)
+    return negotiated(request, {"status": "success", "location": data.location.model_dump()})
 
 @app.post("/weather/location")
-async def get_location_route(data: User = Body(...)):
-    location = db.get_location(data.username)
+async def get_location_route(request: Request, data: User = Body(...)):
+    location = await locations.get(data.username)
     if location is None:
-        return {"status": "error", "message": "no location found"}
-    return {"status": "success", "location": location.model_dump()}
+        return negotiated(request, {"status": "error", "message": "no location found"})
+    return negotiated(request, {"status": "success", "location": location.model_dump()})
+
+async def user_locations_json(rows: AsyncIterator[LocationRow]) -> AsyncIterator[bytes]:
+    # streams a JSON array of UserLocation objects straight from the stored columns
+    separator = b"["
+    async for username, name, lat, lon in rows:
+        user_location = {"username": username, "location": {"name": name, "lat": lat, "lon": lon}}
+        yield separator + json.dumps(user_location, separators=(",", ":")).encode()
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+async def user_locations_msgpack(rows: AsyncIterator[LocationRow]) -> AsyncIterator[bytes]:
+    # the count is not known up front, so this is a stream of UserLocation maps back to back
+    # rather than one array; msgpack.Unpacker reads them one by one
+    async for username, name, lat, lon in rows:
+        yield packb({"username": username, "location": {"name": name, "lat": lat, "lon": lon}})
+
+def user_locations_response(request: Request, rows: AsyncIterator[LocationRow]) -> StreamingResponse:
+    if negotiate(request.headers.get("accept"), MEDIA_TYPES) == MSGPACK_MEDIA_TYPE:
+        return StreamingResponse(user_locations_msgpack(rows), media_type=MSGPACK_MEDIA_TYPE, headers=VARY)
+    return StreamingResponse(user_locations_json(rows), media_type=JSON_MEDIA_TYPE, headers=VARY)
+
+@app.put("/weather/location/bulk")
+async def set_locations_bulk_route(request: Request, data: list[UserLocation] = Body(..., max_length=LOCATION_BULK_MAX)):
+    await locations.save_many([(item.username, item.location) for item in data])
+    return negotiated(request, {"status": "success", "count": len(data)})
+
+@app.post("/weather/location/bulk")
+async def get_locations_bulk_route(request: Request, users: list[User] = Body(...)):
+    return user_locations_response(request, locations.export([user.username for user in users]))
+
+@app.get("/weather/location/export")
+async def export_locations_route(request: Request):
+    return user_locations_response(request, locations.export())
 
 # Error handling:
 @app.exception_handler(MappingError)
@@ -65,6 +281,14 @@ async def mapping_error_handler_external(request: Request, exc: ExternalApiError
         content={"error": "ExternalApiError", "message": str(exc)}
     )
 
+@app.exception_handler(RateLimitExceededError)
+async def rate_limit_error_handler(request: Request, exc: RateLimitExceededError):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "1"},
+        content={"error": "RateLimitExceededError", "message": str(exc)}
+    )
+
 @app.exception_handler(sqlite3.DatabaseError)
 async def db_exception_handler(request: Request, exc: sqlite3.DatabaseError):
     return JSONResponse(
@@ -1,8 +1,17 @@
-import pandas as pd
-import pytz
+import time
+
+import numpy as np
 
 from app.models.weather import *
-from app.models.weatherCodes import map_weather_code
+from app.models.weatherCodes import map_weather_code, map_weather_codes
+
+# Variable order of the forecast bundle request; Variables(i) follows these lists
+CURRENT_VARIABLES = ["weather_code", "temperature_2m"]
+HOURLY_VARIABLES = ["weather_code", "temperature_2m", "rain", "snowfall", "cloud_cover", "wind_speed_10m"]
+DAILY_VARIABLES = [
+    "weather_code", "temperature_2m_mean", "rain_sum", "snowfall_sum", "wind_gusts_10m_max",
+    "temperature_2m_min", "temperature_2m_max",
+]
 
 def map_openmeteo_overview(response) -> WeatherOverview:
     current = response.Current()
@@ -20,103 +29,169 @@ def map_openmeteo_overview(response) -> WeatherOverview:
         today=TodayWeatherOverview(
             description=map_weather_code(todayCode),
             code=todayCode,
-            temperature_min=float(daily.Variables(1).ValuesAsNumpy()[0]),
-            temperature_max=float(daily.Variables(2).ValuesAsNumpy()[0])
+            temperature_min=float(daily.Variables(DAILY_VARIABLES.index("temperature_2m_min")).ValuesAsNumpy()[0]),
+            temperature_max=float(daily.Variables(DAILY_VARIABLES.index("temperature_2m_max")).ValuesAsNumpy()[0])
         )
     )
 
-def map_openmeteo_hourly_forecast(response) -> HourlyWeatherData:
-    utc_offset_seconds = response.UtcOffsetSeconds()
-    local_tz = pytz.FixedOffset(utc_offset_seconds / 60)  # pytz expects minutes
-
-    hourly = response.Hourly()
-    hourly_weather_code = hourly.Variables(0).ValuesAsNumpy()
-    hourly_temperature_2m = hourly.Variables(1).ValuesAsNumpy()
-    hourly_rain = hourly.Variables(2).ValuesAsNumpy()
-    hourly_snowfall = hourly.Variables(3).ValuesAsNumpy()
-    hourly_cloud_cover = hourly.Variables(4).ValuesAsNumpy()
-    hourly_wind_speed_10m = hourly.Variables(5).ValuesAsNumpy()
-
-    hourly_data = pd.date_range(
-        start=pd.to_datetime(hourly.Time(), unit="s", utc=True).tz_convert(local_tz),
-        end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True).tz_convert(local_tz),
-        freq=pd.Timedelta(seconds=hourly.Interval()),
-        inclusive="left"
-    )
-    daily: list[DailyHourWeatherData] = []
-    current_day = None
-    current_day_hours: list[HourWeatherData] = []
-
-    for i, timestamp in enumerate(hourly_data):
-        day_str = timestamp.date().isoformat()
-        hourEntry = HourWeatherData(
-            timestamp=str(timestamp),
-            description=map_weather_code(int(hourly_weather_code[i])),
-            code=int(hourly_weather_code[i]),
-            temperature=float(hourly_temperature_2m[i]),
-            rain=float(hourly_rain[i]),
-            snowfall=float(hourly_snowfall[i]), # Maybe unit conversion
-            cloud_cover=int(hourly_cloud_cover[i]),
-            wind_speed=float(hourly_wind_speed_10m[i]),
-        )
-        if current_day is None:
-            current_day = day_str
-            current_day_hours.append(hourEntry)
-        elif day_str == current_day:
-            current_day_hours.append(hourEntry)
-        else:
-            daily.append(
-                DailyHourWeatherData(
-                    timestamp=str(current_day),
-                    hours=current_day_hours
-                )
-            )
-            current_day = day_str
-            current_day_hours = [hourEntry]
-
-    if current_day_hours:
-        daily.append(
-            DailyHourWeatherData(
-                timestamp=str(current_day),
-                hours=current_day_hours
-            )
-        )
-    return HourlyWeatherData(
-        forecast=daily
+HOUR_VARIABLES = ("description", "code", "temperature", "rain", "snowfall", "cloud_cover", "wind_speed")
+DAY_VARIABLES = ("description", "code", "temperature", "rain", "snowfall", "wind_gust_max")
+# Response field -> index into HOURLY_VARIABLES / DAILY_VARIABLES of the numeric variables
+HOUR_COLUMNS = {"temperature": 1, "rain": 2, "snowfall": 3, "cloud_cover": 4, "wind_speed": 5}
+DAY_COLUMNS = {"temperature": 1, "rain": 2, "snowfall": 3, "wind_gust_max": 4}
+
+def _local_times(section, utc_offset_seconds: int) -> np.ndarray:
+    """Time axis of a VariablesWithTime section as local wall-clock datetime64[s].
+
+    Open-Meteo reports a fixed UTC offset per response, so shifting the UTC axis
+    by it gives the same wall-clock times as converting to a fixed-offset zone.
+    """
+    offset = np.timedelta64(utc_offset_seconds, "s")
+    return np.arange(
+        np.datetime64(section.Time(), "s") + offset,
+        np.datetime64(section.TimeEnd(), "s") + offset,
+        np.timedelta64(section.Interval(), "s"),
     )
 
-def map_openmeteo_daily_forecast(response) -> DailyWeatherData:
+def _window(section, count: int | None, now: float | None) -> slice:
+    """The `count` entries from the one containing `now` on, or the whole axis if count is None."""
+    if count is None:
+        return slice(None)
+    now = time.time() if now is None else now
+    start = max(0, int((now - section.Time()) // section.Interval()))
+    return slice(start, start + count)
+
+def _format_timestamps(local_times: np.ndarray, utc_offset_seconds: int) -> list[str]:
+    """Formats like str() of a tz-aware pandas Timestamp, e.g. "2021-01-01 00:00:00+01:00", in one pass."""
+    sign = "-" if utc_offset_seconds < 0 else "+"
+    hours, minutes = divmod(abs(utc_offset_seconds) // 60, 60)
+    offset = f"{sign}{hours:02d}:{minutes:02d}"
+    return [t.replace("T", " ") + offset for t in np.datetime_as_string(local_times, unit="s").tolist()]
+
+def _values(section, index: int, window: slice, n: int) -> np.ndarray:
+    return np.asarray(section.Variables(index).ValuesAsNumpy(), dtype=np.float64)[:n][window]
+
+def _int_column(section, index: int, window: slice, n: int) -> np.ndarray:
+    values = _values(section, index, window, n)
+    if not np.isfinite(values).all():
+        raise ValueError(f"Unexpected weather code: {values[~np.isfinite(values)][0]}")
+    return np.trunc(values).astype(np.int64)  # same truncation as int()
+
+def _columns(section, window: slice, n: int, variables, numeric: dict[str, int], truncated=()) -> dict[str, list]:
+    """The selected variables of a section as one list each, in response field order."""
+    columns = {}
+    if "description" in variables or "code" in variables:
+        codes = _int_column(section, 0, window, n)
+        if "description" in variables:
+            columns["description"] = map_weather_codes(codes)
+        if "code" in variables:
+            columns["code"] = codes.tolist()
+    for field, index in numeric.items():
+        if field in variables:
+            values = _values(section, index, window, n)
+            columns[field] = (np.trunc(values) if field in truncated else values).tolist()
+    return columns
+
+def _rows(timestamps: list[str], columns: dict[str, list]) -> list[dict]:
+    """One dict per time step holding the timestamp and the selected variables only."""
+    fields = ("timestamp", *columns)
+    return [dict(zip(fields, row)) for row in zip(timestamps, *columns.values())]
+
+def _day_bounds(local_times: np.ndarray) -> tuple[list[str], list[int]]:
+    """Local calendar dates of an hourly axis and the index each one starts at, plus the end."""
+    n = len(local_times)
+    local_days = local_times.astype("datetime64[D]")
+    bounds = [0, *(np.flatnonzero(local_days[1:] != local_days[:-1]) + 1).tolist(), n]
+    day_strings = np.datetime_as_string(local_days[bounds[:-1]], unit="D").tolist() if n else []
+    return day_strings, bounds
+
+def _columnar(columns: dict[str, list]) -> dict[str, list | dict]:
+    """Replaces the description column by the code column and a code -> description dictionary."""
+    descriptions = columns.pop("description", None)
+    if descriptions is not None:
+        columns["descriptions"] = dict(zip(columns["code"], descriptions))
+    return columns
+
+def _selected(variables, all_variables: tuple, columnar: bool = False):
+    selected = all_variables if variables is None else set(variables)
+    if columnar and "description" in selected:
+        selected = {*selected, "code"}  # descriptions are looked up by code
+    return selected
+
+def map_openmeteo_hourly_forecast(response, hours: int | None = None, variables=None,
+                                  now: float | None = None) -> HourlyWeatherData | PartialHourlyWeatherData:
+    """Hourly forecast grouped by local day; `hours` limits it to the next hours from `now`
+    (default: the current time), `variables` to a subset of HOUR_VARIABLES, mapped to the
+    partial model."""
     utc_offset_seconds = response.UtcOffsetSeconds()
-    local_tz = pytz.FixedOffset(utc_offset_seconds / 60)  # pytz expects minutes
+    hourly = response.Hourly()
 
+    local_times = _local_times(hourly, utc_offset_seconds)
+    window = _window(hourly, hours, now)
+    columns = _columns(hourly, window, len(local_times), _selected(variables, HOUR_VARIABLES),
+                       HOUR_COLUMNS, truncated=("cloud_cover",))
+    local_times = local_times[window]
+    rows = _rows(_format_timestamps(local_times, utc_offset_seconds), columns)
+
+    # A new day starts wherever the local calendar date changes
+    day_strings, bounds = _day_bounds(local_times)
+
+    # One validation pass over plain dicts is much cheaper than a model per hour
+    model = HourlyWeatherData if variables is None else PartialHourlyWeatherData
+    return model.model_validate({
+        "forecast": [
+            {"timestamp": day, "hours": rows[start:end]}
+            for day, start, end in zip(day_strings, bounds[:-1], bounds[1:])
+        ]
+    })
+
+def map_openmeteo_daily_forecast(response, days: int | None = None, variables=None,
+                                 now: float | None = None) -> DailyWeatherData | PartialDailyWeatherData:
+    """Daily forecast; `days` limits it to the next days from today, `variables` to a subset
+    of DAY_VARIABLES, mapped to the partial model."""
+    utc_offset_seconds = response.UtcOffsetSeconds()
     daily = response.Daily()
-    daily_weather_code = daily.Variables(0).ValuesAsNumpy()
-    daily_temperature_2m_mean = daily.Variables(1).ValuesAsNumpy()
-    daily_rain_sum = daily.Variables(2).ValuesAsNumpy()
-    daily_snowfall_sum = daily.Variables(3).ValuesAsNumpy()
-    daily_wind_gusts_10m_max = daily.Variables(4).ValuesAsNumpy()
-
-    daily_data = pd.date_range(
-        start=pd.to_datetime(daily.Time(), unit="s", utc=True).tz_convert(local_tz),
-        end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True).tz_convert(local_tz),
-        freq=pd.Timedelta(seconds=daily.Interval()),
-        inclusive="left"
-    )
-
-    days: list[DayWeatherData] = []
-
-    for i, timestamp in enumerate(daily_data):
-        dayEntry = DayWeatherData(
-            timestamp=str(timestamp),
-            description=map_weather_code(int(daily_weather_code[i])),
-            code=int(daily_weather_code[i]),
-            temperature=float(daily_temperature_2m_mean[i]),
-            rain=float(daily_rain_sum[i]),
-            snowfall=float(daily_snowfall_sum[i]), # Maybe unit conversion
-            wind_gust_max=float(daily_wind_gusts_10m_max[i]),
-        )
-        days.append(dayEntry)
 
-    return DailyWeatherData(days=days)
+    local_times = _local_times(daily, utc_offset_seconds)
+    window = _window(daily, days, now)
+    columns = _columns(daily, window, len(local_times), _selected(variables, DAY_VARIABLES), DAY_COLUMNS)
+    rows = _rows(_format_timestamps(local_times[window], utc_offset_seconds), columns)
+    model = DailyWeatherData if variables is None else PartialDailyWeatherData
+    return model.model_validate({"days": rows})
+
+def map_openmeteo_hourly_columns(response, hours: int | None = None, variables=None,
+                                 now: float | None = None) -> ColumnarHourlyWeatherData | PartialColumnarHourlyWeatherData:
+    """map_openmeteo_hourly_forecast as parallel arrays: local days are given by the index
+    of their first hour instead of nesting, descriptions once per distinct code."""
+    utc_offset_seconds = response.UtcOffsetSeconds()
+    hourly = response.Hourly()
 
+    local_times = _local_times(hourly, utc_offset_seconds)
+    window = _window(hourly, hours, now)
+    columns = _columns(hourly, window, len(local_times), _selected(variables, HOUR_VARIABLES, columnar=True),
+                       HOUR_COLUMNS, truncated=("cloud_cover",))
+    local_times = local_times[window]
+    day_strings, bounds = _day_bounds(local_times)
+    model = ColumnarHourlyWeatherData if variables is None else PartialColumnarHourlyWeatherData
+    return model.model_validate({
+        "timestamp": _format_timestamps(local_times, utc_offset_seconds),
+        "days": day_strings,
+        "day_start": bounds[:-1] if day_strings else [],
+        **_columnar(columns),
+    })
+
+def map_openmeteo_daily_columns(response, days: int | None = None, variables=None,
+                                now: float | None = None) -> ColumnarDailyWeatherData | PartialColumnarDailyWeatherData:
+    """map_openmeteo_daily_forecast as parallel arrays, descriptions once per distinct code."""
+    utc_offset_seconds = response.UtcOffsetSeconds()
+    daily = response.Daily()
 
+    local_times = _local_times(daily, utc_offset_seconds)
+    window = _window(daily, days, now)
+    columns = _columns(daily, window, len(local_times), _selected(variables, DAY_VARIABLES, columnar=True),
+                       DAY_COLUMNS)
+    model = ColumnarDailyWeatherData if variables is None else PartialColumnarDailyWeatherData
+    return model.model_validate({
+        "timestamp": _format_timestamps(local_times[window], utc_offset_seconds),
+        **_columnar(columns),
+    })
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from typing import Literal
+from pydantic import BaseModel, Field
 
 class CurrentWeatherOverview(BaseModel):
     description: str
@@ -15,6 +16,29 @@ class WeatherOverview(BaseModel):
     now: CurrentWeatherOverview
     today: TodayWeatherOverview
 
+# Variables a forecast request can select; a response leaves out the unselected fields
+HourlyVariable = Literal["description", "code", "temperature", "rain", "snowfall", "cloud_cover", "wind_speed"]
+DailyVariable = Literal["description", "code", "temperature", "rain", "snowfall", "wind_gust_max"]
+
+class HourlyForecastQuery(BaseModel):
+    lat: float
+    lon: float
+    hours: int | None = Field(None, ge=1, le=384)  # from the current hour on; all hours if omitted
+    variables: list[HourlyVariable] | None = Field(None, min_length=1)  # all if omitted
+
+class DailyForecastQuery(BaseModel):
+    lat: float
+    lon: float
+    days: int | None = Field(None, ge=1, le=16)  # from today on; all days if omitted
+    variables: list[DailyVariable] | None = Field(None, min_length=1)  # all if omitted
+
+# Request bodies of the POST routes carry a SimpleLocation's name as well
+class HourlyForecastRequest(HourlyForecastQuery):
+    name: str
+
+class DailyForecastRequest(DailyForecastQuery):
+    name: str
+
 class HourWeatherData(BaseModel):
     timestamp: str
     description: str
@@ -43,3 +67,78 @@ class DayWeatherData(BaseModel):
 
 class DailyWeatherData(BaseModel):
     days: list[DayWeatherData]
+
+# Forecasts limited to some variables: the same layout, holding only the selected fields.
+# The full models above stay strict, so a variable missing from a full forecast is an error.
+class PartialHourWeatherData(BaseModel):
+    timestamp: str
+    description: str | None = None
+    code: int | None = None
+    temperature: float | None = None
+    rain: float | None = None
+    snowfall: float | None = None
+    cloud_cover: float | None = None
+    wind_speed: float | None = None
+
+class PartialDailyHourWeatherData(BaseModel):
+    timestamp: str
+    hours: list[PartialHourWeatherData]
+
+class PartialHourlyWeatherData(BaseModel):
+    forecast: list[PartialDailyHourWeatherData]
+
+class PartialDayWeatherData(BaseModel):
+    timestamp: str
+    description: str | None = None
+    code: int | None = None
+    temperature: float | None = None
+    rain: float | None = None
+    snowfall: float | None = None
+    wind_gust_max: float | None = None
+
+class PartialDailyWeatherData(BaseModel):
+    days: list[PartialDayWeatherData]
+
+# Columnar variants: one array per variable, index i of every array belongs to timestamp[i].
+# The description of a code is sent once per response in "descriptions".
+class ColumnarHourlyWeatherData(BaseModel):
+    timestamp: list[str]
+    days: list[str]  # local calendar dates
+    day_start: list[int]  # index of the first hour of each local date
+    descriptions: dict[int, str]
+    code: list[int]
+    temperature: list[float]
+    rain: list[float]
+    snowfall: list[float]
+    cloud_cover: list[float]
+    wind_speed: list[float]
+
+class ColumnarDailyWeatherData(BaseModel):
+    timestamp: list[str]
+    descriptions: dict[int, str]
+    code: list[int]
+    temperature: list[float]
+    rain: list[float]
+    snowfall: list[float]
+    wind_gust_max: list[float]
+
+class PartialColumnarHourlyWeatherData(BaseModel):
+    timestamp: list[str]
+    days: list[str]
+    day_start: list[int]
+    descriptions: dict[int, str] | None = None
+    code: list[int] | None = None
+    temperature: list[float] | None = None
+    rain: list[float] | None = None
+    snowfall: list[float] | None = None
+    cloud_cover: list[float] | None = None
+    wind_speed: list[float] | None = None
+
+class PartialColumnarDailyWeatherData(BaseModel):
+    timestamp: list[str]
+    descriptions: dict[int, str] | None = None
+    code: list[int] | None = None
+    temperature: list[float] | None = None
+    rain: list[float] | None = None
+    snowfall: list[float] | None = None
+    wind_gust_max: list[float] | None = None
@@ -1,3 +1,5 @@
+import numpy as np
+
 WEATHER_CODES = {
     0: "Clear sky",
     1: "Mainly clear",
@@ -32,4 +34,18 @@ WEATHER_CODES = {
 def map_weather_code(code: int) -> str:
     if code not in WEATHER_CODES:
         raise ValueError(f"Unexpected weather code: {code}")
-    return WEATHER_CODES[code]
\ No newline at end of file
+    return WEATHER_CODES[code]
+
+# Index = WMO code, None for codes Open-Meteo never sends
+WEATHER_CODE_DESCRIPTIONS = np.array(
+    [WEATHER_CODES.get(code) for code in range(max(WEATHER_CODES) + 1)], dtype=object
+)
+
+def map_weather_codes(codes: np.ndarray) -> list[str]:
+    """Vectorized map_weather_code for an integer array of codes."""
+    in_range = (codes >= 0) & (codes < len(WEATHER_CODE_DESCRIPTIONS))
+    descriptions = WEATHER_CODE_DESCRIPTIONS[np.where(in_range, codes, 0)]
+    unknown = ~in_range | np.equal(descriptions, None)
+    if unknown.any():
+        raise ValueError(f"Unexpected weather code: {codes[unknown][0]}")
+    return descriptions.tolist()
@@ -2,3 +2,92 @@ GEOCODE_DEFAULT_PARAMS = {
     "format": "json",
     "addressdetails": 1
 }
+
+# Open-Meteo upstream connection settings
+OPENMETEO_BASE_URL = "https://api.open-meteo.com/v1/forecast"
+OPENMETEO_TIMEOUT = 10.0  # seconds
+OPENMETEO_MAX_CONNECTIONS = 20
+OPENMETEO_MAX_KEEPALIVE_CONNECTIONS = 10
+OPENMETEO_KEEPALIVE_EXPIRY = 30.0  # seconds
+OPENMETEO_RETRIES = 5
+OPENMETEO_BACKOFF_FACTOR = 0.2
+
+# Coordinates are snapped to this grid (degrees) before cache lookup and upstream calls.
+# Snapping moves a point by up to half a step (0.005° at 0.01°, ~550 m), so a point near
+# a model cell boundary can be answered by the neighbouring model cell; that is the
+# price of sharing cache entries between nearby points. A larger step (e.g. 0.02 for
+# ICON-D2, 0.1 for ECMWF IFS) shares more entries and moves points further.
+COORDINATE_GRID_STEP = 0.01
+
+# Raw forecast payloads: "memory" (per worker), "sqlite" (one WAL file shared by the workers
+# on a host) or "redis" (shared by every worker reaching FORECAST_CACHE_REDIS_URL)
+FORECAST_CACHE_BACKEND = "sqlite"
+FORECAST_CACHE_PATH = ".cache_forecast.sqlite"
+FORECAST_CACHE_REDIS_URL = "redis://localhost:6379/0"
+FORECAST_CACHE_MAX_BYTES = 256 * 1024 * 1024  # content bytes; Redis is bounded by its own maxmemory
+FORECAST_CACHE_SWEEP_INTERVAL = 300.0  # seconds between expiry / size sweeps
+
+# In-process cache of mapped weather responses, one per endpoint, grid cell and selection.
+# Bounded by the bytes of the bodies and their compressed/MessagePack variants; the entry
+# limit only caps the bookkeeping of many tiny entries
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESPONSE_CACHE_MAXSIZE = 65536
+# Expired responses are still served: right away within the first window while one
+# background call refreshes them, and up to the second window if Open-Meteo fails
+RESPONSE_STALE_WHILE_REVALIDATE = 600  # seconds after expiry
+RESPONSE_STALE_IF_ERROR = 3 * 3600  # seconds after expiry
+
+# Cached weather responses at least this large are sent compressed to clients accepting it;
+# the compressed bytes are kept with the cache entry
+RESPONSE_COMPRESS_MIN_BYTES = 1024
+
+# Forecasts limited to the next hours/days are cached per this many seconds, as their
+# window moves with the clock; every Open-Meteo time step and UTC offset is a multiple of it
+FORECAST_WINDOW_STEP = 900
+
+# Forecast change streams (server-sent events)
+STREAM_KEEPALIVE = 15.0  # seconds between comment lines on an idle stream, keeps proxies from closing it
+STREAM_QUEUE_SIZE = 16  # events buffered per subscriber; a subscriber falling further behind is disconnected
+STREAM_MIN_REFRESH_INTERVAL = 60.0  # seconds between refreshes of a watched grid cell, at least
+STREAM_RETRY_INTERVAL = 60.0  # seconds before retrying a failed refresh
+
+# Multi-location requests
+OPENMETEO_MAX_LOCATIONS_PER_REQUEST = 100  # keeps the request URL well below server limits
+BATCH_MAX_LOCATIONS = 1000  # per batch endpoint call
+
+# Nominatim connection settings; the usage policy requires an identifying User-Agent
+NOMINATIM_USER_AGENT = "VoltCast-Weather-Microservice"
+NOMINATIM_TIMEOUT = 10.0  # seconds
+NOMINATIM_CONNECT_TIMEOUT = 5.0  # seconds
+NOMINATIM_MAX_CONNECTIONS = 4
+NOMINATIM_KEEPALIVE_EXPIRY = 60.0  # seconds
+
+# Geocoding results change rarely: keep them (including empty results) for 30 days
+GEOCODE_CACHE_TTL = 30 * 24 * 3600  # seconds
+GEOCODE_CACHE_MAXSIZE = 10000  # in-memory entries in front of the SQLite store
+
+# Nominatim allows about one request per second; excess searches queue, then are shed
+NOMINATIM_RATE_LIMIT = 1.0  # requests per second
+NOMINATIM_MAX_WAIT = 10.0  # seconds a search may wait for a slot
+# more waiters could not all be served within NOMINATIM_MAX_WAIT
+NOMINATIM_QUEUE_SIZE = int(NOMINATIM_RATE_LIMIT * NOMINATIM_MAX_WAIT)  # searches waiting for a slot
+
+# Saved user locations: reads share a small thread pool, writes go through one writer
+# thread that commits everything queued behind the previous commit in one transaction
+LOCATION_DB_READERS = 4
+LOCATION_WRITE_BATCH = 500  # writes per transaction
+LOCATION_CACHE_MAXSIZE = 10000  # users whose location is kept in memory, least recently used go first
+LOCATION_CACHE_TTL = 300.0  # seconds until a cached location is read again, picking up saves of other workers
+LOCATION_CACHE_MISS_TTL = 30.0  # the same for users found without a location
+LOCATION_BULK_MAX = 10000  # user locations per bulk import call
+LOCATION_EXPORT_PAGE = 500  # rows read per query while streaming an export
+
+# Background refresh of the forecasts of all saved user locations, shortly before they expire
+PREWARM_ENABLED = True
+PREWARM_INTERVAL = 60.0  # seconds between sweeps over the saved locations
+PREWARM_LEAD = 300.0  # refresh grid cells whose forecast expires within this many seconds
+# Upstream locations per hour and worker: divide the share of Open-Meteo's quota (5000 calls a day
+# on the free tier) by the number of workers. Workers sharing a sqlite/redis forecast cache skip cells
+# another one already refreshed, so with several workers the budget is rarely used up.
+PREWARM_BUDGET_PER_HOUR = 3000
+PREWARM_CONCURRENCY = 2  # multi-location upstream calls in flight at once
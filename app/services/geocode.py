@@ -1,18 +1,214 @@
+import asyncio
+import heapq
+import itertools
+import json
+import sqlite3
+import time
+from enum import IntEnum
+
 import httpx
-from app.core.errors import ExternalApiError
+from pydantic import TypeAdapter
+from app.core.errors import ExternalApiError, RateLimitExceededError
 from app.mapper.geocode import map_raw_to_location_list, map_location_list_to_simple_location
 from app.models.geocode import SimpleLocation, LocationRequest
-from .utils import build_geocode_params
+from app.core.cache import TTLCache
+from app.core.http import SharedHttpClient
+from app.core.singleflight import SingleFlight
+from app.core.sqlite import ThreadLocalConnections
+from .config import (
+    NOMINATIM_USER_AGENT,
+    NOMINATIM_TIMEOUT,
+    NOMINATIM_CONNECT_TIMEOUT,
+    NOMINATIM_MAX_CONNECTIONS,
+    NOMINATIM_KEEPALIVE_EXPIRY,
+    GEOCODE_CACHE_TTL,
+    GEOCODE_CACHE_MAXSIZE,
+    NOMINATIM_RATE_LIMIT,
+    NOMINATIM_QUEUE_SIZE,
+    NOMINATIM_MAX_WAIT,
+)
+from .utils import build_geocode_params, geocode_cache_key
 
 BASE_URL = "https://nominatim.openstreetmap.org/search"
 
-async def search_location(input: LocationRequest) -> list[SimpleLocation]:
+# Keep-alive client shared by all Nominatim calls
+http_client = SharedHttpClient(
+    headers={"User-Agent": NOMINATIM_USER_AGENT},
+    timeout=httpx.Timeout(NOMINATIM_TIMEOUT, connect=NOMINATIM_CONNECT_TIMEOUT),
+    limits=httpx.Limits(
+        max_connections=NOMINATIM_MAX_CONNECTIONS,
+        max_keepalive_connections=NOMINATIM_MAX_CONNECTIONS,
+        keepalive_expiry=NOMINATIM_KEEPALIVE_EXPIRY,
+    ),
+)
+create_http_client = http_client.create
+set_http_client = http_client.set
+get_http_client = http_client.get
+close_http_client = http_client.aclose
+
+
+class GeocodeCache:
+    """Search results by normalized address: in-memory LRU in front of a durable SQLite store."""
+
+    adapter = TypeAdapter(list[SimpleLocation])
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+    )
+
+    def __init__(self, cache_name: str, ttl: float = GEOCODE_CACHE_TTL, maxsize: int = GEOCODE_CACHE_MAXSIZE):
+        self.db_name = f"{cache_name}.sqlite"
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._connections = ThreadLocalConnections(self.db_name, self.PRAGMAS, self._create_schema)
+
+    @staticmethod
+    def _create_schema(con: sqlite3.Connection):
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS geocode_results (
+                key TEXT PRIMARY KEY,
+                result_json TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS geocode_results_expires_at ON geocode_results (expires_at)")
+
+    def connect(self) -> sqlite3.Connection:
+        """Returns this thread's long-lived connection, opening it on first use."""
+        return self._connections.connect()
+
+    def close(self):
+        """Closes this thread's connection and releases those of other threads."""
+        self._connections.close()
+
+    def _load(self, key: str) -> tuple[str, float] | None:
+        with self.connect() as con:
+            return con.execute(
+                "SELECT result_json, expires_at FROM geocode_results WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+
+    def _store(self, key: str, result_json: str, expires_at: float):
+        with self.connect() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO geocode_results (key, result_json, expires_at) VALUES (?, ?, ?)",
+                (key, result_json, expires_at)
+            )
+            # stores are rate limited like the upstream, so pruning on each one keeps the file bounded
+            con.execute("DELETE FROM geocode_results WHERE expires_at <= ?", (time.time(),))
+
+    async def get(self, key: tuple) -> list[SimpleLocation] | None:
+        result = self.memory.get(key)
+        if result is None:
+            row = await asyncio.to_thread(self._load, json.dumps(key))
+            if row is not None:
+                result = self.adapter.validate_json(row[0])
+                self.memory.set(key, result, expires_at=row[1])
+        return result
+
+    async def set(self, key: tuple, result: list[SimpleLocation]):
+        expires_at = time.time() + self.ttl
+        self.memory.set(key, result, expires_at=expires_at)
+        result_json = self.adapter.dump_json(result).decode()
+        await asyncio.to_thread(self._store, json.dumps(key), result_json, expires_at)
+
+
+class SearchPriority(IntEnum):
+    INTERACTIVE = 0  # a user is waiting for the answer
+    BACKGROUND = 1  # bulk / prefetch geocoding
+
+
+class RequestScheduler:
+    """Spaces upstream calls to a requests-per-second budget, highest priority first.
+
+    Callers that find no free slot wait in a priority queue. The queue is
+    bounded in size (max_queue) and in waiting time (max_wait); beyond either
+    the request is shed with RateLimitExceededError instead of piling up.
+    A caller whose turn, behind the waiters of its priority or higher, would
+    come after max_wait is shed right away rather than after waiting for it.
+    """
+
+    def __init__(self, rate: float, max_queue: int, max_wait: float):
+        self.interval = 1 / rate
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiting = 0
+        self._heap: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._next_slot = 0.0  # time.monotonic() of the next free slot
+        self._timer: asyncio.TimerHandle | None = None
+
+    async def acquire(self, priority: SearchPriority = SearchPriority.INTERACTIVE):
+        now = time.monotonic()
+        if self.waiting == 0 and now >= self._next_slot:
+            self._next_slot = now + self.interval
+            return
+        if self.waiting >= self.max_queue:
+            raise RateLimitExceededError("Geocoding queue is full, please retry later")
+        ahead = sum(1 for queued, _, slot in self._heap if queued <= priority and not slot.done())
+        if self._next_slot - now + ahead * self.interval > self.max_wait:
+            raise RateLimitExceededError("Geocoding queue is too long, please retry later")
+
+        slot = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), slot))
+        self.waiting += 1
+        self._schedule()
+        try:
+            await asyncio.wait_for(asyncio.shield(slot), self.max_wait)
+        except asyncio.TimeoutError:  # overtaken by higher-priority searches
+            raise RateLimitExceededError("Timed out waiting for a geocoding slot, please retry later")
+        finally:
+            self.waiting -= 1
+            slot.cancel()  # no-op once granted; otherwise the slot is skipped when popped
+
+    def _schedule(self):
+        if self._timer is None and self._heap:
+            delay = max(0.0, self._next_slot - time.monotonic())
+            self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._timer = None
+        while self._heap:
+            _, _, slot = heapq.heappop(self._heap)
+            if not slot.done():
+                slot.set_result(None)
+                self._next_slot = time.monotonic() + self.interval
+                break
+        self._schedule()
+
+
+geocode_cache = GeocodeCache('.cache_geocode')
+nominatim_scheduler = RequestScheduler(NOMINATIM_RATE_LIMIT, NOMINATIM_QUEUE_SIZE, NOMINATIM_MAX_WAIT)
+
+# Identical concurrent searches of the same priority wait on one Nominatim call
+search_flights = SingleFlight()
+
+async def search_location(input: LocationRequest,
+                          priority: SearchPriority = SearchPriority.INTERACTIVE) -> list[SimpleLocation]:
     params = build_geocode_params(input.street, input.houseNumber, input.city, input.postalCode, input.country)
+    key = geocode_cache_key(params)
+    result = await geocode_cache.get(key)
+    if result is None:
+        result = await search_flights.do((key, priority), lambda: fetch_and_cache(key, params, priority))
+    return result
+
+async def fetch_and_cache(key: tuple, params: dict, priority: SearchPriority) -> list[SimpleLocation]:
+    await nominatim_scheduler.acquire(priority)
+    # the same search at another priority may have filled the cache while we queued
+    result = await geocode_cache.get(key)
+    if result is None:
+        # only successful searches are cached, empty results included
+        result = await fetch_locations(params)
+        await geocode_cache.set(key, result)
+    return result
+
+async def fetch_locations(params: dict) -> list[SimpleLocation]:
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(BASE_URL, params=params)
-            resp.raise_for_status()
-            raw_data = resp.json()
+        resp = await get_http_client().get(BASE_URL, params=params)
+        resp.raise_for_status()
+        raw_data = resp.json()
     except httpx.HTTPStatusError as e:
         raise ExternalApiError(
             f"Geocoding API returned {e.response.status_code}"
@@ -0,0 +1,195 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+
+from app.core.cache import TTLCache
+from app.Database import Database, LocationRow
+from app.models.geocode import SimpleLocation
+from .config import (
+    LOCATION_DB_READERS,
+    LOCATION_WRITE_BATCH,
+    LOCATION_EXPORT_PAGE,
+    LOCATION_CACHE_MAXSIZE,
+    LOCATION_CACHE_TTL,
+    LOCATION_CACHE_MISS_TTL,
+    COORDINATE_GRID_STEP,
+)
+from .utils import snap_coordinate
+
+_MISSING = object()
+
+
+class LocationStore:
+    """Non-blocking access to saved user locations.
+
+    Reads run on a bounded thread pool, each thread with its own WAL connection,
+    so they never wait for a writer. Writes run on a single writer thread: every
+    write queued while a commit is in progress is committed together in the next
+    transaction, so concurrent saves cost one fsync instead of one each.
+
+    Single-user lookups are served from an LRU cache (users without a location
+    included). Every committed write updates it, so a worker never reads a
+    location older than its own last save. Saves through other workers are
+    seen once the entry expires: after cache_ttl, or the shorter miss_ttl for
+    users without a location, who are the likeliest to save one next.
+    """
+
+    def __init__(self, db: Database,
+                 max_readers: int = LOCATION_DB_READERS,
+                 max_batch: int = LOCATION_WRITE_BATCH,
+                 cache_maxsize: int = LOCATION_CACHE_MAXSIZE,
+                 cache_ttl: float = LOCATION_CACHE_TTL,
+                 miss_ttl: float = LOCATION_CACHE_MISS_TTL):
+        self.db = db
+        self.cache = TTLCache(maxsize=cache_maxsize, ttl=cache_ttl)
+        self.miss_ttl = miss_ttl
+        self._generation = 0  # bumped by every committed write
+        self.max_readers = max_readers
+        self.max_batch = max_batch
+        self._readers: ThreadPoolExecutor | None = None
+        self._writer: ThreadPoolExecutor | None = None
+        self._pending: list[tuple[str, SimpleLocation, asyncio.Future]] = []
+        self._flushing: asyncio.Task | None = None
+        self.closed = False
+
+    @property
+    def readers(self) -> ThreadPoolExecutor:
+        self._check_open()
+        if self._readers is None:
+            self._readers = ThreadPoolExecutor(self.max_readers, thread_name_prefix="location-read")
+        return self._readers
+
+    @property
+    def writer(self) -> ThreadPoolExecutor:
+        self._check_open()
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(1, thread_name_prefix="location-write")
+        return self._writer
+
+    def _check_open(self):
+        # the pools are not brought back by use after close() has shut them down, only by open()
+        if self.closed:
+            raise RuntimeError("LocationStore is closed")
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self.cache), "hits": self.cache.hits, "misses": self.cache.misses}
+
+    async def get(self, username: str) -> SimpleLocation | None:
+        location = self.cache.get(username, _MISSING)
+        if location is not _MISSING:
+            return location
+        generation = self._generation
+        location = await asyncio.get_running_loop().run_in_executor(self.readers, self.db.get_location, username)
+        # a write committed during the read may be newer than what was read
+        if generation == self._generation:
+            expires_at = time.time() + self.miss_ttl if location is None else None
+            self.cache.set(username, location, expires_at=expires_at)
+        return location
+
+    def _written(self, items: list[tuple[str, SimpleLocation]]):
+        self._generation += 1
+        for username, location in items:
+            self.cache.set(username, location)
+
+    async def save(self, username: str, location: SimpleLocation):
+        """Queues the write and returns once the transaction containing it is committed."""
+        self._check_open()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((username, location, future))
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.ensure_future(self._flush())
+        # a cancelled caller does not withdraw the write, it is committed anyway
+        await asyncio.shield(future)
+
+    async def save_many(self, items: list[tuple[str, SimpleLocation]]):
+        """Saves a bulk import in one transaction of its own on the writer thread."""
+        await asyncio.get_running_loop().run_in_executor(self.writer, self.db.save_locations, items)
+        self._written(items)
+
+    async def export(self, usernames: list[str] | None = None,
+                     page_size: int = LOCATION_EXPORT_PAGE) -> AsyncIterator[LocationRow]:
+        """Yields (username, name, lat, lon) rows one page at a time.
+
+        Without usernames every saved location is exported in username order;
+        otherwise the given users are, in request order, skipping unknown ones.
+        """
+        loop = asyncio.get_running_loop()
+        if usernames is None:
+            after = None
+            while True:
+                rows = await loop.run_in_executor(self.readers, self.db.export_locations_page, after, page_size)
+                for row in rows:
+                    yield row
+                if len(rows) < page_size:
+                    return
+                after = rows[-1][0]
+        for i in range(0, len(usernames), page_size):
+            chunk = usernames[i:i + page_size]
+            found = {row[0]: row for row in await loop.run_in_executor(self.readers, self.db.export_locations, chunk)}
+            for username in chunk:
+                if username in found:
+                    yield found[username]
+
+    async def find_in_box(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> list[LocationRow]:
+        """Saved locations inside a bounding box, edges included."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.readers, self.db.locations_in_box, min_lat, max_lat, min_lon, max_lon
+        )
+
+    async def find_in_cell(self, lat: float, lon: float, step: float = COORDINATE_GRID_STEP) -> list[LocationRow]:
+        """Saved locations in the same forecast grid cell as lat/lon (see snap_coordinate)."""
+        lat, lon = snap_coordinate(lat, step), snap_coordinate(lon, step)
+        half = step / 2
+        return await self.find_in_box(lat - half, lat + half, lon - half, lon + half)
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            items = [(username, location) for username, location, _ in batch]
+            try:
+                await loop.run_in_executor(self.writer, self.db.save_locations, items)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self._written(items)
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    def open(self):
+        """Makes a closed store usable again, as when the app starts a new lifespan."""
+        if not self.closed:
+            return
+        self._readers = self._writer = self._flushing = None
+        # other workers may have saved locations while this one was stopped
+        self.cache.clear()
+        self.closed = False
+
+    async def aclose(self):
+        """Commits the queued writes, then closes the store."""
+        if self._flushing is not None:
+            await asyncio.shield(self._flushing)
+        self.close()
+
+    def close(self):
+        """Waits for running database work, then closes the pools and connections.
+
+        Writes still queued behind the running one fail with RuntimeError, as
+        does any later use of the store until open(); aclose() commits them first.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        pending, self._pending = self._pending, []
+        for *_, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("LocationStore is closed"))
+        for pool in (self._readers, self._writer):
+            if pool is not None:
+                pool.shutdown(wait=True)
+        self.db.close()
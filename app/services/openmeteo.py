@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import time
+from typing import NamedTuple
+
+import httpx
+from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+from app.core.backends import CacheBackend
+from app.core.errors import ExternalApiError
+from app.core.http import SharedHttpClient
+from .config import (
+    OPENMETEO_TIMEOUT,
+    OPENMETEO_MAX_CONNECTIONS,
+    OPENMETEO_MAX_KEEPALIVE_CONNECTIONS,
+    OPENMETEO_KEEPALIVE_EXPIRY,
+    OPENMETEO_RETRIES,
+    OPENMETEO_BACKOFF_FACTOR,
+    OPENMETEO_MAX_LOCATIONS_PER_REQUEST,
+)
+
+RETRY_STATUS_CODES = (500, 502, 504)  # same status list as retry_requests
+_FLATBUFFERS_ERROR_PREFIX = 0x78656E55  # in-stream errors start with "Unexpected"
+
+# Keep-alive client shared by all Open-Meteo calls
+http_client = SharedHttpClient(
+    timeout=OPENMETEO_TIMEOUT,
+    limits=httpx.Limits(
+        max_connections=OPENMETEO_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENMETEO_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENMETEO_KEEPALIVE_EXPIRY,
+    ),
+)
+create_http_client = http_client.create
+set_http_client = http_client.set
+get_http_client = http_client.get
+close_http_client = http_client.aclose
+
+
+def encode_params(params: dict) -> dict[str, str]:
+    """Flattens list parameters into the comma separated form Open-Meteo expects."""
+    query = {}
+    for key in sorted(params):
+        value = params[key]
+        if isinstance(value, (list, tuple)):
+            query[key] = ",".join(str(v) for v in value)
+        else:
+            query[key] = str(value)
+    query["format"] = "flatbuffers"
+    return query
+
+
+def cache_key(url: str, query: dict[str, str]) -> str:
+    return hashlib.sha256(str(httpx.URL(url, params=query)).encode()).hexdigest()
+
+
+def split_messages(data: bytes) -> list[bytes]:
+    """Splits a multi-location payload into one length-prefixed payload per location."""
+    messages: list[bytes] = []
+    pos, total = 0, len(data)
+    while pos < total:
+        length = int.from_bytes(data[pos:pos + 4], byteorder="little")
+        if length == _FLATBUFFERS_ERROR_PREFIX:
+            raise ExternalApiError(f"Weather API returned an error: {data[pos:].decode('utf-8', 'replace')}")
+        messages.append(data[pos:pos + 4 + length])
+        pos += length + 4
+    return messages
+
+
+def decode_weather_api_response(data: bytes) -> list[WeatherApiResponse]:
+    """Decodes a length-prefixed FlatBuffers payload into one response per location."""
+    return [WeatherApiResponse.GetRootAs(message, 4) for message in split_messages(data)]
+
+
+class CachedPayload(NamedTuple):
+    content: bytes
+    expires_at: float
+
+
+class ResponseCache:
+    """Raw Open-Meteo payloads with a fixed expiry, kept in a pluggable backend."""
+
+    def __init__(self, backend: CacheBackend, expire_after: int):
+        self.backend = backend
+        self.expire_after = expire_after
+
+    async def get(self, key: str) -> CachedPayload | None:
+        return (await self.get_many([key])).get(key)
+
+    async def set(self, key: str, content: bytes) -> CachedPayload:
+        return (await self.set_many({key: content}))[key]
+
+    async def get_many(self, keys: list[str]) -> dict[str, CachedPayload]:
+        return {key: CachedPayload(*item) for key, item in (await self.backend.get_many(keys)).items()}
+
+    async def set_many(self, items: dict[str, bytes]) -> dict[str, CachedPayload]:
+        expires_at = time.time() + self.expire_after
+        await self.backend.set_many(items, expires_at)
+        return {key: CachedPayload(content, expires_at) for key, content in items.items()}
+
+
+class OpenMeteoClient:
+    """Non-blocking Open-Meteo client: pooled keep-alive connection, retries and a response cache."""
+
+    def __init__(self, cache: CacheBackend, expire_after: int,
+                 retries: int = OPENMETEO_RETRIES,
+                 backoff_factor: float = OPENMETEO_BACKOFF_FACTOR,
+                 http_client: httpx.AsyncClient | None = None):
+        self.cache = ResponseCache(cache, expire_after)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._http_client = http_client
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        return self._http_client or get_http_client()
+
+    def backoff(self, attempt: int) -> float:
+        # urllib3 semantics: the first retry is immediate, then factor * 2^(n-1)
+        if attempt <= 1:
+            return 0
+        return self.backoff_factor * (2 ** (attempt - 1))
+
+    async def fetch(self, url: str, params: dict) -> CachedPayload:
+        """Returns the raw payload for params, from the cache or upstream."""
+        query = encode_params(params)
+        key = cache_key(url, query)
+        payload = await self.cache.get(key)
+        if payload is None:
+            content = await self._fetch(url, query)
+            payload = await self.cache.set(key, content)
+        return payload
+
+    @staticmethod
+    def location_keys(url: str, params: dict, coordinates: list[tuple[str, str]]) -> list[str]:
+        return [
+            cache_key(url, encode_params({**params, "latitude": lat, "longitude": lon}))
+            for lat, lon in coordinates
+        ]
+
+    async def peek_many(self, url: str, params: dict, coordinates: list[tuple[str, str]]) -> list[CachedPayload | None]:
+        """Cached payloads for many locations, None where nothing fresh is cached; never calls upstream."""
+        keys = self.location_keys(url, params, coordinates)
+        cached = await self.cache.get_many(list(set(keys)))
+        return [cached.get(key) for key in keys]
+
+    async def fetch_many(self, url: str, params: dict, coordinates: list[tuple[str, str]],
+                         refresh: bool = False) -> list[CachedPayload]:
+        """Payloads for many locations, cached one by one under the same keys as fetch().
+
+        Cache misses are requested together, using Open-Meteo's comma separated
+        latitude/longitude lists, in chunks of OPENMETEO_MAX_LOCATIONS_PER_REQUEST.
+        With refresh, every location is requested and its cache entry replaced.
+        """
+        keys = self.location_keys(url, params, coordinates)
+        cached = {} if refresh else await self.cache.get_many(list(set(keys)))
+        missing = list({key: coords for key, coords in zip(keys, coordinates) if key not in cached}.items())
+        chunks = [
+            missing[i:i + OPENMETEO_MAX_LOCATIONS_PER_REQUEST]
+            for i in range(0, len(missing), OPENMETEO_MAX_LOCATIONS_PER_REQUEST)
+        ]
+        for fetched in await asyncio.gather(*(self._fetch_chunk(url, params, chunk) for chunk in chunks)):
+            cached.update(fetched)
+        return [cached[key] for key in keys]
+
+    async def _fetch_chunk(self, url: str, params: dict, chunk: list[tuple[str, tuple[str, str]]]) -> dict[str, CachedPayload]:
+        query = encode_params({
+            **params,
+            "latitude": [coordinates[0] for _, coordinates in chunk],
+            "longitude": [coordinates[1] for _, coordinates in chunk],
+        })
+        messages = split_messages(await self._fetch(url, query))
+        if len(messages) != len(chunk):
+            raise ExternalApiError(f"Weather API returned {len(messages)} locations, expected {len(chunk)}")
+        return await self.cache.set_many({key: message for (key, _), message in zip(chunk, messages)})
+
+    async def weather_api(self, url: str, params: dict) -> list[WeatherApiResponse]:
+        payload = await self.fetch(url, params)
+        return decode_weather_api_response(payload.content)
+
+    async def _fetch(self, url: str, query: dict[str, str]) -> bytes:
+        attempt = 0
+        while True:
+            try:
+                resp = await self.http_client.get(url, params=query)
+            except httpx.RequestError as e:
+                if attempt >= self.retries:
+                    raise ExternalApiError("Failed to reach weather API") from e
+            else:
+                if resp.status_code not in RETRY_STATUS_CODES or attempt >= self.retries:
+                    return self._content(resp)
+            attempt += 1
+            await asyncio.sleep(self.backoff(attempt))
+
+    @staticmethod
+    def _content(resp: httpx.Response) -> bytes:
+        if resp.status_code in (400, 429):
+            try:
+                reason = resp.json().get("reason", resp.text)
+            except (ValueError, AttributeError):
+                reason = resp.text
+            raise ExternalApiError(f"Weather API returned {resp.status_code}: {reason}")
+        try:
+            resp.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise ExternalApiError(f"Weather API returned {resp.status_code}") from e
+        return resp.content
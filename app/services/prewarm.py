@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+
+from app.core.errors import AppError
+from .config import (
+    PREWARM_INTERVAL,
+    PREWARM_LEAD,
+    PREWARM_BUDGET_PER_HOUR,
+    PREWARM_CONCURRENCY,
+    OPENMETEO_MAX_LOCATIONS_PER_REQUEST,
+)
+from .locations import LocationStore
+from .utils import snap_coordinate
+from .weather import cached_forecasts, refresh_forecasts
+
+logger = logging.getLogger(__name__)
+
+Cell = tuple[float, float]
+
+
+class PrewarmScheduler:
+    """Keeps the forecasts of all saved user locations warm.
+
+    Every interval the saved locations are snapped to grid cells and
+    deduplicated. Cells whose forecast is not cached or expires within `lead`
+    seconds are refreshed, soonest first, in multi-location upstream calls.
+    At most `concurrency` calls run at once, and at most `budget_per_hour`
+    locations are requested per hour, so live traffic keeps the rest of the
+    Open-Meteo quota. Cells over budget are picked up by a later sweep.
+
+    Every worker runs its own scheduler. Due cells are checked against the
+    forecast cache right before refreshing, so with a shared backend a cell
+    one worker refreshed is skipped by the others; the budget is per worker.
+    """
+
+    def __init__(self, store: LocationStore,
+                 interval: float = PREWARM_INTERVAL,
+                 lead: float = PREWARM_LEAD,
+                 budget_per_hour: int = PREWARM_BUDGET_PER_HOUR,
+                 concurrency: int = PREWARM_CONCURRENCY,
+                 chunk_size: int = OPENMETEO_MAX_LOCATIONS_PER_REQUEST):
+        self.store = store
+        self.interval = interval
+        self.lead = lead
+        self.budget_per_hour = budget_per_hour
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.refreshed = 0
+        self.failed = 0
+        # token bucket refilled at budget_per_hour, holding at most one interval's share
+        self._capacity = max(1.0, budget_per_hour * interval / 3600)
+        self._tokens = self._capacity
+        self._refilled_at = time.monotonic()
+        self._expiries: dict[Cell, float | None] = {}
+        self._task: asyncio.Task | None = None
+
+    async def cells(self) -> list[Cell]:
+        """Distinct grid cells of all saved locations."""
+        cells: dict[Cell, None] = {}
+        async for _, _, lat, lon in self.store.export():
+            cells[(snap_coordinate(lat), snap_coordinate(lon))] = None
+        return list(cells)
+
+    def _take_budget(self, wanted: int) -> int:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._refilled_at) * self.budget_per_hour / 3600)
+        self._refilled_at = now
+        granted = min(wanted, int(self._tokens))
+        self._tokens -= granted
+        return granted
+
+    async def run_once(self) -> int:
+        """One sweep; returns the number of grid cells refreshed."""
+        # forget cells no user is in any more, learn expiries of new ones from the cache
+        self._expiries = {cell: self._expiries.get(cell) for cell in await self.cells()}
+        unknown = [cell for cell, expires_at in self._expiries.items() if expires_at is None]
+        if unknown:
+            for cell, payload in zip(unknown, await cached_forecasts(unknown)):
+                if payload is not None:
+                    self._expiries[cell] = payload.expires_at
+
+        refresh_before = time.time() + self.lead
+        due = [cell for cell, expires_at in self._expiries.items()
+               if expires_at is None or expires_at <= refresh_before]
+        # other workers sharing the cache, requests and stream watchers may have refreshed some already
+        if due:
+            for cell, payload in zip(due, await cached_forecasts(due)):
+                if payload is not None:
+                    self._expiries[cell] = payload.expires_at
+        due = sorted(
+            (self._expiries[cell] or 0.0, cell) for cell in due
+            if self._expiries[cell] is None or self._expiries[cell] <= refresh_before
+        )
+        due = [cell for _, cell in due[:self._take_budget(len(due))]]
+        chunks = [due[i:i + self.chunk_size] for i in range(0, len(due), self.chunk_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def refresh(chunk: list[Cell]) -> int:
+            async with semaphore:
+                try:
+                    payloads = await refresh_forecasts(chunk)
+                except AppError as e:
+                    self.failed += len(chunk)
+                    logger.warning("Prewarming %d grid cells failed: %s", len(chunk), e)
+                    return 0
+            for cell, payload in zip(chunk, payloads):
+                self._expiries[cell] = payload.expires_at
+            return len(chunk)
+
+        count = sum(await asyncio.gather(*(refresh(chunk) for chunk in chunks)))
+        self.refreshed += count
+        return count
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Forecast prewarm sweep failed")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
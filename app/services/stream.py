@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator
+
+from app.core.cache import CachedResponse
+from app.core.errors import AppError
+from app.models.weather import HourlyWeatherData
+from . import weather
+from .config import (
+    STREAM_KEEPALIVE,
+    STREAM_QUEUE_SIZE,
+    STREAM_MIN_REFRESH_INTERVAL,
+    STREAM_RETRY_INTERVAL,
+)
+from .utils import snap_coordinate
+
+logger = logging.getLogger(__name__)
+
+Cell = tuple[float, float]
+
+
+def sse_event(event: str, data: bytes) -> bytes:
+    # the JSON bodies are single-line, so one data field carries them
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+def hourly_delta(previous: HourlyWeatherData | None, current: HourlyWeatherData) -> bytes | None:
+    """JSON {"hours": [...]} of the hours that are new or differ from `previous`; None if none do."""
+    old = {hour.timestamp: hour for day in previous.forecast for hour in day.hours} if previous else {}
+    changed = [
+        hour.model_dump(exclude_unset=True)
+        for day in current.forecast for hour in day.hours
+        if old.get(hour.timestamp) != hour
+    ]
+    if not changed:
+        return None
+    return json.dumps({"hours": changed}, separators=(",", ":")).encode()
+
+
+class ForecastStream:
+    """Pushes forecast changes of grid cells to their subscribers as server-sent events.
+
+    A subscriber first gets the current overview and all hours, then an
+    "overview" event whenever the cached overview of its cell changes and an
+    "hourly" event with the changed hours whenever the hourly forecast does.
+    Changes are picked up wherever a mapped response is cached (requests,
+    revalidation, prewarming) and each event is serialized once for all
+    subscribers of the cell. While a cell has subscribers, one watcher task
+    refreshes it from upstream as its forecast expires.
+    """
+
+    def __init__(self,
+                 keepalive: float = STREAM_KEEPALIVE,
+                 queue_size: int = STREAM_QUEUE_SIZE,
+                 min_refresh_interval: float = STREAM_MIN_REFRESH_INTERVAL,
+                 retry_interval: float = STREAM_RETRY_INTERVAL):
+        self.keepalive = keepalive
+        self.queue_size = queue_size
+        self.min_refresh_interval = min_refresh_interval
+        self.retry_interval = retry_interval
+        self.published = 0
+        self.dropped = 0
+        self._subscribers: dict[Cell, set[asyncio.Queue]] = {}
+        self._watchers: dict[Cell, asyncio.Task] = {}
+
+    @property
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def start(self):
+        if self.publish not in weather.response_listeners:
+            weather.response_listeners.append(self.publish)
+
+    async def stop(self):
+        """Stops publishing and watching, and ends every open stream."""
+        if self.publish in weather.response_listeners:
+            weather.response_listeners.remove(self.publish)
+        watchers = list(self._watchers.values())
+        self._watchers.clear()
+        for task in watchers:
+            task.cancel()
+        await asyncio.gather(*watchers, return_exceptions=True)
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._end(queue)
+
+    async def events(self, lat: float, lon: float) -> AsyncIterator[bytes]:
+        """Event stream of the grid cell of lat/lon; ends when the subscriber falls behind."""
+        cell = (snap_coordinate(lat), snap_coordinate(lon))
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribe(cell, queue)
+        try:
+            # subscribed first, so no change between this snapshot and the first event is lost
+            overview = await weather.get_overview_response(*cell)
+            hourly = await weather.get_hourly_response(*cell)
+            # one watcher per cell, started once its forecast is cached
+            if cell not in self._watchers and cell in self._subscribers:
+                self._watchers[cell] = asyncio.create_task(self._watch(cell))
+            snapshot = (sse_event("overview", overview.body),
+                        sse_event("hourly", hourly_delta(None, hourly.model) or b'{"hours":[]}'))
+            # fetching the snapshot may have cached it first and so published it to this queue too
+            queued = [queue.get_nowait() for _ in range(queue.qsize())]
+            for event in queued:
+                if event not in snapshot:
+                    queue.put_nowait(event)
+            for event in snapshot:
+                yield event
+            del snapshot, event  # not held for the life of the connection
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            self._unsubscribe(cell, queue)
+
+    def publish(self, key: tuple, previous: CachedResponse | None, entry: CachedResponse):
+        """Response cache listener: fans a changed overview or hourly forecast out to the cell's subscribers."""
+        endpoint, cell, selection = key[0], key[1:3], key[3:]
+        queues = self._subscribers.get(cell)
+        if not queues or selection or endpoint not in ("overview", "hourly"):
+            return
+        if previous is not None and previous.body == entry.body:
+            return
+        if endpoint == "overview":
+            event = sse_event("overview", entry.body)
+        else:
+            delta = hourly_delta(previous.model if previous is not None else None, entry.model)
+            if delta is None:
+                return
+            event = sse_event("hourly", delta)
+        self.published += 1
+        for queue in list(queues):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # it would miss this change; disconnect it so it reconnects to a fresh snapshot
+                self.dropped += 1
+                queues.discard(queue)
+                self._end(queue)
+
+    @staticmethod
+    def _end(queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def _subscribe(self, cell: Cell, queue: asyncio.Queue):
+        self._subscribers.setdefault(cell, set()).add(queue)
+
+    def _unsubscribe(self, cell: Cell, queue: asyncio.Queue):
+        queues = self._subscribers.get(cell)
+        if queues is not None:
+            queues.discard(queue)
+            if queues:
+                return
+            del self._subscribers[cell]
+        watcher = self._watchers.pop(cell, None)
+        if watcher is not None:
+            watcher.cancel()
+
+    async def _watch(self, cell: Cell):
+        """Refreshes the cell from upstream whenever its cached overview has expired."""
+        key = ("overview", *cell)
+        while True:
+            entry = weather.response_cache.get(key)
+            if entry is None:
+                try:
+                    await weather.refresh_forecasts([cell])
+                except AppError as e:
+                    logger.warning("Refreshing streamed grid cell %s failed: %s", cell, e)
+                    await asyncio.sleep(self.retry_interval)
+                    continue
+                entry = weather.response_cache.get(key)
+            wait = entry.expires_at - time.time() if entry is not None else self.retry_interval
+            await asyncio.sleep(max(self.min_refresh_interval, wait))
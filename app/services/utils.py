@@ -1,4 +1,4 @@
-from .config import GEOCODE_DEFAULT_PARAMS
+from .config import GEOCODE_DEFAULT_PARAMS, COORDINATE_GRID_STEP
 
 def build_geocode_params(street, housenumber, city, postalcode, country=None):
     params = {
@@ -12,3 +12,18 @@ def build_geocode_params(street, housenumber, city, postalcode, country=None):
     # Append defaults at the end
     params.update(GEOCODE_DEFAULT_PARAMS)
     return params
+
+
+def geocode_cache_key(params: dict) -> tuple:
+    """Case-folded, whitespace-collapsed key so equivalent address searches match."""
+    return tuple(sorted(
+        (key, " ".join(str(value).split()).casefold())
+        for key, value in params.items()
+    ))
+
+
+def snap_coordinate(value: float, step: float = COORDINATE_GRID_STEP) -> float:
+    """Snaps a latitude/longitude to the configured grid so nearby points share a cache key."""
+    if step <= 0:
+        return value
+    return round(round(value / step) * step, 6)  # drop float noise like 52.519999999
@@ -1,62 +1,242 @@
-import openmeteo_requests
-import requests_cache
-from retry_requests import retry
+import asyncio
+import logging
+import math
+import time
+
 from app.mapper.weather import map_openmeteo_overview, map_openmeteo_hourly_forecast, map_openmeteo_daily_forecast
+from app.mapper.weather import map_openmeteo_hourly_columns, map_openmeteo_daily_columns
+from app.mapper.weather import CURRENT_VARIABLES, HOURLY_VARIABLES, DAILY_VARIABLES
 from app.models.weather import WeatherOverview, HourlyWeatherData, DailyWeatherData
+from app.core.backends import create_backend
+from app.core.cache import TTLCache, CachedResponse
+from app.core.errors import ExternalApiError
+from app.core.singleflight import SingleFlight
+from .config import (
+	OPENMETEO_BASE_URL as BASE_URL,
+	RESPONSE_CACHE_MAXSIZE,
+	RESPONSE_CACHE_MAX_BYTES,
+	RESPONSE_STALE_WHILE_REVALIDATE,
+	RESPONSE_STALE_IF_ERROR,
+	FORECAST_CACHE_BACKEND,
+	FORECAST_CACHE_PATH,
+	FORECAST_CACHE_REDIS_URL,
+	FORECAST_CACHE_MAX_BYTES,
+	FORECAST_WINDOW_STEP,
+)
+from .openmeteo import OpenMeteoClient, CachedPayload, decode_weather_api_response
+from .utils import snap_coordinate
 
-BASE_URL = "https://api.open-meteo.com/v1/forecast"
+# One upstream call per location serves overview, hourly and daily endpoints
+forecast_cache = create_backend(
+	FORECAST_CACHE_BACKEND,
+	path=FORECAST_CACHE_PATH,
+	url=FORECAST_CACHE_REDIS_URL,
+	max_bytes=FORECAST_CACHE_MAX_BYTES,
+)
+forecast_client = OpenMeteoClient(forecast_cache, expire_after=1800) # 30 min
 
-overview_session = requests_cache.CachedSession('.cache_overview', expire_after=1800) # 30 min
-overview_client = openmeteo_requests.Client(session=retry(overview_session, retries=5, backoff_factor=0.2))
+logger = logging.getLogger(__name__)
 
-hourly_forecast_session = requests_cache.CachedSession('.cache_hour_forecast', expire_after=3000) # 50 min
-hourly_forecast_client = openmeteo_requests.Client(session=retry(hourly_forecast_session, retries=5, backoff_factor=0.2))
+# Mapped responses per (endpoint, grid cell), expiring together with the upstream payload
+# and kept long enough afterwards to be served stale
+response_cache = TTLCache(
+	maxsize=RESPONSE_CACHE_MAXSIZE, ttl=1800,
+	keep_stale=max(RESPONSE_STALE_WHILE_REVALIDATE, RESPONSE_STALE_IF_ERROR),
+	max_bytes=RESPONSE_CACHE_MAX_BYTES, sizeof=lambda entry: entry.nbytes,
+)
 
-daily_forecast_session = requests_cache.CachedSession('.cache_daily_forecast', expire_after=1800) # 30 min
-daily_forecast_client = openmeteo_requests.Client(session=retry(daily_forecast_session, retries=5, backoff_factor=0.2))
+# Concurrent misses for the same grid cell / cache key share one in-flight call
+forecast_flights = SingleFlight()
+response_flights = SingleFlight()
+# Cache keys a background batch refresh is running for, and the running refresh tasks
+# (the event loop only keeps weak references to tasks)
+revalidating: set = set()
+revalidation_tasks: set[asyncio.Task] = set()
+# Called as listener(key, previous entry or None, new entry) whenever a mapped response is cached
+response_listeners: list = []
 
-overview_params = {
-	"current": ["weather_code", "temperature_2m"],
-	"daily": ["weather_code", "temperature_2m_min", "temperature_2m_max"],
-	"timezone": "auto",
-	"forecast_days": 1,
-}
-hourly_params = {
-	"hourly": ["weather_code", "temperature_2m", "rain", "snowfall", "cloud_cover", "wind_speed_10m"],
+forecast_params = {
+	"current": CURRENT_VARIABLES,
+	"hourly": HOURLY_VARIABLES,
+	"daily": DAILY_VARIABLES,
 	"timezone": "auto",
 }
-daily_params = {
-	"daily": ["weather_code", "temperature_2m_mean", "rain_sum", "snowfall_sum", "wind_gusts_10m_max"],
-}
-async def api_call_overview(lat: float, lon: float):
-	params = overview_params.copy()
-	params["latitude"] = str(lat)
-	params["longitude"] = str(lon)
-	responses = overview_client.weather_api(BASE_URL, params=params)
-	return responses[0]
-
-async def api_call_hourly_forecast(lat: float, lon: float):
-	params = hourly_params.copy()
-	params["latitude"] = str(lat)
-	params["longitude"] = str(lon)
-	responses = hourly_forecast_client.weather_api(BASE_URL, params=params)
-	return responses[0]
-
-async def api_call_daily_forecast(lat: float, lon: float):
-	params = daily_params.copy()
-	params["latitude"] = str(lat)
-	params["longitude"] = str(lon)
-	responses = daily_forecast_client.weather_api(BASE_URL, params=params)
-	return responses[0]
+
+async def api_call_forecast(lat: float, lon: float) -> CachedPayload:
+	params = forecast_params.copy()
+	params["latitude"] = str(snap_coordinate(lat))
+	params["longitude"] = str(snap_coordinate(lon))
+	return await forecast_flights.do(
+		(params["latitude"], params["longitude"]),
+		lambda: forecast_client.fetch(BASE_URL, params=params)
+	)
+
+async def get_cached_response(endpoint: str, mapper, lat: float, lon: float, selection: tuple = ()) -> CachedResponse:
+	"""Fresh cached response, else a recently expired one while a background call
+	refreshes it, else one from upstream; if that fails, an older stale one."""
+	key = (endpoint, snap_coordinate(lat), snap_coordinate(lon), *selection)
+	entry = response_cache.get(key)
+	if entry is not None:
+		return entry
+	entry = response_cache.get_stale(key, RESPONSE_STALE_WHILE_REVALIDATE)
+	if entry is not None:
+		response_flights.start(key, lambda: revalidate(key, mapper, lat, lon))
+		return entry
+	try:
+		return await response_flights.do(key, lambda: map_and_cache(key, mapper, lat, lon))
+	except ExternalApiError:
+		entry = response_cache.get_stale(key, RESPONSE_STALE_IF_ERROR)
+		if entry is None:
+			raise
+		return entry
+
+async def map_and_cache(key, mapper, lat: float, lon: float) -> CachedResponse:
+	payload = await api_call_forecast(lat, lon)
+	return cache_mapped_payload(key, mapper, payload)
+
+async def revalidate(key, mapper, lat: float, lon: float) -> CachedResponse:
+	try:
+		return await map_and_cache(key, mapper, lat, lon)
+	except Exception as e:
+		# the stale entry was already served, so nobody else may see this failure
+		logger.warning("Revalidating %s response failed: %s", key[0], e)
+		raise
+
+def cache_mapped_payload(key, mapper, payload: CachedPayload) -> CachedResponse:
+	response = decode_weather_api_response(payload.content)[0]
+	entry = CachedResponse(mapper(response), expires_at=payload.expires_at)
+	previous = response_cache.get_stale(key, math.inf) if response_listeners else None
+	response_cache.set(key, entry, expires_at=payload.expires_at)
+	for listener in response_listeners:
+		listener(key, previous, entry)
+	return entry
+
+async def api_call_forecast_many(cells: list[tuple[float, float]]) -> list[CachedPayload]:
+	coordinates = [(str(lat), str(lon)) for lat, lon in cells]
+	return await forecast_client.fetch_many(BASE_URL, forecast_params, coordinates)
+
+async def cached_forecasts(cells: list[tuple[float, float]]) -> list[CachedPayload | None]:
+	"""Raw cached payloads of grid cells, without calling upstream."""
+	coordinates = [(str(lat), str(lon)) for lat, lon in cells]
+	return await forecast_client.peek_many(BASE_URL, forecast_params, coordinates)
+
+async def refresh_forecasts(cells: list[tuple[float, float]]) -> list[CachedPayload]:
+	"""Fetches grid cells upstream even if cached and replaces their raw cache entries.
+
+	Mapped responses are only replaced where one is cached already, fresh or stale:
+	a sweep over every saved location must not evict the responses users are reading."""
+	coordinates = [(str(lat), str(lon)) for lat, lon in cells]
+	payloads = await forecast_client.fetch_many(BASE_URL, forecast_params, coordinates, refresh=True)
+	for (lat, lon), payload in zip(cells, payloads):
+		for endpoint, mapper in (
+			("overview", map_openmeteo_overview),
+			("hourly", map_openmeteo_hourly_forecast),
+			("daily", map_openmeteo_daily_forecast),
+		):
+			key = (endpoint, lat, lon)
+			if response_cache.get_stale(key, math.inf) is not None:
+				cache_mapped_payload(key, mapper, payload)
+	return payloads
+
+async def get_cached_responses(endpoint: str, mapper, coordinates: list[tuple[float, float]]) -> list[CachedResponse]:
+	"""Batch variant of get_cached_response: one upstream call covers all cache misses,
+	one background call all recently expired entries."""
+	keys = [(endpoint, snap_coordinate(lat), snap_coordinate(lon)) for lat, lon in coordinates]
+	entries = {key: response_cache.get(key) for key in keys}
+	expired = []
+	for key, entry in entries.items():
+		if entry is None:
+			entries[key] = response_cache.get_stale(key, RESPONSE_STALE_WHILE_REVALIDATE)
+			if entries[key] is not None:
+				expired.append(key)
+	if expired:
+		revalidate_many(endpoint, mapper, expired)
+	missing = [key for key, entry in entries.items() if entry is None]
+	if missing:
+		try:
+			payloads = await api_call_forecast_many([key[1:] for key in missing])
+		except ExternalApiError:
+			stale = {key: response_cache.get_stale(key, RESPONSE_STALE_IF_ERROR) for key in missing}
+			if any(entry is None for entry in stale.values()):
+				raise
+			entries.update(stale)
+		else:
+			for key, payload in zip(missing, payloads):
+				entries[key] = cache_mapped_payload(key, mapper, payload)
+	return [entries[key] for key in keys]
+
+def revalidate_many(endpoint: str, mapper, keys: list[tuple]):
+	"""Refreshes expired entries in one background upstream call, skipping keys already being refreshed."""
+	keys = [key for key in keys if key not in revalidating]
+	if not keys:
+		return
+	revalidating.update(keys)
+
+	async def refresh():
+		try:
+			payloads = await api_call_forecast_many([key[1:] for key in keys])
+			for key, payload in zip(keys, payloads):
+				cache_mapped_payload(key, mapper, payload)
+		finally:
+			revalidating.difference_update(keys)
+
+	def done(task: asyncio.Task):
+		revalidation_tasks.discard(task)
+		if not task.cancelled() and task.exception() is not None:
+			logger.warning("Revalidating %d %s responses failed: %s", len(keys), endpoint, task.exception())
+
+	task = asyncio.ensure_future(refresh())
+	revalidation_tasks.add(task)
+	task.add_done_callback(done)
+
+def select(mapper, count: int | None, variables: list[str] | None) -> tuple[tuple, object]:
+	"""Cache key suffix and mapper for a forecast limited to `count` steps from now and/or
+	to some variables; mapped from the same cached upstream payload as the full forecast."""
+	if count is None and variables is None:
+		return (), mapper
+	if variables is not None:
+		variables = tuple(sorted(set(variables)))
+	# windows start at the current step, so they are mapped and cached per FORECAST_WINDOW_STEP
+	now = None if count is None else time.time() // FORECAST_WINDOW_STEP * FORECAST_WINDOW_STEP
+	return (count, variables, now), lambda response: mapper(response, count, variables, now=now)
+
+async def get_overview_response(lat: float, lon: float) -> CachedResponse:
+	return await get_cached_response("overview", map_openmeteo_overview, lat, lon)
+
+async def get_hourly_response(lat: float, lon: float, hours: int | None = None,
+							  variables: list[str] | None = None) -> CachedResponse:
+	selection, mapper = select(map_openmeteo_hourly_forecast, hours, variables)
+	return await get_cached_response("hourly", mapper, lat, lon, selection)
+
+async def get_daily_response(lat: float, lon: float, days: int | None = None,
+							 variables: list[str] | None = None) -> CachedResponse:
+	selection, mapper = select(map_openmeteo_daily_forecast, days, variables)
+	return await get_cached_response("daily", mapper, lat, lon, selection)
+
+async def get_hourly_columns_response(lat: float, lon: float, hours: int | None = None,
+									  variables: list[str] | None = None) -> CachedResponse:
+	selection, mapper = select(map_openmeteo_hourly_columns, hours, variables)
+	return await get_cached_response("hourly_columns", mapper, lat, lon, selection)
+
+async def get_daily_columns_response(lat: float, lon: float, days: int | None = None,
+									 variables: list[str] | None = None) -> CachedResponse:
+	selection, mapper = select(map_openmeteo_daily_columns, days, variables)
+	return await get_cached_response("daily_columns", mapper, lat, lon, selection)
+
+async def get_overview_responses(coordinates: list[tuple[float, float]]) -> list[CachedResponse]:
+	return await get_cached_responses("overview", map_openmeteo_overview, coordinates)
+
+async def get_hourly_responses(coordinates: list[tuple[float, float]]) -> list[CachedResponse]:
+	return await get_cached_responses("hourly", map_openmeteo_hourly_forecast, coordinates)
+
+async def get_daily_responses(coordinates: list[tuple[float, float]]) -> list[CachedResponse]:
+	return await get_cached_responses("daily", map_openmeteo_daily_forecast, coordinates)
 
 async def get_overview(lat: float, lon: float) -> WeatherOverview :
-	response = await api_call_overview(lat, lon)
-	return map_openmeteo_overview(response)
+	return (await get_overview_response(lat, lon)).model
 
 async def get_hourly_data(lat: float, lon: float) -> HourlyWeatherData :
-	response = await api_call_hourly_forecast(lat, lon)
-	return map_openmeteo_hourly_forecast(response)
+	return (await get_hourly_response(lat, lon)).model
 
 async def get_daily_data(lat: float, lon: float) -> DailyWeatherData :
-	response = await api_call_daily_forecast(lat, lon)
-	return map_openmeteo_daily_forecast(response)
+	return (await get_daily_response(lat, lon)).model
@@ -0,0 +1,98 @@
+"""Location reads/writes per second, connection per call vs pooled WAL connections.
+
+The reference class is the previous Database: a new connection for every call,
+rollback journal and default pragmas. Each run uses a fresh database file in a
+temporary directory and is repeated from several threads to show how readers
+and writers contend for the file.
+
+    python -m benchmarks.bench_database [--ops 5000] [--threads 1 4]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pydantic import TypeAdapter
+
+from app.Database import Database
+from app.models.geocode import SimpleLocation
+
+
+class ReferenceDatabase(Database):
+    """Database as it was before connection reuse: one connection per call, JSON column."""
+
+    def connect(self):
+        return sqlite3.connect(self.db_name)
+
+    def setup_db(self):
+        with self.connect() as con:
+            con.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY)")
+            con.execute("CREATE TABLE IF NOT EXISTS locations (username TEXT PRIMARY KEY, location_json TEXT NOT NULL)")
+
+    def close(self):
+        pass
+
+    def save_location(self, username: str, location: SimpleLocation):
+        location_json = location.model_dump_json()
+        with self.connect() as con:
+            con.execute("INSERT OR IGNORE INTO users (username) VALUES (?)", (username,))
+            con.execute("INSERT OR REPLACE INTO locations (username, location_json) VALUES (?, ?)",
+                        (username, location_json))
+
+    def get_location(self, username: str) -> SimpleLocation | None:
+        adapter = TypeAdapter(SimpleLocation)
+        with self.connect() as con:
+            row = con.execute("SELECT location_json FROM locations WHERE username = ?", (username,)).fetchone()
+        return None if row is None else adapter.validate_json(row[0])
+
+
+def location(i):
+    return SimpleLocation(name=f"Place {i}", lat=47.5 + (i % 700) / 100, lon=6.0 + (i % 900) / 100)
+
+
+def ops_per_second(db, op, ops, threads):
+    def work(offset):
+        for i in range(offset, ops, threads):
+            op(db, i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(work, range(threads)))
+    return ops / (time.perf_counter() - start)
+
+
+def write(db, i):
+    db.save_location(f"user{i}", location(i))
+
+
+def read(db, i):
+    db.get_location(f"user{i}")
+
+
+def run(cls, ops, threads):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = cls(os.path.join(tmp, "bench.sqlite"))
+        db.setup_db()
+        writes = ops_per_second(db, write, ops, threads)
+        reads = ops_per_second(db, read, ops, threads)
+        db.close()
+    return writes, reads
+
+
+def main(ops, thread_counts):
+    print(f"{ops} location writes, then {ops} reads")
+    print(f"{'implementation':<22} {'threads':>7} {'writes/s':>10} {'reads/s':>10}")
+    for threads in thread_counts:
+        for name, cls in (("connection per call", ReferenceDatabase), ("pooled WAL", Database)):
+            writes, reads = run(cls, ops, threads)
+            print(f"{name:<22} {threads:>7} {writes:>10.0f} {reads:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+    main(args.ops, args.threads)
@@ -0,0 +1,131 @@
+"""Hourly/daily forecast mapping: per-element reference mapper vs vectorized mapper.
+
+The reference functions below are the mappers as they were before vectorization.
+Both produce identical models; the script asserts that before timing them.
+The reference builds its time axis with pandas and pytz, which the service no
+longer depends on; install them to run it (`pip install pandas pytz`).
+
+    python -m benchmarks.bench_forecast_mappers [--repeat 200]
+"""
+import argparse
+import timeit
+
+import pandas as pd
+import pytz
+
+from app.mapper.weather import map_openmeteo_hourly_forecast, map_openmeteo_daily_forecast
+from app.models.weather import *
+from app.models.weatherCodes import map_weather_code
+from app.services.openmeteo import decode_weather_api_response
+from tests.openmeteo_fixtures import build_forecast_payload
+
+UTC_OFFSETS = (0, 3600, -18000, 19800)
+
+
+def reference_hourly_forecast(response) -> HourlyWeatherData:
+    utc_offset_seconds = response.UtcOffsetSeconds()
+    local_tz = pytz.FixedOffset(utc_offset_seconds / 60)
+    hourly = response.Hourly()
+    hourly_weather_code = hourly.Variables(0).ValuesAsNumpy()
+    hourly_temperature_2m = hourly.Variables(1).ValuesAsNumpy()
+    hourly_rain = hourly.Variables(2).ValuesAsNumpy()
+    hourly_snowfall = hourly.Variables(3).ValuesAsNumpy()
+    hourly_cloud_cover = hourly.Variables(4).ValuesAsNumpy()
+    hourly_wind_speed_10m = hourly.Variables(5).ValuesAsNumpy()
+    hourly_data = pd.date_range(
+        start=pd.to_datetime(hourly.Time(), unit="s", utc=True).tz_convert(local_tz),
+        end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True).tz_convert(local_tz),
+        freq=pd.Timedelta(seconds=hourly.Interval()),
+        inclusive="left"
+    )
+    daily = []
+    current_day = None
+    current_day_hours = []
+    for i, timestamp in enumerate(hourly_data):
+        day_str = timestamp.date().isoformat()
+        hourEntry = HourWeatherData(
+            timestamp=str(timestamp),
+            description=map_weather_code(int(hourly_weather_code[i])),
+            code=int(hourly_weather_code[i]),
+            temperature=float(hourly_temperature_2m[i]),
+            rain=float(hourly_rain[i]),
+            snowfall=float(hourly_snowfall[i]),
+            cloud_cover=int(hourly_cloud_cover[i]),
+            wind_speed=float(hourly_wind_speed_10m[i]),
+        )
+        if current_day is None:
+            current_day = day_str
+            current_day_hours.append(hourEntry)
+        elif day_str == current_day:
+            current_day_hours.append(hourEntry)
+        else:
+            daily.append(DailyHourWeatherData(timestamp=str(current_day), hours=current_day_hours))
+            current_day = day_str
+            current_day_hours = [hourEntry]
+    if current_day_hours:
+        daily.append(DailyHourWeatherData(timestamp=str(current_day), hours=current_day_hours))
+    return HourlyWeatherData(forecast=daily)
+
+
+def reference_daily_forecast(response) -> DailyWeatherData:
+    utc_offset_seconds = response.UtcOffsetSeconds()
+    local_tz = pytz.FixedOffset(utc_offset_seconds / 60)
+    daily = response.Daily()
+    daily_weather_code = daily.Variables(0).ValuesAsNumpy()
+    daily_temperature_2m_mean = daily.Variables(1).ValuesAsNumpy()
+    daily_rain_sum = daily.Variables(2).ValuesAsNumpy()
+    daily_snowfall_sum = daily.Variables(3).ValuesAsNumpy()
+    daily_wind_gusts_10m_max = daily.Variables(4).ValuesAsNumpy()
+    daily_data = pd.date_range(
+        start=pd.to_datetime(daily.Time(), unit="s", utc=True).tz_convert(local_tz),
+        end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True).tz_convert(local_tz),
+        freq=pd.Timedelta(seconds=daily.Interval()),
+        inclusive="left"
+    )
+    days = []
+    for i, timestamp in enumerate(daily_data):
+        days.append(DayWeatherData(
+            timestamp=str(timestamp),
+            description=map_weather_code(int(daily_weather_code[i])),
+            code=int(daily_weather_code[i]),
+            temperature=float(daily_temperature_2m_mean[i]),
+            rain=float(daily_rain_sum[i]),
+            snowfall=float(daily_snowfall_sum[i]),
+            wind_gust_max=float(daily_wind_gusts_10m_max[i]),
+        ))
+    return DailyWeatherData(days=days)
+
+
+def response_for(days, utc_offset_seconds):
+    payload = build_forecast_payload(days=days, utc_offset_seconds=utc_offset_seconds)
+    return decode_weather_api_response(payload)[0]
+
+
+def check_identical():
+    for days in (7, 16):
+        for offset in UTC_OFFSETS:
+            response = response_for(days, offset)
+            assert map_openmeteo_hourly_forecast(response).model_dump_json() == reference_hourly_forecast(response).model_dump_json()
+            assert map_openmeteo_daily_forecast(response).model_dump_json() == reference_daily_forecast(response).model_dump_json()
+
+
+def main(repeat):
+    check_identical()
+    print(f"mean per call over {repeat} runs (outputs verified identical)")
+    print(f"{'mapper':<8} {'days':>4} {'reference':>12} {'vectorized':>12} {'speedup':>8}")
+    for days in (7, 16):
+        response = response_for(days, 3600)
+        for name, reference, vectorized in (
+            ("hourly", reference_hourly_forecast, map_openmeteo_hourly_forecast),
+            ("daily", reference_daily_forecast, map_openmeteo_daily_forecast),
+        ):
+            ref = timeit.timeit(lambda: reference(response), number=repeat) / repeat * 1000
+            vec = timeit.timeit(lambda: vectorized(response), number=repeat) / repeat * 1000
+            print(f"{name:<8} {days:>4} {ref:9.3f} ms {vec:9.3f} ms {ref / vec:7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,68 @@
+"""Forecast cache hit ratio with raw vs grid-snapped coordinate keys.
+
+Saved locations are drawn like a real user base: households clustered around
+a few dozen cities (Zipf-sized, a few km spread), and every lookup carries the
+few metres of jitter that re-geocoding the same address produces. Within one
+cache lifetime a request hits if its key was already requested.
+
+    python -m benchmarks.bench_grid_cache_hits [--users 5000] [--requests 50000]
+"""
+import argparse
+
+import numpy as np
+
+from app.services.utils import snap_coordinate
+
+CITY_COUNT = 40
+CITY_SPREAD_KM = 4.0
+GEOCODE_JITTER_M = 15.0
+KM_PER_DEGREE = 111.0
+
+
+def saved_locations(rng, users):
+    city_weights = 1 / np.arange(1, CITY_COUNT + 1)
+    city_weights /= city_weights.sum()
+    cities = np.column_stack([rng.uniform(47.5, 54.5, CITY_COUNT), rng.uniform(6.0, 15.0, CITY_COUNT)])
+    city_of_user = rng.choice(CITY_COUNT, size=users, p=city_weights)
+    return cities[city_of_user] + rng.normal(0, CITY_SPREAD_KM / KM_PER_DEGREE, size=(users, 2))
+
+
+def lookups(rng, locations, requests):
+    # active users poll more often than others
+    activity = rng.pareto(1.5, len(locations)) + 1
+    users = rng.choice(len(locations), size=requests, p=activity / activity.sum())
+    exact = locations[users]
+    return exact, exact + rng.normal(0, GEOCODE_JITTER_M / 1000 / KM_PER_DEGREE, size=(requests, 2))
+
+
+def hit_ratio(points, key):
+    seen = set()
+    hits = 0
+    for lat, lon in points:
+        k = key(lat, lon)
+        hits += k in seen
+        seen.add(k)
+    return hits / len(points), len(seen)
+
+
+def main(users, requests, seed):
+    rng = np.random.default_rng(seed)
+    exact, regeocoded = lookups(rng, saved_locations(rng, users), requests)
+
+    print(f"{users} saved locations, {requests} lookups in one cache lifetime")
+    print(f"{'key':<14} {'saved coords':>22} {'re-geocoded coords':>22}")
+    keys = [("raw floats", lambda lat, lon: (str(lat), str(lon)))]
+    for step in (0.001, 0.01, 0.02, 0.1):
+        keys.append((f"snap {step}°", lambda lat, lon, step=step: (snap_coordinate(lat, step), snap_coordinate(lon, step))))
+    for name, key in keys:
+        columns = [f"{ratio:6.1%} hits {calls:6d} calls" for ratio, calls in (hit_ratio(exact, key), hit_ratio(regeocoded, key))]
+        print(f"{name:<14} {columns[0]:>22} {columns[1]:>22}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    main(args.users, args.requests, args.seed)
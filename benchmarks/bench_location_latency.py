@@ -0,0 +1,92 @@
+"""Location read latency on the event loop while writes are running.
+
+Readers fetch saved locations at a fixed rate while a growing number of writer
+coroutines keep saving. "blocking" calls the Database directly from the
+coroutines, as the routes used to; "LocationStore" goes through the reader pool
+and the group-committing writer thread.
+
+    python -m benchmarks.bench_location_latency [--seconds 2] [--readers 8] [--writers 0 8 32]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from app.Database import Database
+from app.models.geocode import SimpleLocation
+from app.services.locations import LocationStore
+
+USERS = 1000
+READ_INTERVAL = 0.002  # seconds between reads of one reader
+LOCATION = SimpleLocation(name="Berlin", lat=52.52, lon=13.405)
+
+
+class BlockingStore:
+    def __init__(self, db):
+        self.db = db
+
+    async def get(self, username):
+        return self.db.get_location(username)
+
+    async def save(self, username, location):
+        self.db.save_location(username, location)
+
+    def close(self):
+        self.db.close()
+
+
+async def run(store, seconds, readers, writers):
+    latencies: list[float] = []
+    writes = 0
+    deadline = time.perf_counter() + seconds
+
+    async def reader(n):
+        # latency counts from the scheduled start, so time spent waiting for a
+        # stalled event loop is included
+        i = n
+        scheduled = time.perf_counter()
+        while scheduled < deadline:
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            await store.get(f"user{i % USERS}")
+            latencies.append(time.perf_counter() - scheduled)
+            i += readers
+            scheduled += READ_INTERVAL
+
+    async def writer(n):
+        nonlocal writes
+        i = n
+        while time.perf_counter() < deadline:
+            await store.save(f"user{i % USERS}", LOCATION)
+            writes += 1
+            i += writers
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(reader(n) for n in range(readers)), *(writer(n) for n in range(writers)))
+    quantiles = statistics.quantiles(latencies, n=100)
+    return quantiles[49] * 1000, quantiles[98] * 1000, writes / seconds
+
+
+def main(seconds, readers, writer_counts):
+    print(f"{readers} readers, {seconds}s per run")
+    print(f"{'implementation':<15} {'writers':>7} {'read p50 ms':>12} {'read p99 ms':>12} {'writes/s':>10}")
+    for writers in writer_counts:
+        for name, cls in (("blocking", BlockingStore), ("LocationStore", LocationStore)):
+            with tempfile.TemporaryDirectory() as tmp:
+                db = Database(os.path.join(tmp, "bench.sqlite"))
+                db.setup_db()
+                db.save_locations([(f"user{i}", LOCATION) for i in range(USERS)])
+                store = cls(db)
+                p50, p99, write_rate = asyncio.run(run(store, seconds, readers, writers))
+                store.close()
+            print(f"{name:<15} {writers:>7} {p50:>12.3f} {p99:>12.3f} {write_rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, nargs="+", default=[0, 8, 32])
+    args = parser.parse_args()
+    main(args.seconds, args.readers, args.writers)
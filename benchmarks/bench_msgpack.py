@@ -0,0 +1,62 @@
+"""Forecast body encode/decode throughput, JSON vs float32 MessagePack.
+
+"encode" is the service side of a response cache miss: serializing the mapped
+model into the body of a CachedResponse, as JSON or as MessagePack with float32
+floats. "decode" is the consumer side: json.loads or msgpack.unpackb of the
+body. Both the nested and the columnar forecast layouts are measured. Needs
+the msgpack package.
+
+    python -m benchmarks.bench_msgpack [--repeat 300]
+"""
+import argparse
+import json
+import timeit
+
+import msgpack
+
+from app.core.cache import CachedResponse
+from app.mapper.weather import (
+    map_openmeteo_hourly_forecast,
+    map_openmeteo_daily_forecast,
+    map_openmeteo_hourly_columns,
+    map_openmeteo_daily_columns,
+)
+from app.services.openmeteo import decode_weather_api_response
+from tests.openmeteo_fixtures import build_forecast_payload
+
+MODELS = (
+    ("hourly", "nested", map_openmeteo_hourly_forecast),
+    ("hourly", "columnar", map_openmeteo_hourly_columns),
+    ("daily", "nested", map_openmeteo_daily_forecast),
+    ("daily", "columnar", map_openmeteo_daily_columns),
+)
+
+ENCODINGS = (
+    ("json", lambda model: CachedResponse(model).body, json.loads),
+    ("msgpack", lambda model: CachedResponse(model).packed, msgpack.unpackb),
+)
+
+
+def per_call_us(fn, repeat):
+    return timeit.timeit(fn, number=repeat) / repeat * 1e6
+
+
+def main(repeat):
+    print(f"7-day forecast, mean per call over {repeat} runs")
+    print(f"{'endpoint':<8} {'layout':<9} {'encoding':<8} {'bytes':>7} {'encode us':>10} {'decode us':>10} {'decode MB/s':>12}")
+    response = decode_weather_api_response(build_forecast_payload(days=7, utc_offset_seconds=3600))[0]
+    for endpoint, layout, mapper in MODELS:
+        model = mapper(response)
+        for name, encode, decode in ENCODINGS:
+            body = encode(model)
+            encode_us = per_call_us(lambda: encode(model), repeat)
+            decode_us = per_call_us(lambda: decode(body), repeat)
+            print(f"{endpoint:<8} {layout:<9} {name:<8} {len(body):>7} {encode_us:>10.1f} {decode_us:>10.1f} "
+                  f"{len(body) / decode_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+    main(args.repeat)
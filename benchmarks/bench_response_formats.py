@@ -0,0 +1,49 @@
+"""Forecast response size and build time, nested objects vs columnar arrays.
+
+"build" maps a decoded payload and serializes the model, which is what a
+response cache miss costs; "encode" is the serialization alone. Sizes are the
+raw body and the body after gzip at level 6.
+
+    python -m benchmarks.bench_response_formats [--repeat 200]
+"""
+import argparse
+import gzip
+import timeit
+
+from app.mapper.weather import (
+    map_openmeteo_hourly_forecast,
+    map_openmeteo_daily_forecast,
+    map_openmeteo_hourly_columns,
+    map_openmeteo_daily_columns,
+)
+from app.services.openmeteo import decode_weather_api_response
+from tests.openmeteo_fixtures import build_forecast_payload
+
+FORMATS = (
+    ("hourly", "nested", map_openmeteo_hourly_forecast),
+    ("hourly", "columnar", map_openmeteo_hourly_columns),
+    ("daily", "nested", map_openmeteo_daily_forecast),
+    ("daily", "columnar", map_openmeteo_daily_columns),
+)
+
+
+def main(repeat):
+    print(f"mean per call over {repeat} runs")
+    print(f"{'endpoint':<8} {'days':>4} {'format':<9} {'bytes':>7} {'gzip':>6} {'encode ms':>10} {'build ms':>9}")
+    for days in (7, 16):
+        response = decode_weather_api_response(build_forecast_payload(days=days, utc_offset_seconds=3600))[0]
+        for endpoint, name, mapper in FORMATS:
+            model = mapper(response)
+            body = model.model_dump_json(exclude_unset=True).encode()
+            encode = timeit.timeit(lambda: model.model_dump_json(exclude_unset=True), number=repeat) / repeat * 1000
+            build = timeit.timeit(lambda: mapper(response).model_dump_json(exclude_unset=True),
+                                  number=repeat) / repeat * 1000
+            print(f"{endpoint:<8} {days:>4} {name:<9} {len(body):>7} {len(gzip.compress(body, 6)):>6} "
+                  f"{encode:>10.3f} {build:>9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,73 @@
+"""Cold start time and memory of a worker process.
+
+Every run is a fresh interpreter in an empty working directory, so database
+and cache files are created from scratch. "import" is the time to import
+`app.main`, "ready" the time until the lifespan has run and /weather/ready
+answers 200, both from interpreter start. "legacy imports" additionally loads
+what the module used to pull in at import time: pandas, pytz,
+openmeteo_requests and requests_cache with its three cached sessions. None of
+them are dependencies any more; install them to run that row
+(`pip install pandas pytz openmeteo_requests requests-cache`).
+
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, resource, time
+start = time.perf_counter()
+LEGACY
+import app.main
+imported = time.perf_counter() - start
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    while client.get("/weather/ready").status_code != 200:
+        time.sleep(0.001)
+    ready = time.perf_counter() - start
+print(json.dumps({
+    "import": imported,
+    "ready": ready,
+    "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+LEGACY = """
+import pandas, pytz, openmeteo_requests, requests_cache
+sessions = [requests_cache.CachedSession(name, expire_after=1800)
+            for name in (".cache_overview", ".cache_hour_forecast", ".cache_daily_forecast")]
+"""
+
+
+def measure(legacy: bool) -> dict:
+    code = CHILD.replace("LEGACY", LEGACY if legacy else "")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    with tempfile.TemporaryDirectory() as tmp:
+        out = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env,
+                             capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(runs):
+    print(f"{runs} fresh processes per row, median")
+    print(f"{'startup':<15} {'import ms':>10} {'ready ms':>10} {'max RSS MiB':>12}")
+    for name, legacy in (("legacy imports", True), ("lazy", False)):
+        samples = [measure(legacy) for _ in range(runs)]
+        imported = statistics.median(s["import"] for s in samples) * 1000
+        ready = statistics.median(s["ready"] for s in samples) * 1000
+        rss = statistics.median(s["rss"] for s in samples)
+        print(f"{name:<15} {imported:>10.0f} {ready:>10.0f} {rss:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    main(args.runs)
@@ -0,0 +1,130 @@
+"""Forecast streaming at growing connection counts on one grid cell.
+
+N subscribers hold an open event stream of the same cell. One upstream refresh
+then changes the current temperature and six hours of the 7-day forecast.
+Reported per N: memory held per open connection (tracemalloc), latency from
+the start of the refresh until each subscriber has the change, upstream calls
+for that change, and bytes sent to all subscribers. The last columns are the
+alternative of N clients polling overview and hourly once: time to serve the
+N cache hits and the bytes they transfer. The upstream is simulated.
+
+    python -m benchmarks.bench_stream_connections [--connections 100 1000 10000]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import numpy as np
+
+from app.services import weather
+from app.services.openmeteo import CachedPayload
+from app.services.stream import ForecastStream
+from tests.openmeteo_fixtures import build_weather_api_message
+
+START = 1609459200
+CELL = (52.52, 13.41)
+HOURS = 7 * 24
+
+
+def payload(current_temperature, temperatures) -> CachedPayload:
+    content = build_weather_api_message(
+        current={"time": START, "interval": 900, "variables": [3, current_temperature]},
+        hourly={
+            "time": START, "time_end": START + HOURS * 3600, "interval": 3600,
+            "variables": [[3] * HOURS, temperatures, [0.0] * HOURS, [0.0] * HOURS, [50.0] * HOURS, [2.0] * HOURS],
+        },
+        daily={
+            "time": START, "time_end": START + 7 * 86400, "interval": 86400,
+            "variables": [[3] * 7, [10.0] * 7, [0.0] * 7, [0.0] * 7, [5.0] * 7, [8.0] * 7, [12.0] * 7],
+        },
+    )
+    return CachedPayload(content, time.time() + 3600)
+
+
+TEMPERATURES = [10.0 + (i % 24) / 4 for i in range(HOURS)]
+BEFORE = payload(12.5, TEMPERATURES)
+AFTER = payload(13.0, TEMPERATURES[:100] + [t + 1.0 for t in TEMPERATURES[100:106]] + TEMPERATURES[106:])
+
+
+async def run(n):
+    weather.response_cache.clear()
+    upstream_calls = 0
+
+    async def api_call_forecast(*args, **kwargs):
+        return BEFORE
+
+    async def fetch_many(*args, **kwargs):
+        nonlocal upstream_calls
+        upstream_calls += 1
+        return [AFTER]
+
+    stream = ForecastStream(keepalive=3600, queue_size=4, min_refresh_interval=3600)
+    stream.start()
+    with patch.object(weather, "api_call_forecast", api_call_forecast), \
+         patch.object(weather.forecast_client, "fetch_many", fetch_many):
+        # prime the cache so that connecting costs no upstream call
+        await weather.get_overview_response(*CELL)
+        await weather.get_hourly_response(*CELL)
+
+        connected = 0
+        changed = asyncio.Event()
+        received: list[tuple[float, int]] = []
+
+        async def subscriber():
+            nonlocal connected
+            events = stream.events(*CELL)
+            await anext(events)
+            await anext(events)
+            connected += 1
+            size = 0
+            for _ in range(2):  # overview and hourly delta
+                size += len(await anext(events))
+            received.append((time.perf_counter(), size))
+            if len(received) == n:
+                changed.set()
+            await events.aclose()
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        tasks = [asyncio.create_task(subscriber()) for _ in range(n)]
+        while connected < n:
+            await asyncio.sleep(0.01)
+        per_connection = (tracemalloc.get_traced_memory()[0] - baseline) / n
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        await weather.refresh_forecasts([CELL])
+        await changed.wait()
+        latencies = np.array([at - start for at, _ in received]) * 1000
+        stream_bytes = sum(size for _, size in received)
+        await asyncio.gather(*tasks)
+
+        # the same clients polling both endpoints once instead
+        start = time.perf_counter()
+        poll_bytes = 0
+        for _ in range(n):
+            poll_bytes += len((await weather.get_overview_response(*CELL)).body)
+            poll_bytes += len((await weather.get_hourly_response(*CELL)).body)
+        poll_ms = (time.perf_counter() - start) * 1000
+    await stream.stop()
+    weather.response_cache.clear()
+    return per_connection, latencies, upstream_calls, stream_bytes, poll_ms, poll_bytes
+
+
+def main(connections):
+    print(f"{'conns':>6} {'KiB/conn':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'upstream':>8} "
+          f"{'push kB':>9} {'poll ms':>8} {'poll kB':>9}")
+    for n in connections:
+        per_connection, latencies, upstream_calls, stream_bytes, poll_ms, poll_bytes = asyncio.run(run(n))
+        print(f"{n:>6} {per_connection / 1024:>9.2f} {np.percentile(latencies, 50):>8.2f} "
+              f"{np.percentile(latencies, 99):>8.2f} {latencies.max():>8.2f} {upstream_calls:>8} "
+              f"{stream_bytes / 1000:>9.1f} {poll_ms:>8.2f} {poll_bytes / 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+    main(args.connections)
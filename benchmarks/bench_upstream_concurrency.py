@@ -0,0 +1,98 @@
+"""Latency of concurrent cache-missing forecast lookups: blocking client vs async client.
+
+Every request hits a simulated Open-Meteo upstream with a fixed round-trip time.
+The legacy path calls the synchronous openmeteo_requests client from a coroutine,
+exactly like the old services did, so each miss freezes the event loop. The
+service no longer depends on that client; install it to run the script
+(`pip install openmeteo_requests`).
+
+    python -m benchmarks.bench_upstream_concurrency [--requests 200] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+import openmeteo_requests
+
+from app.core.backends import SQLiteBackend
+from app.services.openmeteo import OpenMeteoClient
+from tests.openmeteo_fixtures import build_weather_api_message
+
+URL = "https://api.open-meteo.com/v1/forecast"
+PAYLOAD = build_weather_api_message(current={"time": 0, "variables": [3, 12.5]})
+
+
+class BlockingResponse:
+    status_code = 200
+    content = PAYLOAD
+
+    def raise_for_status(self):
+        pass
+
+
+class BlockingSession:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get(self, url, params=None, **kwargs):
+        time.sleep(self.latency)
+        return BlockingResponse()
+
+    def close(self):
+        pass
+
+
+def params_for(i):
+    return {"current": ["weather_code", "temperature_2m"], "latitude": str(40 + i * 0.01), "longitude": "10.0"}
+
+
+async def run(call, n):
+    # all requests arrive at once, latency is measured from arrival to completion
+    latencies = []
+    start = time.perf_counter()
+
+    async def one(i):
+        await call(params_for(i))
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return np.array(latencies), time.perf_counter() - start
+
+
+def report(name, latencies, wall):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{name:<10} p50={p50:8.1f} ms  p99={p99:8.1f} ms  wall={wall:6.2f} s  ({len(latencies) / wall:7.1f} req/s)")
+
+
+async def main(n, latency):
+    legacy = openmeteo_requests.Client(session=BlockingSession(latency))
+
+    async def legacy_call(params):
+        return legacy.weather_api(URL, params=params)
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, content=PAYLOAD)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = OpenMeteoClient(SQLiteBackend(str(Path(tmp) / "cache.sqlite"), max_bytes=2**30), expire_after=60,
+                                 http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+        async def async_call(params):
+            return await client.weather_api(URL, params)
+
+        print(f"{n} concurrent cache misses, simulated upstream latency {latency * 1000:.0f} ms")
+        report("blocking", *await run(legacy_call, n))
+        report("async", *await run(async_call, n))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.latency))
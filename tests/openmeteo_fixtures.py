@@ -0,0 +1,96 @@
+import flatbuffers
+import numpy as np
+
+# Shared helpers for building real Open-Meteo FlatBuffers payloads in tests and benchmarks.
+
+HOUR = 3600
+DAY = 86400
+
+
+def _build_variables_with_time(builder, section: dict) -> int:
+    variable_offsets = []
+    for values in section["variables"]:
+        values_offset = None
+        if not np.isscalar(values):
+            values_offset = builder.CreateNumpyVector(np.asarray(values, dtype=np.float32))
+        builder.StartObject(4)
+        if values_offset is None:
+            builder.PrependFloat32Slot(2, float(values), 0.0)
+        else:
+            builder.PrependUOffsetTRelativeSlot(3, values_offset, 0)
+        variable_offsets.append(builder.EndObject())
+
+    builder.StartVector(4, len(variable_offsets), 4)
+    for offset in reversed(variable_offsets):
+        builder.PrependUOffsetTRelative(offset)
+    variables = builder.EndVector()
+
+    builder.StartObject(4)
+    builder.PrependInt64Slot(0, section["time"], 0)
+    builder.PrependInt64Slot(1, section.get("time_end", 0), 0)
+    builder.PrependInt32Slot(2, section.get("interval", 0), 0)
+    builder.PrependUOffsetTRelativeSlot(3, variables, 0)
+    return builder.EndObject()
+
+
+def build_weather_api_message(lat=52.52, lon=13.41, utc_offset_seconds=0,
+                              current=None, hourly=None, daily=None) -> bytes:
+    """Builds one length-prefixed WeatherApiResponse message as sent by Open-Meteo."""
+    builder = flatbuffers.Builder(1024)
+    sections = {}
+    for slot, section in ((9, current), (10, daily), (11, hourly)):
+        if section is not None:
+            sections[slot] = _build_variables_with_time(builder, section)
+
+    builder.StartObject(14)
+    builder.PrependFloat32Slot(0, lat, 0.0)
+    builder.PrependFloat32Slot(1, lon, 0.0)
+    builder.PrependInt32Slot(6, utc_offset_seconds, 0)
+    for slot, offset in sections.items():
+        builder.PrependUOffsetTRelativeSlot(slot, offset, 0)
+    builder.Finish(builder.EndObject())
+
+    payload = bytes(builder.Output())
+    return len(payload).to_bytes(4, byteorder="little") + payload
+
+
+
+def build_forecast_payload(start=1609459200, days=7, lat=52.52, lon=13.41, utc_offset_seconds=0) -> bytes:
+    """Builds a realistic single-location forecast payload with `days` days of data."""
+    hours = days * 24
+    hour_index = np.arange(hours)
+    day_index = np.arange(days)
+    codes = np.array([0, 1, 2, 3, 45, 61, 63, 71, 80, 95])
+    return build_weather_api_message(
+        lat=lat,
+        lon=lon,
+        utc_offset_seconds=utc_offset_seconds,
+        current={"time": start, "interval": 900, "variables": [3, 12.5]},
+        hourly={
+            "time": start,
+            "time_end": start + hours * HOUR,
+            "interval": HOUR,
+            "variables": [
+                codes[hour_index % len(codes)],
+                10.0 + np.sin(hour_index / 24 * 2 * np.pi) * 5,
+                (hour_index % 5) * 0.1,
+                np.zeros(hours),
+                (hour_index * 7) % 101,
+                5.0 + (hour_index % 10) * 0.5,
+            ],
+        },
+        daily={
+            "time": start,
+            "time_end": start + days * DAY,
+            "interval": DAY,
+            "variables": [
+                codes[day_index % len(codes)],
+                10.0 + day_index * 0.5,
+                day_index * 0.2,
+                np.zeros(days),
+                20.0 + day_index,
+                5.0 + day_index * 0.5,
+                15.0 + day_index * 0.5,
+            ],
+        },
+    )
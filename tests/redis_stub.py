@@ -0,0 +1,81 @@
+"""Minimal in-process Redis-protocol server for tests.
+
+Speaks RESP2, or RESP3 after HELLO 3, and supports the commands the cache
+backend uses (GET, MGET, SET with PX, DEL, PING); any other command, like
+redis-py's CLIENT SETINFO handshake, gets +OK.
+"""
+import asyncio
+import time
+
+
+class RedisStub:
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, float]] = {}
+        self.commands: list[list[bytes]] = []
+        self.server: asyncio.AbstractServer | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}/0"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _lookup(self, key: bytes) -> bytes | None:
+        item = self.data.get(key)
+        if item is None or item[1] <= time.time():
+            self.data.pop(key, None)
+            return None
+        return item[0]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        resp3 = False
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                self.commands.append(args)
+                if args[0].upper() == b"HELLO":
+                    resp3 = len(args) > 1 and args[1] == b"3"
+                    writer.write(b"%1\r\n+proto\r\n:3\r\n" if resp3 else b"*2\r\n+proto\r\n:2\r\n")
+                else:
+                    writer.write(self._execute(args, resp3))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def _execute(self, args: list[bytes], resp3: bool) -> bytes:
+        command = args[0].upper()
+        if command == b"GET":
+            return bulk(self._lookup(args[1]), resp3)
+        if command == b"MGET":
+            return b"*%d\r\n" % (len(args) - 1) + b"".join(bulk(self._lookup(key), resp3) for key in args[1:])
+        if command == b"SET":
+            expires_at = float("inf")
+            options = [arg.upper() for arg in args[3:]]
+            if b"PX" in options:
+                expires_at = time.time() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args[1:])
+        if command == b"PING":
+            return b"+PONG\r\n"
+        return b"+OK\r\n"
+
+
+def bulk(value: bytes | None, resp3: bool) -> bytes:
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
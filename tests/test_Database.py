@@ -1,5 +1,6 @@
 import pytest
 import sqlite3
+import threading
 import tempfile
 from unittest.mock import patch, MagicMock
 from app.Database import Database
@@ -67,3 +68,81 @@ def test_get_location_raises_database_error(monkeypatch):
 
     with pytest.raises(sqlite3.DatabaseError, match="DB fail"):
         db.get_location(USERNAME)
+
+
+def test_connect_reuses_connection_per_thread(db_instance):
+    con = db_instance.connect()
+    assert db_instance.connect() is con
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db_instance.connect()))
+    thread.start()
+    thread.join()
+    assert other[0] is not con
+
+
+def test_connect_enables_wal_and_pragmas(db_instance):
+    con = db_instance.connect()
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert con.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert con.execute("PRAGMA cache_size").fetchone()[0] == -8000
+
+
+def test_close_reopens_on_next_use(db_instance):
+    db_instance.save_location(USERNAME, TEST_LOCATION)
+    con = db_instance.connect()
+    db_instance.close()
+
+    assert db_instance.connect() is not con
+    assert db_instance.get_location(USERNAME) == TEST_LOCATION
+
+
+def test_save_locations_in_one_transaction(db_instance):
+    other = SimpleLocation(name="Other", lat=1.0, lon=2.0)
+    db_instance.save_locations([(USERNAME, TEST_LOCATION), ("bob", other), (USERNAME, other)])
+
+    assert db_instance.get_location(USERNAME) == other
+    assert db_instance.get_location("bob") == other
+
+
+def test_export_locations_pages(db_instance):
+    db_instance.save_locations([(f"user{i}", TEST_LOCATION) for i in range(5)])
+
+    first = db_instance.export_locations_page(None, 3)
+    rest = db_instance.export_locations_page(first[-1][0], 3)
+    assert [row[0] for row in first + rest] == [f"user{i}" for i in range(5)]
+    assert db_instance.export_locations(["user4", "missing"]) == [("user4", "Test Place", 12.34, 56.78)]
+
+
+def test_locations_in_box_follows_updates(db_instance):
+    db_instance.save_locations([(USERNAME, TEST_LOCATION), ("bob", SimpleLocation(name="Far", lat=-40.0, lon=100.0))])
+    assert db_instance.locations_in_box(12.0, 13.0, 56.0, 57.0) == [(USERNAME, "Test Place", 12.34, 56.78)]
+
+    db_instance.save_location(USERNAME, SimpleLocation(name="Moved", lat=-40.5, lon=100.5))
+    assert db_instance.locations_in_box(12.0, 13.0, 56.0, 57.0) == []
+    assert [row[0] for row in db_instance.locations_in_box(-41.0, -40.0, 100.0, 101.0)] == [USERNAME, "bob"]
+
+
+def test_setup_db_migrates_json_locations(tmp_path):
+    path = str(tmp_path / "legacy.sqlite")
+    with sqlite3.connect(path) as con:
+        con.execute("CREATE TABLE users (username TEXT PRIMARY KEY)")
+        con.execute("""
+            CREATE TABLE locations (
+                username TEXT PRIMARY KEY,
+                location_json TEXT NOT NULL,
+                FOREIGN KEY (username) REFERENCES users(username)
+            )
+        """)
+        con.execute("INSERT INTO users VALUES (?)", (USERNAME,))
+        con.execute("INSERT INTO locations VALUES (?, ?)", (USERNAME, TEST_LOCATION.model_dump_json()))
+    con.close()
+
+    db = Database(path)
+    db.setup_db()
+    db.setup_db()  # already migrated, nothing to do
+
+    assert db.get_location(USERNAME) == TEST_LOCATION
+    assert db.locations_in_box(12.0, 13.0, 56.0, 57.0) == [(USERNAME, "Test Place", 12.34, 56.78)]
+    columns = [row[1] for row in db.connect().execute("PRAGMA table_info(locations)")]
+    assert columns == ["id", "username", "name", "lat", "lon"]
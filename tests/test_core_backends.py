@@ -0,0 +1,166 @@
+import asyncio
+from contextlib import asynccontextmanager
+import os
+import time
+import pytest
+import redis.exceptions
+from app.core.backends import CacheBackend, MemoryBackend, SQLiteBackend, RedisBackend, create_backend
+from tests.redis_stub import RedisStub
+
+BACKENDS = ["memory", "sqlite", "redis"]
+
+
+@asynccontextmanager
+async def open_backend(kind, tmp_path):
+    stub = await RedisStub().start() if kind == "redis" else None
+    backend = create_backend(kind, path=str(tmp_path / "cache.sqlite"), url=stub.url if stub else "", max_bytes=2**20)
+    try:
+        yield backend
+    finally:
+        await backend.aclose()
+        if stub is not None:
+            await stub.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", BACKENDS)
+async def test_set_and_get_many(kind, tmp_path):
+    expires_at = time.time() + 60
+    async with open_backend(kind, tmp_path) as backend:
+        await backend.set_many({"a": b"alpha", "b": b"\x00\x01binary"}, expires_at)
+        found = await backend.get_many(["a", "b", "missing"])
+        assert await backend.get_many([]) == {}
+
+    assert found.keys() == {"a", "b"}
+    assert found["a"][0] == b"alpha"
+    assert found["b"][0] == b"\x00\x01binary"
+    assert found["a"][1] == pytest.approx(expires_at)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", BACKENDS)
+async def test_expired_entries_are_not_returned(kind, tmp_path):
+    async with open_backend(kind, tmp_path) as backend:
+        await backend.set_many({"old": b"x"}, time.time() - 1)
+        await backend.set_many({"new": b"y"}, time.time() + 60)
+        assert (await backend.get_many(["old", "new"])).keys() == {"new"}
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts_least_recently_used_over_max_bytes():
+    backend = MemoryBackend(max_bytes=10)
+    expires_at = time.time() + 60
+    await backend.set_many({"a": b"1234", "b": b"1234"}, expires_at)
+    await backend.get_many(["a"])
+    await backend.set_many({"c": b"1234"}, expires_at)
+
+    assert (await backend.get_many(["a", "b", "c"])).keys() == {"a", "c"}
+    assert backend.size == 8
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_sweep_removes_expired():
+    backend = MemoryBackend(max_bytes=100)
+    await backend.set_many({"old": b"x"}, time.time() - 1)
+    await backend.set_many({"new": b"y"}, time.time() + 60)
+    assert await backend.sweep() == 1
+    assert len(backend) == 1 and backend.size == 1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_sweep_removes_expired_then_soonest_expiring_over_limit(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite"), max_bytes=250)
+    now = time.time()
+    await backend.set_many({"expired": b"x" * 100}, now - 1)
+    for i in range(4):
+        await backend.set_many({f"k{i}": b"x" * 100}, now + 60 + i)
+
+    assert await backend.sweep() == 3  # the expired entry, then k0 and k1 to get down to 200 bytes
+    assert (await backend.get_many(["k0", "k1", "k2", "k3"])).keys() == {"k2", "k3"}
+    await backend.aclose()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_sweep_shrinks_the_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    backend = SQLiteBackend(path, max_bytes=2**30)
+    await backend.set_many({f"k{i}": os.urandom(4096) for i in range(200)}, time.time() - 1)
+    backend.connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    full = os.path.getsize(path)
+
+    assert await backend.sweep() == 200
+    backend.connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    assert os.path.getsize(path) < full / 4
+    await backend.aclose()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first, second = SQLiteBackend(path, max_bytes=2**20), SQLiteBackend(path, max_bytes=2**20)
+    await first.set_many({"a": b"shared"}, time.time() + 60)
+    assert (await second.get_many(["a"]))["a"][0] == b"shared"
+    assert first.connect().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    await first.aclose()
+    await second.aclose()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_sets_server_side_expiry():
+    stub = await RedisStub().start()
+    backend = RedisBackend(stub.url, prefix="test:")
+    await backend.set_many({"a": b"alpha"}, time.time() + 60)
+
+    [command] = [c for c in stub.commands if c[0].upper() == b"SET"]
+    assert command[1] == b"test:a"
+    assert command[3].upper() == b"PX" and 59000 <= int(command[4]) <= 60000
+    assert await backend.sweep() == 0
+    await backend.aclose()
+    await stub.stop()
+
+
+@pytest.mark.asyncio
+async def test_sweeping_runs_periodically(tmp_path):
+    backend = MemoryBackend(max_bytes=100)
+    await backend.set_many({"old": b"x"}, time.time() - 1)
+    backend.start_sweeping(0.01)
+    for _ in range(100):
+        if not len(backend):
+            break
+        await asyncio.sleep(0.01)
+    await backend.aclose()
+    assert len(backend) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind", BACKENDS)
+async def test_ping_reaches_the_store(kind, tmp_path):
+    async with open_backend(kind, tmp_path) as backend:
+        await backend.ping()
+    if kind == "sqlite":
+        assert (tmp_path / "cache.sqlite").exists()
+
+
+@pytest.mark.asyncio
+async def test_redis_ping_raises_when_unreachable():
+    stub = await RedisStub().start()
+    url = stub.url
+    await stub.stop()
+    backend = RedisBackend(url)
+    with pytest.raises(redis.exceptions.ConnectionError):
+        await backend.ping()
+    await backend.aclose()
+
+
+def test_create_backend_rejects_unknown_kind():
+    with pytest.raises(ValueError, match="Unknown cache backend"):
+        create_backend("disk", path="", url="", max_bytes=0)
+
+
+def test_backends_must_implement_get_many_and_set_many():
+    class GetOnly(CacheBackend):
+        async def get_many(self, keys):
+            return {}
+
+    with pytest.raises(TypeError, match="set_many"):
+        GetOnly()
@@ -0,0 +1,142 @@
+import gzip
+import time
+import pytest
+from app.core.cache import TTLCache, CachedResponse
+from app.core.compression import CODINGS
+from app.models.weather import DailyWeatherData, PartialDailyWeatherData
+
+
+def test_ttl_cache_hit_and_miss():
+    cache = TTLCache(maxsize=2, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1, expires_at=time.time() - 1)
+    cache.set("b", 2, expires_at=time.time() + 60)
+    assert cache.get("a", "gone") == "gone"
+    assert cache.get("b") == 2
+    assert len(cache) == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_pop_and_clear():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "missing") == "missing"
+    cache.set("b", 2)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_ttl_cache_keeps_expired_entries_for_get_stale():
+    cache = TTLCache(maxsize=2, ttl=60, keep_stale=100)
+    cache.set("a", 1, expires_at=time.time() - 10)
+    assert cache.get("a") is None
+    assert cache.get_stale("a", max_stale=60) == 1
+    assert cache.get_stale("a", max_stale=5) is None
+    cache.set("b", 2, expires_at=time.time() - 200)
+    assert cache.get_stale("b", max_stale=1000) is None
+    assert cache.get("b") is None
+    assert len(cache) == 1  # b was past keep_stale and dropped, a is kept
+
+
+def test_ttl_cache_evicts_by_measured_bytes():
+    cache = TTLCache(maxsize=100, ttl=60, max_bytes=10, sizeof=len)
+    cache.set("a", [1] * 4)
+    cache.set("b", [1] * 4)
+    assert cache.size == 8
+    cache.get("a")
+    cache.set("c", [1] * 4)
+    assert cache.get("b") is None and cache.size == 8
+
+    # a value that grew since it was stored is counted again when read
+    cache.get("c").extend([1] * 4)
+    cache.get("c")
+    assert cache.get("a") is None and cache.size == 8
+    cache.pop("c")
+    assert cache.size == 0
+
+
+def test_cached_response_keeps_the_body_not_the_model():
+    model = PartialDailyWeatherData(days=[{"timestamp": "2021-01-01", "code": 3, "temperature": 1.5}])
+    entry = CachedResponse(model)
+
+    assert entry.model == model and entry.model is not model
+    assert entry.model.model_dump_json(exclude_unset=True).encode() == entry.body
+    assert entry.nbytes == len(entry.body)
+    gzipped = entry.encoded("gzip")
+    assert entry.nbytes == len(entry.body) + len(gzipped)
+
+
+def test_cached_response_stale_after_expiry():
+    assert not CachedResponse(DailyWeatherData(days=[])).stale
+    assert not CachedResponse(DailyWeatherData(days=[]), expires_at=time.time() + 60).stale
+    assert CachedResponse(DailyWeatherData(days=[]), expires_at=time.time() - 1).stale
+
+
+def test_cached_response_serializes_once():
+    entry = CachedResponse(DailyWeatherData(days=[]))
+    body = entry.body
+    assert body == b'{"days":[]}'
+    assert entry.body is body
+
+
+def test_cached_response_max_age_follows_expiry():
+    assert CachedResponse(DailyWeatherData(days=[])).max_age is None
+    assert 58 <= CachedResponse(DailyWeatherData(days=[]), expires_at=time.time() + 60).max_age <= 60
+    assert CachedResponse(DailyWeatherData(days=[]), expires_at=time.time() - 60).max_age == 0
+
+
+def test_cached_response_etag_is_derived_from_the_body():
+    entry = CachedResponse(DailyWeatherData(days=[]))
+    same = CachedResponse(DailyWeatherData(days=[]), expires_at=time.time() + 60)
+    other = CachedResponse(PartialDailyWeatherData(days=[{"timestamp": "2021-01-01"}]))
+
+    assert entry.etag.startswith('"') and entry.etag.endswith('"')
+    assert entry.etag == same.etag != other.etag
+
+
+def test_cached_response_compresses_once_per_coding():
+    entry = CachedResponse(PartialDailyWeatherData(days=[{"timestamp": "2021-01-01", "code": 0}] * 50))
+    data = entry.encoded("gzip")
+    assert entry.encoded("gzip") is data
+    assert gzip.decompress(data) == entry.body
+    assert len(data) < len(entry.body)
+    with pytest.raises(ValueError, match="Unsupported content coding"):
+        entry.encoded("compress")
+
+
+@pytest.mark.skipif("br" not in CODINGS, reason="brotli is not installed")
+def test_cached_response_brotli():
+    import brotli
+    entry = CachedResponse(PartialDailyWeatherData(days=[{"timestamp": "2021-01-01"}] * 50))
+    assert brotli.decompress(entry.encoded("br")) == entry.body
+
+
+def test_cached_response_packs_floats_as_float32():
+    msgpack = pytest.importorskip("msgpack")
+    entry = CachedResponse(PartialDailyWeatherData(days=[{"timestamp": "2021-01-01", "code": 3, "temperature": 1.0},
+                                                  {"timestamp": "2021-01-02", "temperature": 0.1}]))
+    packed = entry.packed
+
+    assert entry.packed is packed
+    assert b"\xcb" not in packed and packed.count(b"\xca") == 2  # float32 markers only, also for 1.0
+    days = msgpack.unpackb(packed)["days"]
+    assert days[0] == {"timestamp": "2021-01-01", "code": 3, "temperature": 1.0}
+    assert days[1]["temperature"] == pytest.approx(0.1, rel=1e-7)
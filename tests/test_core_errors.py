@@ -1,5 +1,5 @@
 import pytest
-from app.core.errors import AppError, ExternalApiError, MappingError
+from app.core.errors import AppError, ExternalApiError, MappingError, RateLimitExceededError
 
 def test_app_error():
     with pytest.raises(AppError):
@@ -12,3 +12,7 @@ def test_external_api_error():
 def test_mapping_error():
     with pytest.raises(MappingError):
         raise MappingError("Mapping failed")
+
+def test_rate_limit_exceeded_error():
+    with pytest.raises(AppError):
+        raise RateLimitExceededError("Queue full")
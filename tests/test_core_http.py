@@ -0,0 +1,27 @@
+import httpx
+import pytest
+from app.core.http import SharedHttpClient
+
+
+@pytest.mark.asyncio
+async def test_client_is_created_on_first_use_and_replaced_once_closed():
+    shared = SharedHttpClient(headers={"User-Agent": "test"}, timeout=3.0)
+    client = shared.get()
+    assert shared.get() is client
+    assert client.headers["user-agent"] == "test" and client.timeout.read == 3.0
+
+    await shared.aclose()
+    assert client.is_closed and shared.client is None
+    replacement = shared.get()
+    assert replacement is not client
+    await shared.aclose()
+
+
+@pytest.mark.asyncio
+async def test_installed_client_is_used():
+    shared = SharedHttpClient()
+    stub = shared.create(transport=httpx.MockTransport(lambda request: httpx.Response(204)))
+    shared.set(stub)
+    assert (await shared.get().get("https://example.test/")).status_code == 204
+    await shared.aclose()
+    assert stub.is_closed
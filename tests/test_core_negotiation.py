@@ -0,0 +1,47 @@
+from app.core.negotiation import negotiate, negotiate_coding, etag_matches, parse_accept
+
+OFFERS = ["application/json", "application/vnd.test+json"]
+
+
+def test_parse_accept_reads_q_values():
+    assert parse_accept("text/html, application/JSON;q=0.5, */*;q=bad,") == [
+        ("text/html", 1.0), ("application/json", 0.5), ("*/*", 1.0),
+    ]
+
+
+def test_negotiate_defaults_to_first_offer():
+    assert negotiate(None, OFFERS) == "application/json"
+    assert negotiate("", OFFERS) == "application/json"
+    assert negotiate("*/*", OFFERS) == "application/json"
+    assert negotiate("text/html", OFFERS) == "application/json"
+
+
+def test_negotiate_picks_highest_q():
+    assert negotiate("application/vnd.test+json", OFFERS) == "application/vnd.test+json"
+    assert negotiate("application/json;q=0.5, application/vnd.test+json", OFFERS) == "application/vnd.test+json"
+    assert negotiate("application/json, application/vnd.test+json;q=0.9", OFFERS) == "application/json"
+    # ties go to the earlier offer
+    assert negotiate("application/vnd.test+json, application/json", OFFERS) == "application/json"
+
+
+def test_negotiate_prefers_most_specific_range():
+    assert negotiate("application/*;q=0.2, application/vnd.test+json;q=0.8", OFFERS) == "application/vnd.test+json"
+    assert negotiate("*/*;q=0.1, application/json;q=0", OFFERS) == "application/vnd.test+json"
+
+
+def test_negotiate_coding():
+    assert negotiate_coding(None, ("br", "gzip")) is None
+    assert negotiate_coding("gzip, deflate", ("br", "gzip")) == "gzip"
+    assert negotiate_coding("gzip, br", ("br", "gzip")) == "br"
+    assert negotiate_coding("gzip, br;q=0.5", ("br", "gzip")) == "gzip"
+    assert negotiate_coding("*", ("br", "gzip")) == "br"
+    assert negotiate_coding("*;q=0.5, br;q=0", ("br", "gzip")) == "gzip"
+    assert negotiate_coding("identity", ("br", "gzip")) is None
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
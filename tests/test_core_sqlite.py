@@ -0,0 +1,24 @@
+import threading
+from app.core.sqlite import ThreadLocalConnections
+
+
+def test_each_thread_gets_its_own_set_up_connection(tmp_path):
+    setups = []
+
+    def setup(con):
+        con.execute("CREATE TABLE IF NOT EXISTS t (x)")
+        setups.append(con)
+
+    connections = ThreadLocalConnections(str(tmp_path / "test.sqlite"), ["PRAGMA journal_mode=WAL"], setup)
+    con = connections.connect()
+    assert connections.connect() is con
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    thread = threading.Thread(target=connections.connect)
+    thread.start()
+    thread.join()
+    assert len(setups) == 2 and setups[1] is not con
+
+    connections.close()
+    assert connections.connect() is not con
+    connections.close()
@@ -1,14 +1,26 @@
+import io
 import pytest
 import sqlite3
+import time
 from fastapi.testclient import TestClient
 from unittest.mock import patch, AsyncMock, MagicMock
-from app.main import app, db
+from app.main import app, db, locations
+from app.services import geocode, openmeteo
 from app.models.geocode import SimpleLocation
+from app.models.weather import WeatherOverview, HourlyWeatherData, DailyWeatherData
+from app.models.weather import PartialDailyWeatherData, PartialColumnarDailyWeatherData
+from app.core.cache import CachedResponse
 from fastapi.testclient import TestClient
 
 # Use FastAPI test client for sync tests
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def clear_location_cache():
+    locations.cache.clear()
+    yield
+    locations.cache.clear()
+
 # Sample payloads
 SIMPLE_LOCATION = {"lat": 12.34, "lon": 56.78, "name": "Test Place"}
 LOCATION_REQUEST = {
@@ -20,35 +32,242 @@ LOCATION_REQUEST = {
 }
 USER_LOCATION = {"username": "alice", "location": SIMPLE_LOCATION}
 USER = {"username": "alice"}
+OVERVIEW = WeatherOverview(
+    now={"description": "Clear sky", "code": 0, "temperature": 25.0},
+    today={"description": "Clear sky", "code": 0, "temperature_min": 20.0, "temperature_max": 26.0}
+)
 
 @pytest.mark.asyncio
 async def test_weather_routes(monkeypatch):
     # Mock weather service functions
-    async_mock_overview = AsyncMock(return_value={"now": {}, "today": {}})
-    async_mock_hourly = AsyncMock(return_value={"forecast": []})
-    async_mock_daily = AsyncMock(return_value={"days": []})
+    async_mock_overview = AsyncMock(return_value=CachedResponse(OVERVIEW))
+    async_mock_hourly = AsyncMock(return_value=CachedResponse(HourlyWeatherData(forecast=[])))
+    async_mock_daily = AsyncMock(return_value=CachedResponse(DailyWeatherData(days=[])))
 
-    monkeypatch.setattr("app.main.get_overview", async_mock_overview)
-    monkeypatch.setattr("app.main.get_hourly_data", async_mock_hourly)
-    monkeypatch.setattr("app.main.get_daily_data", async_mock_daily)
+    monkeypatch.setattr("app.main.get_overview_response", async_mock_overview)
+    monkeypatch.setattr("app.main.get_hourly_response", async_mock_hourly)
+    monkeypatch.setattr("app.main.get_daily_response", async_mock_daily)
 
     # Test overview route
     resp = client.post("/weather/overview", json=SIMPLE_LOCATION)
     assert resp.status_code == 200
-    assert resp.json() == {"now": {}, "today": {}}
+    assert resp.json() == OVERVIEW.model_dump()
+    assert resp.headers["content-type"] == "application/json"
     async_mock_overview.assert_awaited_once_with(12.34, 56.78)
 
     # Test hourly forecast route
     resp = client.post("/weather/forecast/hourly", json=SIMPLE_LOCATION)
     assert resp.status_code == 200
     assert resp.json() == {"forecast": []}
-    async_mock_hourly.assert_awaited_once_with(12.34, 56.78)
+    async_mock_hourly.assert_awaited_once_with(12.34, 56.78, None, None)
 
     # Test daily forecast route
     resp = client.post("/weather/forecast/daily", json=SIMPLE_LOCATION)
     assert resp.status_code == 200
     assert resp.json() == {"days": []}
-    async_mock_daily.assert_awaited_once_with(12.34, 56.78)
+    async_mock_daily.assert_awaited_once_with(12.34, 56.78, None, None)
+
+def test_forecast_routes_pass_horizon_and_variables(monkeypatch):
+    mock_hourly = AsyncMock(return_value=CachedResponse(HourlyWeatherData(forecast=[])))
+    mock_daily = AsyncMock(return_value=CachedResponse(DailyWeatherData(days=[])))
+    monkeypatch.setattr("app.main.get_hourly_response", mock_hourly)
+    monkeypatch.setattr("app.main.get_daily_response", mock_daily)
+
+    resp = client.post("/weather/forecast/hourly", json={**SIMPLE_LOCATION, "hours": 24, "variables": ["temperature"]})
+    assert resp.status_code == 200
+    mock_hourly.assert_awaited_once_with(12.34, 56.78, 24, ["temperature"])
+
+    resp = client.post("/weather/forecast/daily", json={**SIMPLE_LOCATION, "days": 3, "variables": ["rain", "code"]})
+    assert resp.status_code == 200
+    mock_daily.assert_awaited_once_with(12.34, 56.78, 3, ["rain", "code"])
+
+    # out of range horizons and unknown variables are rejected before any lookup
+    assert client.post("/weather/forecast/hourly", json={**SIMPLE_LOCATION, "hours": 0}).status_code == 422
+    assert client.post("/weather/forecast/daily", json={**SIMPLE_LOCATION, "days": 17}).status_code == 422
+    assert client.post("/weather/forecast/hourly", json={**SIMPLE_LOCATION, "variables": ["wind_gust_max"]}).status_code == 422
+    assert client.post("/weather/forecast/daily", json={**SIMPLE_LOCATION, "variables": []}).status_code == 422
+    assert mock_hourly.await_count == 1 and mock_daily.await_count == 1
+
+def test_forecast_routes_negotiate_columnar_format(monkeypatch):
+    columns = CachedResponse(PartialColumnarDailyWeatherData(timestamp=[]))
+    mock_nested = AsyncMock(return_value=CachedResponse(DailyWeatherData(days=[])))
+    mock_columns = AsyncMock(return_value=columns)
+    monkeypatch.setattr("app.main.get_daily_response", mock_nested)
+    monkeypatch.setattr("app.main.get_daily_columns_response", mock_columns)
+    monkeypatch.setattr("app.main.get_hourly_columns_response", AsyncMock(return_value=columns))
+
+    resp = client.post("/weather/forecast/daily", json={**SIMPLE_LOCATION, "days": 2},
+                       headers={"Accept": "application/json;q=0.5, application/vnd.voltcast.columnar+json"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/vnd.voltcast.columnar+json"
+    assert resp.headers["vary"] == "Accept, Accept-Encoding"
+    assert resp.json() == {"timestamp": []}
+    mock_columns.assert_awaited_once_with(12.34, 56.78, 2, None)
+
+    resp = client.post("/weather/forecast/hourly", json=SIMPLE_LOCATION,
+                       headers={"Accept": "application/vnd.voltcast.columnar+json"})
+    assert resp.headers["content-type"] == "application/vnd.voltcast.columnar+json"
+
+    resp = client.post("/weather/forecast/daily", json=SIMPLE_LOCATION, headers={"Accept": "*/*"})
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.headers["vary"] == "Accept, Accept-Encoding"
+    mock_nested.assert_awaited_once()
+
+def test_weather_get_routes_revalidate_with_etag(monkeypatch):
+    entry = CachedResponse(OVERVIEW, expires_at=time.time() + 600)
+    monkeypatch.setattr("app.main.get_overview_response", AsyncMock(return_value=entry))
+
+    resp = client.get("/weather/overview", params={"lat": 12.34, "lon": 56.78})
+    assert resp.status_code == 200
+    assert resp.json() == OVERVIEW.model_dump()
+    assert resp.headers["etag"] == entry.etag
+    assert resp.headers["cache-control"] in ("max-age=599", "max-age=600")
+
+    resp = client.get("/weather/overview", params={"lat": 12.34, "lon": 56.78}, headers={"If-None-Match": entry.etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["etag"] == entry.etag
+
+    # conditional requests only apply to GET
+    resp = client.post("/weather/overview", json=SIMPLE_LOCATION, headers={"If-None-Match": entry.etag})
+    assert resp.status_code == 200
+
+def test_forecast_get_routes_take_query_parameters(monkeypatch):
+    mock_hourly = AsyncMock(return_value=CachedResponse(HourlyWeatherData(forecast=[])))
+    mock_daily = AsyncMock(return_value=CachedResponse(DailyWeatherData(days=[])))
+    monkeypatch.setattr("app.main.get_hourly_response", mock_hourly)
+    monkeypatch.setattr("app.main.get_daily_response", mock_daily)
+
+    resp = client.get("/weather/forecast/hourly?lat=12.34&lon=56.78&hours=24&variables=temperature&variables=rain")
+    assert resp.status_code == 200
+    mock_hourly.assert_awaited_once_with(12.34, 56.78, 24, ["temperature", "rain"])
+
+    resp = client.get("/weather/forecast/daily", params={"lat": 12.34, "lon": 56.78})
+    assert resp.json() == {"days": []}
+    mock_daily.assert_awaited_once_with(12.34, 56.78, None, None)
+
+    assert client.get("/weather/forecast/hourly?lat=12.34&lon=56.78&hours=0").status_code == 422
+    assert client.get("/weather/forecast/daily?lat=12.34").status_code == 422
+
+def test_large_weather_responses_are_compressed_once(monkeypatch):
+    large = CachedResponse(PartialDailyWeatherData(days=[{"timestamp": "2021-01-01 00:00:00+00:00", "code": 0}] * 100))
+    small = CachedResponse(DailyWeatherData(days=[]))
+    mock_daily = AsyncMock(return_value=large)
+    monkeypatch.setattr("app.main.get_daily_response", mock_daily)
+
+    resp = client.post("/weather/forecast/daily", json=SIMPLE_LOCATION, headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["etag"] == large.etag[:-1] + '-gzip"'
+    assert resp.content == large.body
+    gzipped = large.encoded("gzip")
+    client.post("/weather/forecast/daily", json=SIMPLE_LOCATION, headers={"Accept-Encoding": "gzip"})
+    assert large.encoded("gzip") is gzipped
+
+    resp = client.post("/weather/forecast/daily", json=SIMPLE_LOCATION, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+    assert resp.headers["etag"] == large.etag
+
+    mock_daily.return_value = small
+    resp = client.post("/weather/forecast/daily", json=SIMPLE_LOCATION, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in resp.headers
+
+def test_routes_negotiate_msgpack(monkeypatch):
+    msgpack = pytest.importorskip("msgpack")
+    overview = CachedResponse(OVERVIEW, expires_at=time.time() + 600)
+    columns = CachedResponse(PartialColumnarDailyWeatherData(timestamp=["t"], temperature=[1.5]))
+    monkeypatch.setattr("app.main.get_overview_response", AsyncMock(return_value=overview))
+    monkeypatch.setattr("app.main.get_overview_responses", AsyncMock(return_value=[overview, overview]))
+    monkeypatch.setattr("app.main.get_daily_columns_response", AsyncMock(return_value=columns))
+    msgpack_accept = {"Accept": "application/msgpack", "Accept-Encoding": "gzip"}
+
+    resp = client.get("/weather/overview", params={"lat": 12.34, "lon": 56.78}, headers=msgpack_accept)
+    assert resp.headers["content-type"] == "application/msgpack"
+    assert resp.headers["etag"] == overview.etag[:-1] + '-msgpack"'
+    assert "content-encoding" not in resp.headers
+    assert msgpack.unpackb(resp.content) == OVERVIEW.model_dump()
+    resp = client.get("/weather/overview", params={"lat": 12.34, "lon": 56.78},
+                      headers={**msgpack_accept, "If-None-Match": overview.etag[:-1] + '-msgpack"'})
+    assert resp.status_code == 304
+
+    resp = client.post("/weather/forecast/daily", json=SIMPLE_LOCATION,
+                       headers={"Accept": "application/vnd.voltcast.columnar+msgpack"})
+    assert resp.headers["content-type"] == "application/vnd.voltcast.columnar+msgpack"
+    assert msgpack.unpackb(resp.content) == {"timestamp": ["t"], "temperature": [1.5]}
+
+    resp = client.post("/weather/overview/batch", json=[SIMPLE_LOCATION, SIMPLE_LOCATION], headers=msgpack_accept)
+    assert msgpack.unpackb(resp.content) == [OVERVIEW.model_dump()] * 2
+
+def test_location_routes_negotiate_msgpack(monkeypatch):
+    msgpack = pytest.importorskip("msgpack")
+    location = SimpleLocation(name="Berlin", lat=52.520008, lon=13.404954)
+    monkeypatch.setattr(locations, "get", AsyncMock(return_value=location))
+    monkeypatch.setattr("app.main.locations.export", export_rows("alice", "bob"))
+
+    resp = client.post("/weather/location", json=USER, headers={"Accept": "application/msgpack"})
+    assert resp.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(resp.content) == {"status": "success", "location": location.model_dump()}  # exact doubles
+
+    resp = client.get("/weather/location/export", headers={"Accept": "application/msgpack"})
+    assert resp.headers["content-type"] == "application/msgpack"
+    assert [item["username"] for item in msgpack.Unpacker(io.BytesIO(resp.content))] == ["alice", "bob"]
+
+    resp = client.get("/weather/location/export")
+    assert resp.headers["content-type"] == "application/json"
+    assert [item["username"] for item in resp.json()] == ["alice", "bob"]
+
+def test_weather_routes_mark_stale_responses(monkeypatch):
+    fresh = CachedResponse(OVERVIEW, expires_at=time.time() + 60)
+    stale = CachedResponse(OVERVIEW, expires_at=time.time() - 60)
+    monkeypatch.setattr("app.main.get_overview_response", AsyncMock(return_value=fresh))
+    monkeypatch.setattr("app.main.get_overview_responses", AsyncMock(return_value=[fresh, stale]))
+
+    assert "x-forecast-stale" not in client.post("/weather/overview", json=SIMPLE_LOCATION).headers
+    resp = client.post("/weather/overview/batch", json=[SIMPLE_LOCATION, SIMPLE_LOCATION])
+    assert resp.headers["x-forecast-stale"] == "true"
+
+    monkeypatch.setattr("app.main.get_overview_response", AsyncMock(return_value=stale))
+    resp = client.post("/weather/overview", json=SIMPLE_LOCATION)
+    assert resp.status_code == 200
+    assert resp.headers["x-forecast-stale"] == "true"
+
+def test_overview_stream_route(monkeypatch):
+    from app.core.errors import ExternalApiError
+
+    async def events(lat, lon):
+        yield b"event: overview\ndata: {}\n\n"
+
+    monkeypatch.setattr("app.main.get_overview_response", AsyncMock())
+    monkeypatch.setattr("app.main.get_hourly_response", AsyncMock())
+    monkeypatch.setattr("app.main.forecast_stream.events", events)
+    resp = client.get("/weather/overview/stream", params={"lat": 52.52, "lon": 13.41})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    assert resp.headers["cache-control"] == "no-cache"
+    assert resp.text == "event: overview\ndata: {}\n\n"
+
+    # the forecast is fetched before streaming, so an upstream failure is an ordinary error response
+    monkeypatch.setattr("app.main.get_overview_response", AsyncMock(side_effect=ExternalApiError("external fail")))
+    resp = client.get("/weather/overview/stream", params={"lat": 52.52, "lon": 13.41})
+    assert resp.status_code == 503
+
+@pytest.mark.asyncio
+async def test_weather_batch_routes(monkeypatch):
+    other = {"lat": 48.14, "lon": 11.58, "name": "Other Place"}
+    async_mock_overview = AsyncMock(return_value=[CachedResponse(OVERVIEW), CachedResponse(OVERVIEW)])
+    async_mock_daily = AsyncMock(return_value=[CachedResponse(DailyWeatherData(days=[]))])
+    monkeypatch.setattr("app.main.get_overview_responses", async_mock_overview)
+    monkeypatch.setattr("app.main.get_daily_responses", async_mock_daily)
+
+    resp = client.post("/weather/overview/batch", json=[SIMPLE_LOCATION, other])
+    assert resp.status_code == 200
+    assert resp.json() == [OVERVIEW.model_dump(), OVERVIEW.model_dump()]
+    async_mock_overview.assert_awaited_once_with([(12.34, 56.78), (48.14, 11.58)])
+
+    resp = client.post("/weather/forecast/daily/batch", json=[SIMPLE_LOCATION])
+    assert resp.json() == [{"days": []}]
+
+    resp = client.post("/weather/forecast/hourly/batch", json=[SIMPLE_LOCATION] * 1001)
+    assert resp.status_code == 422
 
 @pytest.mark.asyncio
 async def test_location_search_route(monkeypatch):
@@ -66,7 +285,7 @@ async def test_set_and_get_location_routes(monkeypatch):
     # Mock db methods
     mock_save = MagicMock()
     mock_get = MagicMock(return_value=SimpleLocation(**SIMPLE_LOCATION))
-    monkeypatch.setattr("app.main.db.save_location", mock_save)
+    monkeypatch.setattr("app.main.db.save_locations", mock_save)
     monkeypatch.setattr("app.main.db.get_location", mock_get)
 
     # Test set_location
@@ -74,19 +293,24 @@ async def test_set_and_get_location_routes(monkeypatch):
     assert resp.status_code == 200
     assert resp.json() == {"status": "success", "location": SIMPLE_LOCATION}
 
-    # Check that save_location was called correctly
+    # Check that the write was committed as a batch of one
     mock_save.assert_called_once()
-    saved_username, saved_location = mock_save.call_args[0]
+    [(saved_username, saved_location)] = mock_save.call_args[0][0]
     assert saved_username == "alice"
     assert isinstance(saved_location, SimpleLocation)
     assert saved_location.model_dump() == SIMPLE_LOCATION
 
-    # Test get_location
+    # Test get_location: the saved location was written through to the cache
     resp = client.post("/weather/location", json=USER)
     assert resp.status_code == 200
     assert resp.json() == {"status": "success", "location": SIMPLE_LOCATION}
+    mock_get.assert_not_called()
 
-    mock_get.assert_called_once_with("alice")
+    # other users are read from the database once, then cached
+    for _ in range(2):
+        resp = client.post("/weather/location", json={"username": "bob"})
+        assert resp.json() == {"status": "success", "location": SIMPLE_LOCATION}
+    mock_get.assert_called_once_with("bob")
 
 @pytest.mark.asyncio
 async def test_get_location_no_result(monkeypatch):
@@ -97,9 +321,46 @@ async def test_get_location_no_result(monkeypatch):
     assert resp.status_code == 200
     assert resp.json() == {"status": "error", "message": "no location found"}
 
+def test_set_locations_bulk_route(monkeypatch):
+    mock_save_many = AsyncMock()
+    monkeypatch.setattr("app.main.locations.save_many", mock_save_many)
+
+    resp = client.put("/weather/location/bulk", json=[USER_LOCATION, {"username": "bob", "location": SIMPLE_LOCATION}])
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "success", "count": 2}
+    [(first_user, first_location), (second_user, _)] = mock_save_many.await_args[0][0]
+    assert (first_user, second_user) == ("alice", "bob")
+    assert first_location.model_dump() == SIMPLE_LOCATION
+
+def test_set_locations_bulk_route_limits_size(monkeypatch):
+    monkeypatch.setattr("app.main.locations.save_many", AsyncMock())
+    resp = client.put("/weather/location/bulk", json=[USER_LOCATION] * 10001)
+    assert resp.status_code == 422
+
+def export_rows(*usernames):
+    async def export(usernames_filter=None):
+        for username in usernames_filter or usernames:
+            yield username, SIMPLE_LOCATION["name"], SIMPLE_LOCATION["lat"], SIMPLE_LOCATION["lon"]
+    return export
+
+def test_get_locations_bulk_route_streams_json(monkeypatch):
+    monkeypatch.setattr("app.main.locations.export", export_rows())
+    resp = client.post("/weather/location/bulk", json=[USER, {"username": "bob"}])
+    assert resp.status_code == 200
+    assert resp.json() == [USER_LOCATION, {"username": "bob", "location": SIMPLE_LOCATION}]
+
+def test_export_locations_route(monkeypatch):
+    monkeypatch.setattr("app.main.locations.export", export_rows("alice", 'quote"user'))
+    resp = client.get("/weather/location/export")
+    assert resp.json() == [USER_LOCATION, {"username": 'quote"user', "location": SIMPLE_LOCATION}]
+
+def test_export_locations_route_empty(monkeypatch):
+    monkeypatch.setattr("app.main.locations.export", export_rows())
+    assert client.get("/weather/location/export").json() == []
+
 @pytest.mark.asyncio
 async def test_exception_handlers(monkeypatch):
-    from app.core.errors import MappingError, ExternalApiError
+    from app.core.errors import MappingError, ExternalApiError, RateLimitExceededError
 
     # Test MappingError handler
     resp = client.get("/weather/hello")  # normal route
@@ -109,7 +370,7 @@ async def test_exception_handlers(monkeypatch):
     async def raise_mapping(*args, **kwargs):
         raise MappingError("bad mapping")
 
-    monkeypatch.setattr("app.main.get_overview", raise_mapping)
+    monkeypatch.setattr("app.main.get_overview_response", raise_mapping)
     resp = client.post("/weather/overview", json=SIMPLE_LOCATION)
     assert resp.status_code == 500
     assert resp.json() == {"error": "MappingError", "message": "bad mapping"}
@@ -118,12 +379,22 @@ async def test_exception_handlers(monkeypatch):
     async def raise_external(*args, **kwargs):
         raise ExternalApiError("external fail")
 
-    monkeypatch.setattr("app.main.get_overview", raise_external)
+    monkeypatch.setattr("app.main.get_overview_response", raise_external)
     resp = client.post("/weather/overview", json=SIMPLE_LOCATION)
     assert resp.status_code == 503
     assert resp.json() == {"error": "ExternalApiError", "message": "external fail"}
 
-def test_startup_event_calls_setup_db(monkeypatch):
+    # Manually trigger RateLimitExceededError
+    async def raise_rate_limit(*args, **kwargs):
+        raise RateLimitExceededError("Geocoding queue is full")
+
+    monkeypatch.setattr("app.main.search_location", raise_rate_limit)
+    resp = client.post("/weather/location/search", json=LOCATION_REQUEST)
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "1"
+    assert resp.json() == {"error": "RateLimitExceededError", "message": "Geocoding queue is full"}
+
+def test_lifespan_sets_up_db_and_shared_client(monkeypatch):
     called = {}
 
     # Patch db.setup_db to track if it was called
@@ -131,12 +402,69 @@ def test_startup_event_calls_setup_db(monkeypatch):
         called["yes"] = True
 
     monkeypatch.setattr(db, "setup_db", mock_setup_db)
+    monkeypatch.setattr("app.main.forecast_cache.ping", AsyncMock())
+    monkeypatch.setattr(openmeteo.http_client, "client", None)
+
+    # Entering the client runs the lifespan startup, leaving it the shutdown
+    with TestClient(app):
+        assert called.get("yes") is True
+        shared = geocode.get_http_client()
+        assert not shared.is_closed
+        # created at startup, not by the first forecast request
+        forecast_client = openmeteo.http_client.client
+        assert forecast_client is not None and not forecast_client.is_closed
+
+    assert shared.is_closed
+    assert forecast_client.is_closed
+
+
+def test_location_routes_work_after_a_lifespan_restart(monkeypatch):
+    monkeypatch.setattr(db, "setup_db", lambda: None)
+    monkeypatch.setattr("app.main.forecast_cache.ping", AsyncMock())
+    monkeypatch.setattr("app.main.db.get_location", MagicMock(return_value=SimpleLocation(**SIMPLE_LOCATION)))
+
+    with TestClient(app):
+        pass
+    assert locations.closed
+    with TestClient(app) as live:
+        resp = live.post("/weather/location", json=USER)
+
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "success", "location": SIMPLE_LOCATION}
+
+
+def wait_for_readiness(client, status):
+    for _ in range(200):
+        resp = client.get("/weather/ready")
+        if resp.json()["status"] == status:
+            return resp
+        time.sleep(0.01)
+    raise AssertionError(f"never reached {status}")
+
+def test_ready_route_turns_green_after_warm_up(monkeypatch):
+    monkeypatch.setattr(db, "setup_db", lambda: None)
+    ping = AsyncMock()
+    monkeypatch.setattr("app.main.forecast_cache.ping", ping)
 
-    # Manually trigger startup events
-    for fn in app.router.on_startup:
-        fn()
+    with TestClient(app) as live:
+        resp = wait_for_readiness(live, "ready")
 
-    assert called.get("yes") is True
+    assert resp.status_code == 200
+    ping.assert_awaited_once()
+    assert resp.json()["location_cache"].keys() == {"size", "hits", "misses"}
+    assert client.get("/weather/ready").status_code == 503  # stopped
+
+def test_ready_route_reports_failed_warm_up(monkeypatch):
+    monkeypatch.setattr(db, "setup_db", lambda: None)
+    monkeypatch.setattr("app.main.forecast_cache.ping", AsyncMock(side_effect=ConnectionError("cache unreachable")))
+
+    with TestClient(app) as live:
+        resp = wait_for_readiness(live, "failed")
+
+    assert resp.status_code == 503
+    body = resp.json()
+    assert body.pop("location_cache").keys() == {"size", "hits", "misses"}
+    assert body == {"status": "failed", "message": "cache unreachable"}
 
 
 # ---------- NEW TEST: sqlite3.DatabaseError handler ----------
@@ -1,10 +1,13 @@
-from app.mapper.weather import map_openmeteo_overview
+import pytest
+from app.mapper.weather import map_openmeteo_overview, DAILY_VARIABLES
 from app.models.weather import WeatherOverview
 from unittest.mock import MagicMock
 from app.mapper.weather import map_openmeteo_hourly_forecast
-from app.models.weather import HourlyWeatherData
+from app.models.weather import HourlyWeatherData, PartialHourlyWeatherData
 from app.mapper.weather import map_openmeteo_daily_forecast
 from app.models.weather import DailyWeatherData
+from app.services.openmeteo import decode_weather_api_response
+from tests.openmeteo_fixtures import build_weather_api_message, build_forecast_payload
 
 def test_map_openmeteo_overview_success():
     # Mock the response
@@ -30,7 +33,11 @@ def test_map_openmeteo_overview_success():
 
     def daily_variables(index):
         v = MagicMock()
-        v.ValuesAsNumpy.return_value = [[2, ], [10.0, ], [20.0, ]][index]
+        v.ValuesAsNumpy.return_value = {
+            DAILY_VARIABLES.index("weather_code"): [2, ],
+            DAILY_VARIABLES.index("temperature_2m_min"): [10.0, ],
+            DAILY_VARIABLES.index("temperature_2m_max"): [20.0, ],
+        }[index]
         return v
 
     daily.Variables.side_effect = daily_variables
@@ -120,4 +127,113 @@ def test_map_openmeteo_daily_forecast_success():
     result = map_openmeteo_daily_forecast(response)
     assert isinstance(result, DailyWeatherData)
     assert len(result.days) == 2
-    assert result.days[0].temperature == 15.0
\ No newline at end of file
+    assert result.days[0].temperature == 15.0
+
+def test_map_openmeteo_hourly_forecast_splits_days_in_local_time():
+    # 1 Jan 2021 00:00 UTC in UTC+02:00 starts at 02:00 local, so the first local day has 22 hours
+    payload = build_weather_api_message(utc_offset_seconds=7200, hourly={
+        "time": 1609459200, "time_end": 1609459200 + 48 * 3600, "interval": 3600,
+        "variables": [[3] * 48, [1.5] * 48, [0.0] * 48, [0.0] * 48, [55.9] * 48, [2.0] * 48],
+    })
+    result = map_openmeteo_hourly_forecast(decode_weather_api_response(payload)[0])
+
+    assert [day.timestamp for day in result.forecast] == ["2021-01-01", "2021-01-02", "2021-01-03"]
+    assert [len(day.hours) for day in result.forecast] == [22, 24, 2]
+    first_hour = result.forecast[0].hours[0]
+    assert first_hour.timestamp == "2021-01-01 02:00:00+02:00"
+    assert first_hour.description == "Overcast"
+    assert first_hour.cloud_cover == 55.0  # truncated like int()
+    assert result.forecast[2].hours[-1].timestamp == "2021-01-03 01:00:00+02:00"
+
+
+def test_map_openmeteo_daily_forecast_negative_offset():
+    payload = build_weather_api_message(utc_offset_seconds=-16200, daily={
+        "time": 1609475400, "time_end": 1609475400 + 2 * 86400, "interval": 86400,
+        "variables": [[61, 95], [15.0, 16.0], [0.0, 0.1], [0.0, 0.0], [5.0, 6.0]],
+    })
+    result = map_openmeteo_daily_forecast(decode_weather_api_response(payload)[0])
+
+    assert [day.timestamp for day in result.days] == ["2021-01-01 00:00:00-04:30", "2021-01-02 00:00:00-04:30"]
+    assert [day.description for day in result.days] == ["Slight Rain", "Thunderstorm"]
+    assert result.days[1].rain == pytest.approx(0.1)
+
+
+def test_map_openmeteo_daily_forecast_unknown_code():
+    payload = build_weather_api_message(daily={
+        "time": 1609459200, "time_end": 1609459200 + 86400, "interval": 86400,
+        "variables": [[42], [15.0], [0.0], [0.0], [5.0]],
+    })
+    with pytest.raises(ValueError, match="Unexpected weather code: 42"):
+        map_openmeteo_daily_forecast(decode_weather_api_response(payload)[0])
+
+
+def test_map_openmeteo_hourly_forecast_window_and_variables():
+    payload = build_weather_api_message(utc_offset_seconds=7200, hourly={
+        "time": 1609459200, "time_end": 1609459200 + 48 * 3600, "interval": 3600,
+        "variables": [[3] * 48, list(range(48)), [0.0] * 48, [0.0] * 48, [55.9] * 48, [2.0] * 48],
+    })
+    response = decode_weather_api_response(payload)[0]
+    # 20:30 UTC: the window starts with the 20:00 UTC hour, 22:00 local
+    result = map_openmeteo_hourly_forecast(response, hours=4, variables=["temperature", "cloud_cover"],
+                                           now=1609459200 + 20.5 * 3600)
+
+    assert [day.timestamp for day in result.forecast] == ["2021-01-01", "2021-01-02"]
+    assert [hour.temperature for day in result.forecast for hour in day.hours] == [20.0, 21.0, 22.0, 23.0]
+    assert result.forecast[0].hours[0].timestamp == "2021-01-01 22:00:00+02:00"
+    assert result.model_dump(exclude_unset=True)["forecast"][0]["hours"][0] == {
+        "timestamp": "2021-01-01 22:00:00+02:00", "temperature": 20.0, "cloud_cover": 55.0,
+    }
+    # a variable selection maps to the partial model, a horizon alone to the strict one
+    assert isinstance(result, PartialHourlyWeatherData)
+    assert type(map_openmeteo_hourly_forecast(response, hours=4, now=1609459200)) is HourlyWeatherData
+
+    # a window past the end of the forecast is empty
+    assert map_openmeteo_hourly_forecast(response, hours=4, now=1609459200 + 72 * 3600).forecast == []
+
+
+def test_map_openmeteo_daily_forecast_window_and_variables():
+    payload = build_weather_api_message(daily={
+        "time": 1609459200, "time_end": 1609459200 + 3 * 86400, "interval": 86400,
+        "variables": [[61, 95, 0], [15.0, 16.0, 17.0], [0.0, 0.1, 0.2], [0.0, 0.0, 0.0], [5.0, 6.0, 7.0]],
+    })
+    response = decode_weather_api_response(payload)[0]
+    result = map_openmeteo_daily_forecast(response, days=5, variables=["description"], now=1609459200 + 86400 + 60)
+
+    assert result.model_dump(exclude_unset=True) == {"days": [
+        {"timestamp": "2021-01-02 00:00:00+00:00", "description": "Thunderstorm"},
+        {"timestamp": "2021-01-03 00:00:00+00:00", "description": "Clear sky"},
+    ]}
+    # without a horizon every day is returned, regardless of the time
+    assert len(map_openmeteo_daily_forecast(response, now=1609459200 + 10 * 86400).days) == 3
+
+
+def test_columnar_forecasts_hold_the_same_data():
+    from app.mapper.weather import map_openmeteo_hourly_columns, map_openmeteo_daily_columns
+    response = decode_weather_api_response(build_forecast_payload(days=2, utc_offset_seconds=7200))[0]
+    nested = map_openmeteo_hourly_forecast(response)
+    columns = map_openmeteo_hourly_columns(response)
+
+    hours = [hour for day in nested.forecast for hour in day.hours]
+    assert columns.timestamp == [hour.timestamp for hour in hours]
+    assert columns.days == [day.timestamp for day in nested.forecast]
+    assert columns.day_start == [0, 22, 46]
+    assert columns.temperature == [hour.temperature for hour in hours]
+    assert columns.cloud_cover == [hour.cloud_cover for hour in hours]
+    assert [columns.descriptions[code] for code in columns.code] == [hour.description for hour in hours]
+    assert len(columns.descriptions) == len(set(columns.code))
+
+    daily = map_openmeteo_daily_forecast(response)
+    daily_columns = map_openmeteo_daily_columns(response)
+    assert daily_columns.timestamp == [day.timestamp for day in daily.days]
+    assert daily_columns.wind_gust_max == [day.wind_gust_max for day in daily.days]
+
+
+def test_columnar_forecast_selection_keeps_codes_for_descriptions():
+    from app.mapper.weather import map_openmeteo_hourly_columns
+    response = decode_weather_api_response(build_forecast_payload(days=2))[0]
+    columns = map_openmeteo_hourly_columns(response, hours=24, variables=["description"], now=1609459200 + 20 * 3600)
+
+    assert columns.model_fields_set == {"timestamp", "days", "day_start", "descriptions", "code"}
+    assert columns.days == ["2021-01-01", "2021-01-02"] and columns.day_start == [0, 4]
+    assert len(columns.code) == len(columns.timestamp) == 24
+    assert map_openmeteo_hourly_columns(response, hours=5, now=1609459200 + 72 * 3600).day_start == []
@@ -8,7 +8,9 @@ from app.models.weather import (
     DailyHourWeatherData,
     HourlyWeatherData,
     DayWeatherData,
-    DailyWeatherData
+    DailyWeatherData,
+    PartialHourWeatherData,
+    PartialDayWeatherData,
 )
 
 # ----------------------------
@@ -169,3 +171,21 @@ def test_daily_weather_data_success():
 def test_daily_weather_data_wrong_type():
     with pytest.raises(ValidationError):
         DailyWeatherData(days="not a list")
+
+
+# ----------------------------
+# Full vs partial models
+# ----------------------------
+def test_full_models_require_every_variable():
+    with pytest.raises(ValidationError, match="wind_speed"):
+        HourWeatherData(timestamp="2026-01-07T12:00:00Z", description="Sunny", code=100, temperature=20,
+                        rain=0, snowfall=0, cloud_cover=0)
+    with pytest.raises(ValidationError, match="temperature"):
+        DayWeatherData(timestamp="2026-01-07", description="Windy", code=400, temperature=None,
+                       rain=0, snowfall=0, wind_gust_max=15)
+    assert "temperature" in HourWeatherData.model_json_schema()["required"]
+
+def test_partial_models_hold_the_selected_variables_only():
+    hour = PartialHourWeatherData(timestamp="2026-01-07T12:00:00Z", temperature=20)
+    assert hour.model_dump(exclude_unset=True) == {"timestamp": "2026-01-07T12:00:00Z", "temperature": 20.0}
+    assert PartialDayWeatherData.model_json_schema()["required"] == ["timestamp"]
@@ -1,5 +1,6 @@
 import pytest
-from app.models.weatherCodes import WEATHER_CODES, map_weather_code
+import numpy as np
+from app.models.weatherCodes import WEATHER_CODES, map_weather_code, map_weather_codes
 
 # ----------------------------
 # Test all valid codes
@@ -17,3 +18,15 @@ def test_map_weather_code_invalid(invalid_code):
     with pytest.raises(ValueError) as exc_info:
         map_weather_code(invalid_code)
     assert str(invalid_code) in str(exc_info.value)
+
+# ----------------------------
+# Test vectorized lookup
+# ----------------------------
+def test_map_weather_codes_matches_scalar_lookup():
+    codes = np.array(list(WEATHER_CODES))
+    assert map_weather_codes(codes) == [map_weather_code(int(c)) for c in codes]
+
+@pytest.mark.parametrize("invalid_code", [-1, 4, 100])
+def test_map_weather_codes_invalid(invalid_code):
+    with pytest.raises(ValueError, match=f"Unexpected weather code: {invalid_code}"):
+        map_weather_codes(np.array([0, invalid_code]))
@@ -1,6 +1,10 @@
+import asyncio
+import time
 import pytest
-from unittest.mock import patch, AsyncMock, MagicMock
-from app.services.geocode import search_location
+from unittest.mock import patch, AsyncMock
+from app.services.geocode import search_location, set_http_client, create_http_client, get_http_client, GeocodeCache
+from app.services.geocode import RequestScheduler, SearchPriority
+from app.core.errors import RateLimitExceededError
 from app.models.geocode import LocationRequest, Location, SimpleLocation
 import httpx
 from app.core.errors import ExternalApiError
@@ -14,6 +18,32 @@ RAW_API_DATA = [
     }
 ]
 
+
+def use_stub_nominatim(handler):
+    # Swap the shared client for one with a local stub transport
+    set_http_client(create_http_client(transport=httpx.MockTransport(handler)))
+
+
+@pytest.fixture(autouse=True)
+def reset_http_client():
+    yield
+    set_http_client(None)
+
+
+@pytest.fixture(autouse=True)
+def fast_scheduler(monkeypatch):
+    scheduler = RequestScheduler(rate=1000, max_queue=50, max_wait=1)
+    monkeypatch.setattr("app.services.geocode.nominatim_scheduler", scheduler)
+    return scheduler
+
+
+@pytest.fixture(autouse=True)
+def isolated_geocode_cache(tmp_path, monkeypatch):
+    cache = GeocodeCache(str(tmp_path / "geocode"))
+    monkeypatch.setattr("app.services.geocode.geocode_cache", cache)
+    yield cache
+    cache.close()
+
 @pytest.mark.asyncio
 async def test_search_location_success():
     request = LocationRequest(
@@ -44,17 +74,8 @@ async def test_search_location_success():
             )
         ]
 
-        # Patch async client correctly
-        async_mock_client = AsyncMock()
-        mock_resp = MagicMock()
-        mock_resp.raise_for_status.return_value = None
-        mock_resp.json.return_value = RAW_API_DATA
-        async_mock_client.get = AsyncMock(return_value=mock_resp)
-        async_mock_client.__aenter__.return_value = async_mock_client
-        async_mock_client.__aexit__.return_value = None
-
-        with patch("httpx.AsyncClient", return_value=async_mock_client):
-            result = await search_location(request)
+        use_stub_nominatim(lambda request: httpx.Response(200, json=RAW_API_DATA))
+        result = await search_location(request)
 
     assert len(result) == 1
     assert result[0].name == "Main St 123, Townsville, Countryland"
@@ -80,16 +101,8 @@ async def test_search_location_no_results():
         ]
         mock_to_simple.return_value = []
 
-        async_mock_client = AsyncMock()
-        mock_resp = MagicMock()
-        mock_resp.raise_for_status.return_value = None
-        mock_resp.json.return_value = [{"address": {}}]
-        async_mock_client.get = AsyncMock(return_value=mock_resp)
-        async_mock_client.__aenter__.return_value = async_mock_client
-        async_mock_client.__aexit__.return_value = None
-
-        with patch("httpx.AsyncClient", return_value=async_mock_client):
-            result = await search_location(request)
+        use_stub_nominatim(lambda request: httpx.Response(200, json=[{"address": {}}]))
+        result = await search_location(request)
 
     # No valid house_number, should return empty list
     assert result == []
@@ -105,23 +118,9 @@ async def test_search_location_http_error():
         country="Errland"
     )
 
-    # Mock response object (synchronous .raise_for_status and .json)
-    mock_response = MagicMock()
-    error_response = MagicMock()
-    error_response.status_code = 500
-    http_error = httpx.HTTPStatusError("Server error", request=None, response=error_response)
-    mock_response.raise_for_status.side_effect = http_error
-    mock_response.json.return_value = []  # irrelevant, raise_for_status triggers first
-
-    # AsyncClient (async context manager)
-    async_client_mock = AsyncMock()
-    async_client_mock.__aenter__.return_value = async_client_mock
-    async_client_mock.__aexit__.return_value = None
-    async_client_mock.get.return_value = mock_response  # get() returns mock_response
-
-    with patch("httpx.AsyncClient", return_value=async_client_mock):
-        with pytest.raises(ExternalApiError) as exc_info:
-            await search_location(request)
+    use_stub_nominatim(lambda request: httpx.Response(500, json=[]))
+    with pytest.raises(ExternalApiError) as exc_info:
+        await search_location(request)
 
     assert "Geocoding API returned 500" in str(exc_info.value)
 
@@ -136,14 +135,12 @@ async def test_search_location_request_error():
         country="Failland"
     )
 
-    async_mock_client = AsyncMock()
-    async_mock_client.get = AsyncMock(side_effect=httpx.RequestError("Connection failed", request=None))
-    async_mock_client.__aenter__.return_value = async_mock_client
-    async_mock_client.__aexit__.return_value = None
+    def handler(request):
+        raise httpx.ConnectError("Connection failed", request=request)
 
-    with patch("httpx.AsyncClient", return_value=async_mock_client):
-        with pytest.raises(ExternalApiError) as exc_info:
-            await search_location(request)
+    use_stub_nominatim(handler)
+    with pytest.raises(ExternalApiError) as exc_info:
+        await search_location(request)
 
     assert "Failed to reach geocoding API" in str(exc_info.value)
 
@@ -158,18 +155,200 @@ async def test_search_location_invalid_json():
         country="Badland"
     )
 
-    # mock response with synchronous .json() raising ValueError
-    mock_response = MagicMock()
-    mock_response.raise_for_status.return_value = None
-    mock_response.json.side_effect = ValueError("Invalid JSON")
+    # response body that makes .json() raise ValueError
+    use_stub_nominatim(lambda request: httpx.Response(200, content=b"<html>not json</html>"))
+    with pytest.raises(ExternalApiError) as exc_info:
+        await search_location(request)
+
+    assert "Geocoding API returned invalid JSON" in str(exc_info.value)
+
+@pytest.mark.asyncio
+async def test_search_location_coalesces_identical_requests():
+    request = LocationRequest(street="Main St", houseNumber="123", city="Townsville", postalCode="12345")
+    same_request = LocationRequest(street="main st", houseNumber="123", city="TOWNSVILLE ", postalCode="12345")
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=RAW_API_DATA)
+
+    use_stub_nominatim(handler)
+    results = await asyncio.gather(*(search_location(r) for r in [request, same_request] * 3))
+
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+    assert results[0][0].name == "Main St 123, Townsville, Countryland"
+
+
+@pytest.mark.asyncio
+async def test_shared_client_is_reused_and_identifies_itself():
+    user_agents = []
+
+    def handler(request):
+        user_agents.append(request.headers["user-agent"])
+        return httpx.Response(200, json=[])
+
+    use_stub_nominatim(handler)
+    client = get_http_client()
+    await search_location(LocationRequest(street="A", houseNumber="1", city="B", postalCode="1"))
+    await search_location(LocationRequest(street="C", houseNumber="2", city="D", postalCode="2"))
+
+    assert get_http_client() is client
+    assert user_agents == ["VoltCast-Weather-Microservice"] * 2
+    assert client.timeout.connect == 5.0
+
+
+def counting_handler(calls, data):
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json=data)
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_repeated_search_is_served_from_cache():
+    calls = []
+    use_stub_nominatim(counting_handler(calls, RAW_API_DATA))
+
+    first = await search_location(LocationRequest(street="Main St", houseNumber="123", city="Townsville", postalCode="12345"))
+    second = await search_location(LocationRequest(street=" MAIN  st", houseNumber="123", city="townsville", postalCode="12345"))
+
+    assert len(calls) == 1
+    assert first == second == [SimpleLocation(name="Main St 123, Townsville, Countryland", lat=12.34, lon=56.78)]
+
+
+@pytest.mark.asyncio
+async def test_empty_results_are_cached_and_errors_are_not():
+    calls = []
+    request = LocationRequest(street="Nowhere", houseNumber="0", city="Void", postalCode="00000")
 
-    async_client_mock = AsyncMock()
-    async_client_mock.__aenter__.return_value = async_client_mock
-    async_client_mock.__aexit__.return_value = None
-    async_client_mock.get.return_value = mock_response
+    use_stub_nominatim(lambda r: httpx.Response(503))
+    with pytest.raises(ExternalApiError):
+        await search_location(request)
 
-    with patch("httpx.AsyncClient", return_value=async_client_mock):
-        with pytest.raises(ExternalApiError) as exc_info:
-            await search_location(request)
+    use_stub_nominatim(counting_handler(calls, []))
+    assert await search_location(request) == []
+    assert await search_location(request) == []
+    assert len(calls) == 1
 
-    assert "Geocoding API returned invalid JSON" in str(exc_info.value)
\ No newline at end of file
+
+@pytest.mark.asyncio
+async def test_cache_survives_restart(isolated_geocode_cache, monkeypatch):
+    calls = []
+    request = LocationRequest(street="Main St", houseNumber="123", city="Townsville", postalCode="12345")
+    use_stub_nominatim(counting_handler(calls, RAW_API_DATA))
+    await search_location(request)
+
+    # a fresh process only has the SQLite store
+    monkeypatch.setattr("app.services.geocode.geocode_cache", GeocodeCache(isolated_geocode_cache.db_name[:-len(".sqlite")]))
+    result = await search_location(request)
+
+    assert len(calls) == 1
+    assert result[0].lat == 12.34
+
+
+@pytest.mark.asyncio
+async def test_expired_cache_entries_are_ignored(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "expiring"), ttl=-1)
+    await cache.set(("key",), [])
+    assert await cache.get(("key",)) is None
+    cache.close()
+
+
+def test_cache_store_reuses_its_connection_and_prunes_expired_rows(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "pruned"))
+    con = cache.connect()
+    cache._store('["old"]', "[]", time.time() - 1)
+    cache._store('["new"]', "[]", time.time() + 60)
+
+    assert cache.connect() is con
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert con.execute("SELECT key FROM geocode_results").fetchall() == [('["new"]',)]
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_spaces_requests_to_rate():
+    scheduler = RequestScheduler(rate=20, max_queue=10, max_wait=1)
+    start = asyncio.get_running_loop().time()
+    await asyncio.gather(*(scheduler.acquire() for _ in range(4)))
+    assert asyncio.get_running_loop().time() - start >= 0.14  # 3 intervals of 50 ms
+
+
+@pytest.mark.asyncio
+async def test_scheduler_serves_interactive_before_background():
+    scheduler = RequestScheduler(rate=50, max_queue=10, max_wait=1)
+    order = []
+
+    async def acquire(name, priority):
+        await scheduler.acquire(priority)
+        order.append(name)
+
+    await scheduler.acquire()  # uses the free slot, everyone else queues
+    tasks = [asyncio.create_task(acquire(f"bulk{i}", SearchPriority.BACKGROUND)) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(acquire("user", SearchPriority.INTERACTIVE)))
+    await asyncio.gather(*tasks)
+
+    assert order[0] == "user"
+    assert order[1:] == ["bulk0", "bulk1", "bulk2"]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_sheds_load_when_queue_is_full():
+    scheduler = RequestScheduler(rate=10, max_queue=2, max_wait=1)
+    await scheduler.acquire()
+    queued = [asyncio.create_task(scheduler.acquire()) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(RateLimitExceededError, match="queue is full"):
+        await scheduler.acquire()
+    await asyncio.gather(*queued)
+    assert scheduler.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_sheds_searches_that_would_wait_too_long_right_away():
+    scheduler = RequestScheduler(rate=1, max_queue=50, max_wait=2.5)
+    await scheduler.acquire()
+    queued = [asyncio.create_task(scheduler.acquire()) for _ in range(2)]  # served after 1 s and 2 s
+    await asyncio.sleep(0)
+
+    start = asyncio.get_running_loop().time()
+    with pytest.raises(RateLimitExceededError, match="too long"):
+        await scheduler.acquire()
+    assert asyncio.get_running_loop().time() - start < 0.1
+    assert scheduler.waiting == 2
+    for task in queued:
+        task.cancel()
+    await asyncio.gather(*queued, return_exceptions=True)
+    assert scheduler.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_bounds_waiting_time():
+    scheduler = RequestScheduler(rate=10, max_queue=5, max_wait=0.25)
+    await scheduler.acquire()
+    background = asyncio.create_task(scheduler.acquire(SearchPriority.BACKGROUND))  # expected after 0.1 s
+    await asyncio.sleep(0)
+    # two interactive searches overtake it, pushing it back to 0.3 s
+    interactive = [asyncio.create_task(scheduler.acquire()) for _ in range(2)]
+
+    with pytest.raises(RateLimitExceededError, match="Timed out"):
+        await background
+    await asyncio.gather(*interactive)
+    assert scheduler.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_search_waits_for_scheduler_slot(fast_scheduler):
+    calls = []
+    use_stub_nominatim(counting_handler(calls, RAW_API_DATA))
+    fast_scheduler.acquire = AsyncMock(side_effect=RateLimitExceededError("Geocoding queue is full"))
+
+    with pytest.raises(RateLimitExceededError):
+        await search_location(LocationRequest(street="A", houseNumber="1", city="B", postalCode="1"),
+                              priority=SearchPriority.BACKGROUND)
+    fast_scheduler.acquire.assert_awaited_once_with(SearchPriority.BACKGROUND)
+    assert calls == []
@@ -0,0 +1,235 @@
+import asyncio
+import threading
+import pytest
+from app.Database import Database
+from app.models.geocode import SimpleLocation
+from app.services.locations import LocationStore
+
+BERLIN = SimpleLocation(name="Berlin", lat=52.52, lon=13.405)
+MUNICH = SimpleLocation(name="Munich", lat=48.137, lon=11.575)
+
+
+@pytest.fixture
+def store(tmp_path):
+    db = Database(str(tmp_path / "locations.sqlite"))
+    db.setup_db()
+    store = LocationStore(db)
+    yield store
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_save_then_get(store):
+    await store.save("alice", BERLIN)
+    assert await store.get("alice") == BERLIN
+    assert await store.get("bob") is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_transactions(store, monkeypatch):
+    batches = []
+    save_locations = store.db.save_locations
+
+    def recording_save(items):
+        batches.append(len(items))
+        save_locations(items)
+
+    monkeypatch.setattr(store.db, "save_locations", recording_save)
+    await asyncio.gather(*(store.save(f"user{i}", BERLIN) for i in range(50)))
+
+    assert sum(batches) == 50
+    assert len(batches) < 50
+    assert await store.get("user49") == BERLIN
+
+
+@pytest.mark.asyncio
+async def test_later_write_for_same_user_wins(store):
+    await asyncio.gather(store.save("alice", BERLIN), store.save("alice", MUNICH))
+    assert await store.get("alice") == MUNICH
+
+
+@pytest.mark.asyncio
+async def test_batches_are_capped(store, monkeypatch):
+    store.max_batch = 3
+    batches = []
+    monkeypatch.setattr(store.db, "save_locations", lambda items: batches.append(len(items)))
+
+    await asyncio.gather(*(store.save(f"user{i}", BERLIN) for i in range(7)))
+    assert max(batches) <= 3
+    assert sum(batches) == 7
+
+
+@pytest.mark.asyncio
+async def test_write_error_reaches_every_caller_in_batch(store, monkeypatch):
+    def fail(items):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(store.db, "save_locations", fail)
+    results = await asyncio.gather(store.save("alice", BERLIN), store.save("bob", BERLIN), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_blocking_database_work_stays_off_the_event_loop(store, monkeypatch):
+    release = threading.Event()
+
+    def slow_get(username):
+        release.wait(1)
+        return None
+
+    monkeypatch.setattr(store.db, "get_location", slow_get)
+    read = asyncio.create_task(store.get("alice"))
+    await asyncio.sleep(0.05)  # the loop still runs while the read blocks its thread
+    assert not read.done()
+    release.set()
+    assert await read is None
+
+
+@pytest.mark.asyncio
+async def test_save_many_then_export_all_in_pages(store):
+    await store.save_many([(f"user{i:02d}", BERLIN) for i in range(7)])
+
+    rows = [row async for row in store.export(page_size=3)]
+    assert [username for username, *_ in rows] == [f"user{i:02d}" for i in range(7)]
+    assert rows[0] == ("user00", BERLIN.name, BERLIN.lat, BERLIN.lon)
+
+
+@pytest.mark.asyncio
+async def test_export_selected_users_in_request_order(store):
+    await store.save_many([("alice", BERLIN), ("bob", MUNICH)])
+
+    rows = [row async for row in store.export(["bob", "nobody", "alice"], page_size=2)]
+    assert [username for username, *_ in rows] == ["bob", "alice"]
+
+
+@pytest.mark.asyncio
+async def test_find_in_box_and_grid_cell(store):
+    await store.save_many([("alice", BERLIN), ("bob", MUNICH), ("carol", SimpleLocation(name="Near", lat=52.5249, lon=13.4049))])
+
+    rows = await store.find_in_box(52.0, 53.0, 13.0, 14.0)
+    assert [username for username, *_ in rows] == ["alice", "carol"]
+    assert [username for username, *_ in await store.find_in_cell(52.521, 13.401)] == ["alice", "carol"]
+    assert await store.find_in_cell(0.0, 0.0) == []
+
+
+@pytest.mark.asyncio
+async def test_get_is_read_through_cached(store, monkeypatch):
+    store.db.save_locations([("alice", BERLIN)])
+    reads = []
+    get_location = store.db.get_location
+    monkeypatch.setattr(store.db, "get_location", lambda username: reads.append(username) or get_location(username))
+
+    assert await store.get("alice") == BERLIN
+    assert await store.get("alice") == BERLIN
+    assert await store.get("nobody") is None
+    assert await store.get("nobody") is None
+
+    assert reads == ["alice", "nobody"]
+    assert store.stats == {"size": 2, "hits": 2, "misses": 2}
+
+
+@pytest.mark.asyncio
+async def test_cached_entries_expire_to_see_saves_of_other_workers(tmp_path):
+    db = Database(str(tmp_path / "shared.sqlite"))
+    db.setup_db()
+    store = LocationStore(db, cache_ttl=0.2, miss_ttl=0.05)
+    other = LocationStore(Database(db.db_name))
+
+    assert await store.get("alice") is None
+    await other.save("alice", BERLIN)
+    await asyncio.sleep(0.1)
+    assert await store.get("alice") == BERLIN  # the miss has expired
+    await other.save("alice", MUNICH)
+    assert await store.get("alice") == BERLIN  # the hit has not
+    await asyncio.sleep(0.2)
+    assert await store.get("alice") == MUNICH
+
+    store.close()
+    other.close()
+
+
+@pytest.mark.asyncio
+async def test_saves_write_through(store, monkeypatch):
+    assert await store.get("alice") is None
+    await store.save("alice", BERLIN)
+    await store.save_many([("bob", MUNICH)])
+
+    monkeypatch.setattr(store.db, "get_location", lambda username: pytest.fail("read from database"))
+    assert await store.get("alice") == BERLIN
+    assert await store.get("bob") == MUNICH
+
+
+@pytest.mark.asyncio
+async def test_read_racing_a_write_is_not_cached(store, monkeypatch):
+    await store.save("alice", BERLIN)
+    store.cache.clear()
+    started, release = threading.Event(), threading.Event()
+    get_location = store.db.get_location
+
+    def slow_get(username):
+        location = get_location(username)
+        started.set()
+        release.wait(1)
+        return location
+
+    monkeypatch.setattr(store.db, "get_location", slow_get)
+    read = asyncio.create_task(store.get("alice"))
+    await asyncio.to_thread(started.wait, 1)
+    await store.save("alice", MUNICH)
+    release.set()
+
+    assert await read == BERLIN  # read before the write committed
+    assert await store.get("alice") == MUNICH
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded(store):
+    store.cache.maxsize = 2
+    await store.save_many([("alice", BERLIN), ("bob", BERLIN), ("carol", BERLIN)])
+    assert len(store.cache) == 2
+
+
+@pytest.mark.asyncio
+async def test_aclose_commits_queued_writes(tmp_path):
+    db = Database(str(tmp_path / "closing.sqlite"))
+    db.setup_db()
+    store = LocationStore(db)
+    saves = [asyncio.create_task(store.save(f"user{i}", BERLIN)) for i in range(3)]
+    await asyncio.sleep(0)
+    await store.aclose()
+
+    await asyncio.gather(*saves)
+    assert Database(db.db_name).get_location("user2") == BERLIN
+    with pytest.raises(RuntimeError, match="closed"):
+        await store.save("alice", BERLIN)
+
+    store.open()
+    await store.save("alice", BERLIN)
+    assert await store.get("alice") == BERLIN
+    await store.aclose()
+
+
+@pytest.mark.asyncio
+async def test_close_rejects_queued_writes_instead_of_reopening_the_pool(store, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    save_locations = store.db.save_locations
+
+    def slow_save(items):
+        started.set()
+        release.wait(1)
+        save_locations(items)
+
+    monkeypatch.setattr(store.db, "save_locations", slow_save)
+    first = asyncio.create_task(store.save("alice", BERLIN))
+    await asyncio.to_thread(started.wait, 1)
+    queued = asyncio.create_task(store.save("bob", MUNICH))
+    await asyncio.sleep(0)
+    release.set()
+    store.close()
+
+    await first  # was already running, so it is committed
+    with pytest.raises(RuntimeError, match="closed"):
+        await queued
+    assert store.closed and store._writer._shutdown
+    with pytest.raises(RuntimeError, match="closed"):
+        await store.get("carol")
@@ -0,0 +1,175 @@
+import asyncio
+import httpx
+import pytest
+from app.core.errors import ExternalApiError
+from app.core.backends import SQLiteBackend
+from app.services.openmeteo import OpenMeteoClient, decode_weather_api_response, encode_params
+from tests.openmeteo_fixtures import build_weather_api_message
+
+URL = "https://api.open-meteo.com/v1/forecast"
+PARAMS = {"current": ["weather_code", "temperature_2m"], "latitude": "12.34", "longitude": "56.78"}
+PAYLOAD = build_weather_api_message(lat=12.34, lon=56.78, current={"time": 0, "variables": [3, 21.5]})
+
+
+def make_client(tmp_path, handler, retries=2):
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return OpenMeteoClient(SQLiteBackend(str(tmp_path / "cache.sqlite"), max_bytes=2**20), expire_after=60, retries=retries,
+                           backoff_factor=0, http_client=http_client)
+
+
+def test_encode_params_joins_lists_and_requests_flatbuffers():
+    query = encode_params(PARAMS)
+    assert query["current"] == "weather_code,temperature_2m"
+    assert query["latitude"] == "12.34"
+    assert query["format"] == "flatbuffers"
+
+
+def test_decode_weather_api_response_multiple_locations():
+    data = PAYLOAD + build_weather_api_message(lat=1.0, lon=2.0)
+    responses = decode_weather_api_response(data)
+    assert len(responses) == 2
+    assert responses[0].Current().Variables(1).Value() == 21.5
+    assert responses[1].Latitude() == 1.0
+
+
+def test_decode_weather_api_response_stream_error():
+    with pytest.raises(ExternalApiError, match="Unexpected"):
+        decode_weather_api_response(b"Unexpected error while streaming")
+
+
+@pytest.mark.asyncio
+async def test_weather_api_fetches_once_then_uses_cache(tmp_path):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, content=PAYLOAD)
+
+    client = make_client(tmp_path, handler)
+    first = await client.weather_api(URL, PARAMS)
+    second = await client.weather_api(URL, PARAMS)
+
+    assert len(calls) == 1
+    assert calls[0].url.params["format"] == "flatbuffers"
+    assert first[0].Current().Variables(0).Value() == 3
+    assert second[0].Current().Variables(1).Value() == 21.5
+
+
+@pytest.mark.asyncio
+async def test_weather_api_retries_server_errors(tmp_path):
+    statuses = iter([502, 500, 200])
+
+    def handler(request):
+        status = next(statuses)
+        return httpx.Response(status, content=PAYLOAD if status == 200 else b"")
+
+    client = make_client(tmp_path, handler)
+    responses = await client.weather_api(URL, PARAMS)
+    assert len(responses) == 1
+
+
+@pytest.mark.asyncio
+async def test_weather_api_gives_up_after_retries(tmp_path):
+    def handler(request):
+        raise httpx.ConnectError("boom", request=request)
+
+    client = make_client(tmp_path, handler)
+    with pytest.raises(ExternalApiError, match="Failed to reach weather API"):
+        await client.weather_api(URL, PARAMS)
+
+
+@pytest.mark.asyncio
+async def test_weather_api_client_error_reason(tmp_path):
+    def handler(request):
+        return httpx.Response(400, json={"error": True, "reason": "Latitude must be in range"})
+
+    client = make_client(tmp_path, handler)
+    with pytest.raises(ExternalApiError, match="400: Latitude must be in range"):
+        await client.weather_api(URL, PARAMS)
+
+
+@pytest.mark.asyncio
+async def test_weather_api_does_not_block_event_loop(tmp_path):
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, content=PAYLOAD)
+
+    client = make_client(tmp_path, handler)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    await client.weather_api(URL, PARAMS)
+    task.cancel()
+    assert ticks >= 10
+
+
+def multi_location_handler(calls):
+    def handler(request):
+        calls.append(request)
+        lats = request.url.params["latitude"].split(",")
+        lons = request.url.params["longitude"].split(",")
+        content = b"".join(
+            build_weather_api_message(lat=float(lat), lon=float(lon)) for lat, lon in zip(lats, lons)
+        )
+        return httpx.Response(200, content=content)
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_fetch_many_requests_only_cache_misses_in_one_call(tmp_path):
+    calls = []
+    client = make_client(tmp_path, multi_location_handler(calls))
+    params = {"current": ["weather_code"]}
+    await client.fetch(URL, {**params, "latitude": "1.0", "longitude": "2.0"})
+
+    payloads = await client.fetch_many(URL, params, [("1.0", "2.0"), ("3.0", "4.0"), ("5.0", "6.0"), ("3.0", "4.0")])
+
+    assert len(calls) == 2
+    assert calls[1].url.params["latitude"] == "3.0,5.0"
+    assert [decode_weather_api_response(p.content)[0].Latitude() for p in payloads] == [1.0, 3.0, 5.0, 3.0]
+
+    # each location is cached on its own and shared with single-location lookups
+    single = await client.fetch(URL, {**params, "latitude": "5.0", "longitude": "6.0"})
+    assert len(calls) == 2
+    assert single.content == payloads[2].content
+
+
+@pytest.mark.asyncio
+async def test_fetch_many_splits_large_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.openmeteo.OPENMETEO_MAX_LOCATIONS_PER_REQUEST", 2)
+    calls = []
+    client = make_client(tmp_path, multi_location_handler(calls))
+
+    payloads = await client.fetch_many(URL, {}, [(str(i), "0") for i in range(5)])
+
+    assert len(calls) == 3
+    assert len(payloads) == 5
+
+
+@pytest.mark.asyncio
+async def test_fetch_many_rejects_incomplete_response(tmp_path):
+    client = make_client(tmp_path, lambda request: httpx.Response(200, content=PAYLOAD))
+    with pytest.raises(ExternalApiError, match="returned 1 locations, expected 2"):
+        await client.fetch_many(URL, {}, [("1.0", "2.0"), ("3.0", "4.0")])
+
+
+@pytest.mark.asyncio
+async def test_fetch_many_refresh_bypasses_cache_and_peek_never_calls_upstream(tmp_path):
+    calls = []
+    client = make_client(tmp_path, multi_location_handler(calls))
+    coordinates = [("1.0", "2.0"), ("3.0", "4.0")]
+
+    assert await client.peek_many(URL, {}, coordinates) == [None, None]
+    first = await client.fetch_many(URL, {}, coordinates)
+    refreshed = await client.fetch_many(URL, {}, coordinates, refresh=True)
+    peeked = await client.peek_many(URL, {}, coordinates)
+
+    assert len(calls) == 2
+    assert refreshed[0].expires_at >= first[0].expires_at
+    assert peeked == refreshed
@@ -0,0 +1,129 @@
+import asyncio
+import time
+import pytest
+from app.core.errors import ExternalApiError
+from app.Database import Database
+from app.models.geocode import SimpleLocation
+from app.services.locations import LocationStore
+from app.services.openmeteo import CachedPayload
+from app.services.prewarm import PrewarmScheduler
+
+
+@pytest.fixture
+def store(tmp_path):
+    db = Database(str(tmp_path / "locations.sqlite"))
+    db.setup_db()
+    store = LocationStore(db)
+    yield store
+    store.close()
+
+
+class FakeUpstream:
+    """Stands in for the weather service: a raw cache, shared like a sqlite/redis backend, plus refresh calls."""
+
+    def __init__(self, monkeypatch, cached=None, fail=False):
+        self.cached = cached or {}
+        self.calls: list[list] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail = fail
+        monkeypatch.setattr("app.services.prewarm.cached_forecasts", self.cached_forecasts)
+        monkeypatch.setattr("app.services.prewarm.refresh_forecasts", self.refresh_forecasts)
+
+    async def cached_forecasts(self, cells):
+        return [self.cached.get(cell) for cell in cells]
+
+    async def refresh_forecasts(self, cells):
+        self.calls.append(cells)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if self.fail:
+            raise ExternalApiError("Weather API returned 429: Too many requests")
+        payloads = [CachedPayload(b"", time.time() + 1800) for _ in cells]
+        self.cached.update(zip(cells, payloads))
+        return payloads
+
+
+def location(lat, lon):
+    return SimpleLocation(name="Home", lat=lat, lon=lon)
+
+
+@pytest.mark.asyncio
+async def test_refreshes_each_grid_cell_once(store, monkeypatch):
+    upstream = FakeUpstream(monkeypatch)
+    await store.save_many([("alice", location(52.5201, 13.4012)), ("bob", location(52.5199, 13.3991)),
+                           ("carol", location(48.137, 11.575))])
+    scheduler = PrewarmScheduler(store)
+
+    assert await scheduler.run_once() == 2
+    assert sorted(cell for call in upstream.calls for cell in call) == [(48.14, 11.58), (52.52, 13.4)]
+
+    # both cells are fresh now, the next sweep has nothing to do
+    assert await scheduler.run_once() == 0
+    assert len(upstream.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_only_cells_expiring_within_lead_are_refreshed(store, monkeypatch):
+    now = time.time()
+    upstream = FakeUpstream(monkeypatch, cached={
+        (52.52, 13.4): CachedPayload(b"", now + 60),
+        (48.14, 11.58): CachedPayload(b"", now + 1200),
+    })
+    await store.save_many([("alice", location(52.52, 13.4)), ("bob", location(48.14, 11.58))])
+
+    assert await PrewarmScheduler(store, lead=300).run_once() == 1
+    assert upstream.calls == [[(52.52, 13.4)]]
+
+
+@pytest.mark.asyncio
+async def test_cells_another_worker_refreshed_are_skipped(store, monkeypatch):
+    upstream = FakeUpstream(monkeypatch, cached={(52.52, 13.4): CachedPayload(b"", time.time() + 600)})
+    await store.save_many([("alice", location(52.52, 13.4))])
+    workers = [PrewarmScheduler(store, lead=300), PrewarmScheduler(store, lead=300)]
+    # both learn the expiry of the cell while it is not due yet
+    assert [await worker.run_once() for worker in workers] == [0, 0]
+
+    for worker in workers:
+        worker.lead = 900
+    assert [await worker.run_once() for worker in workers] == [1, 0]
+    assert upstream.calls == [[(52.52, 13.4)]]
+
+
+@pytest.mark.asyncio
+async def test_budget_and_concurrency_are_bounded(store, monkeypatch):
+    upstream = FakeUpstream(monkeypatch)
+    await store.save_many([(f"user{i}", location(40 + i, 10)) for i in range(20)])
+    scheduler = PrewarmScheduler(store, interval=60, budget_per_hour=600, concurrency=2, chunk_size=3)
+
+    # 600 per hour allows 10 locations per 60 s sweep
+    assert await scheduler.run_once() == 10
+    assert max(len(call) for call in upstream.calls) == 3
+    assert upstream.max_in_flight == 2
+    assert await scheduler.run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_cells_are_retried_next_sweep(store, monkeypatch):
+    upstream = FakeUpstream(monkeypatch, fail=True)
+    await store.save_many([("alice", location(52.52, 13.4))])
+    scheduler = PrewarmScheduler(store, budget_per_hour=360000)
+
+    assert await scheduler.run_once() == 0
+    assert scheduler.failed == 1
+    upstream.fail = False
+    assert await scheduler.run_once() == 1
+
+
+@pytest.mark.asyncio
+async def test_start_and_stop(store, monkeypatch):
+    FakeUpstream(monkeypatch)
+    await store.save_many([("alice", location(52.52, 13.4))])
+    scheduler = PrewarmScheduler(store, interval=0.01)
+
+    scheduler.start()
+    await asyncio.sleep(0.1)
+    await scheduler.stop()
+    assert scheduler.refreshed == 1
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, patch
+import pytest
+from app.services import weather
+from app.services.openmeteo import CachedPayload
+from app.services.stream import ForecastStream, hourly_delta
+from app.models.weather import HourlyWeatherData
+from tests.openmeteo_fixtures import build_weather_api_message
+
+START = 1609459200
+CELL = (52.52, 13.41)
+
+
+def payload(temperatures, current_temperature=12.5, expires_in=60.0) -> CachedPayload:
+    hours = len(temperatures)
+    content = build_weather_api_message(
+        current={"time": START, "interval": 900, "variables": [3, current_temperature]},
+        hourly={
+            "time": START, "time_end": START + hours * 3600, "interval": 3600,
+            "variables": [[3] * hours, temperatures, [0.0] * hours, [0.0] * hours, [50.0] * hours, [2.0] * hours],
+        },
+        daily={
+            "time": START, "time_end": START + 86400, "interval": 86400,
+            "variables": [[3], [10.0], [0.0], [0.0], [5.0], [8.0], [12.0]],
+        },
+    )
+    return CachedPayload(content, time.time() + expires_in)
+
+
+def parse(event: bytes) -> tuple[str, dict]:
+    name, data = event.decode().strip().split("\n")
+    return name.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    weather.response_cache.clear()
+    yield
+    weather.response_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_subscribers_get_a_snapshot_then_only_changes():
+    stream = ForecastStream(keepalive=0.05, min_refresh_interval=3600)
+    stream.start()
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api, \
+         patch("app.services.weather.forecast_client.fetch_many", new_callable=AsyncMock) as mock_many:
+        mock_api.return_value = payload([1.0, 2.0, 3.0])
+        first, second = stream.events(*CELL), stream.events(52.5201, 13.4099)
+        snapshots = [[parse(await anext(events)) for _ in range(2)] for events in (first, second)]
+
+        # one upstream refresh fans out to both subscribers: the new overview and the one changed hour
+        published = stream.published
+        mock_many.return_value = [payload([1.0, 2.0, 4.0], current_temperature=13.0)]
+        await weather.refresh_forecasts([CELL])
+        changes = [[parse(await anext(events)) for _ in range(2)] for events in (first, second)]
+
+        # same data again: nothing to push, only keepalives
+        await weather.refresh_forecasts([CELL])
+        idle = [await anext(events) for events in (first, second)]
+        published = stream.published - published
+
+        assert stream.connections == 2
+        await first.aclose()
+        await second.aclose()
+
+    assert snapshots[0] == snapshots[1]
+    (overview_event, overview), (hourly_event, hourly) = snapshots[0]
+    assert overview_event == "overview" and overview["now"]["temperature"] == 12.5
+    assert hourly_event == "hourly" and [hour["temperature"] for hour in hourly["hours"]] == [1.0, 2.0, 3.0]
+
+    assert changes[0] == changes[1]
+    assert dict(changes[0])["overview"]["now"]["temperature"] == 13.0
+    assert [hour["temperature"] for hour in dict(changes[0])["hourly"]["hours"]] == [4.0]
+    assert idle == [b": keepalive\n\n"] * 2
+    assert published == 2  # each event is built once, whatever the number of subscribers
+    assert stream.connections == 0 and not stream._watchers
+    await stream.stop()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_disconnected():
+    stream = ForecastStream(queue_size=1, min_refresh_interval=3600)
+    stream.start()
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api, \
+         patch("app.services.weather.forecast_client.fetch_many", new_callable=AsyncMock) as mock_many:
+        mock_api.return_value = payload([1.0])
+        events = stream.events(*CELL)
+        await anext(events)
+        await anext(events)
+        mock_many.return_value = [payload([2.0], current_temperature=20.0)]
+        await weather.refresh_forecasts([CELL])  # overview and hourly change: two events for a queue of one
+
+        with pytest.raises(StopAsyncIteration):
+            await anext(events)
+
+    assert stream.dropped == 1
+    assert stream.connections == 0
+    await stream.stop()
+
+
+@pytest.mark.asyncio
+async def test_one_watcher_refreshes_an_expiring_cell_for_all_subscribers():
+    stream = ForecastStream(keepalive=5, min_refresh_interval=0.01)
+    stream.start()
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api, \
+         patch("app.services.weather.forecast_client.fetch_many", new_callable=AsyncMock) as mock_many:
+        mock_api.return_value = payload([1.0], expires_in=0.05)
+        mock_many.return_value = [payload([1.0], current_temperature=14.0)]
+        subscribers = [stream.events(*CELL) for _ in range(3)]
+        for events in subscribers:
+            await anext(events)
+            await anext(events)
+
+        updates = await asyncio.wait_for(asyncio.gather(*(anext(events) for events in subscribers)), 2)
+        for events in subscribers:
+            await events.aclose()
+
+    assert mock_many.await_count == 1
+    assert mock_many.await_args.kwargs["refresh"] is True
+    assert all(parse(update) == ("overview", parse(updates[0])[1]) for update in updates)
+    assert parse(updates[0])[1]["now"]["temperature"] == 14.0
+    await stream.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_ends_open_streams():
+    stream = ForecastStream(min_refresh_interval=3600)
+    stream.start()
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api:
+        mock_api.return_value = payload([1.0])
+        events = stream.events(*CELL)
+        await anext(events)
+        await anext(events)
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0)
+        await stream.stop()
+        with pytest.raises(StopAsyncIteration):
+            await pending
+
+    assert stream.publish not in weather.response_listeners
+
+
+def test_hourly_delta_lists_new_and_changed_hours():
+    def hour(timestamp, temperature):
+        return {"timestamp": timestamp, "description": "Overcast", "code": 3, "temperature": temperature,
+                "rain": 0.0, "snowfall": 0.0, "cloud_cover": 50.0, "wind_speed": 2.0}
+
+    def forecast(*hours):
+        return HourlyWeatherData.model_validate({"forecast": [{"timestamp": "2021-01-01", "hours": [
+            hour(timestamp, temperature) for timestamp, temperature in hours
+        ]}]})
+
+    previous = forecast(("00:00", 1.0), ("01:00", 2.0))
+    assert hourly_delta(previous, previous) is None
+    assert json.loads(hourly_delta(previous, forecast(("01:00", 2.5), ("02:00", 3.0)))) == {"hours": [
+        hour("01:00", 2.5), hour("02:00", 3.0),
+    ]}
@@ -1,4 +1,5 @@
-from app.services.utils import build_geocode_params
+import pytest
+from app.services.utils import build_geocode_params, snap_coordinate, geocode_cache_key
 from app.services.config import GEOCODE_DEFAULT_PARAMS
 
 def test_build_geocode_params_without_country():
@@ -37,4 +38,26 @@ def test_build_geocode_params_with_country():
 
     # default params must still be present
     for key, value in GEOCODE_DEFAULT_PARAMS.items():
-        assert params[key] == value
\ No newline at end of file
+        assert params[key] == value
+
+@pytest.mark.parametrize("value,step,expected", [
+    (52.52437, 0.01, 52.52),
+    (52.5151, 0.01, 52.52),
+    (-13.40499, 0.01, -13.4),
+    (13.41, 0.25, 13.5),
+    (13.41234, 0, 13.41234),
+])
+def test_snap_coordinate(value, step, expected):
+    assert snap_coordinate(value, step) == expected
+
+
+def test_snap_coordinate_nearby_points_share_key():
+    # two users ~10 m apart end up in the same cell
+    assert str(snap_coordinate(48.13743)) == str(snap_coordinate(48.13751)) == "48.14"
+
+
+def test_geocode_cache_key_normalizes_case_and_whitespace():
+    a = build_geocode_params("Main  St", "42", " Berlin", "10115", "DE")
+    b = build_geocode_params("main st", "42 ", "BERLIN", "10115", "de")
+    assert geocode_cache_key(a) == geocode_cache_key(b)
+    assert geocode_cache_key(a) != geocode_cache_key(build_geocode_params("Main St", "43", "Berlin", "10115", "DE"))
@@ -1,19 +1,37 @@
+import asyncio
+import time
 from unittest.mock import AsyncMock, MagicMock
-from app.services.weather import get_overview, get_hourly_data, get_daily_data, api_call_overview, api_call_hourly_forecast, api_call_daily_forecast
-from app.models.weather import WeatherOverview, HourlyWeatherData, DailyWeatherData
+from app.services.weather import get_overview, get_hourly_data, get_daily_data, api_call_forecast, get_overview_response, get_hourly_response, get_daily_response, get_hourly_columns_response, get_daily_columns_response, get_overview_responses, response_cache, refresh_forecasts, response_flights, revalidating, revalidation_tasks
+from app.models.weather import WeatherOverview, HourlyWeatherData, DailyWeatherData, ColumnarHourlyWeatherData, ColumnarDailyWeatherData
+from app.mapper.weather import map_openmeteo_overview
 import pytest
+import httpx
 from unittest.mock import patch
+from app.core.backends import SQLiteBackend
+from app.services.openmeteo import OpenMeteoClient, CachedPayload
+from app.services.config import RESPONSE_STALE_WHILE_REVALIDATE, RESPONSE_STALE_IF_ERROR
+from app.core.errors import ExternalApiError
+from tests.openmeteo_fixtures import build_forecast_payload
+
+PAYLOAD = CachedPayload(build_forecast_payload(), time.time() + 60)
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    response_cache.clear()
+    yield
+    response_cache.clear()
 
 
 @pytest.mark.asyncio
 async def test_get_overview_success():
     lat, lon = 12.34, 56.78
 
-    # Mock response object
-    mock_response = MagicMock()
+    # Mock payload object
+    mock_response = PAYLOAD
 
-    # Patch api_call_overview to return our mock response
-    with patch("app.services.weather.api_call_overview", new_callable=AsyncMock) as mock_api:
+    # Patch api_call_forecast to return our mock response
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api:
         mock_api.return_value = mock_response
 
         # Patch the mapper to just return a dummy WeatherOverview
@@ -34,9 +52,9 @@ async def test_get_overview_success():
 async def test_get_hourly_data_success():
     lat, lon = 12.34, 56.78
 
-    mock_response = MagicMock()
+    mock_response = PAYLOAD
 
-    with patch("app.services.weather.api_call_hourly_forecast", new_callable=AsyncMock) as mock_api:
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api:
         mock_api.return_value = mock_response
 
         with patch("app.services.weather.map_openmeteo_hourly_forecast") as mock_mapper:
@@ -52,9 +70,9 @@ async def test_get_hourly_data_success():
 async def test_get_daily_data_success():
     lat, lon = 12.34, 56.78
 
-    mock_response = MagicMock()
+    mock_response = PAYLOAD
 
-    with patch("app.services.weather.api_call_daily_forecast", new_callable=AsyncMock) as mock_api:
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api:
         mock_api.return_value = mock_response
 
         with patch("app.services.weather.map_openmeteo_daily_forecast") as mock_mapper:
@@ -66,30 +84,247 @@ async def test_get_daily_data_success():
     assert isinstance(result, DailyWeatherData)
 
 @pytest.mark.asyncio
-async def test_api_call_overview_direct():
-    # Patch the client's weather_api method
-    with patch("app.services.weather.overview_client.weather_api") as mock_api:
-        mock_api.return_value = [{"foo": "bar"}]  # dummy API response
-        result = await api_call_overview(12.34, 56.78)
+async def test_api_call_forecast_direct():
+    with patch("app.services.weather.forecast_client.fetch", new_callable=AsyncMock) as mock_api:
+        mock_api.return_value = PAYLOAD
+        result = await api_call_forecast(12.34, 56.78)
+
+    assert result == PAYLOAD
+    params = mock_api.call_args.kwargs["params"]
+    assert params["latitude"] == "12.34"
+    assert {"current", "hourly", "daily"} <= params.keys()
+
+
+@pytest.mark.asyncio
+async def test_api_call_forecast_snaps_coordinates():
+    with patch("app.services.weather.forecast_client.fetch", new_callable=AsyncMock) as mock_api:
+        mock_api.return_value = PAYLOAD
+        await api_call_forecast(12.34449, 56.78012)
+        await api_call_forecast(12.33951, 56.77988)
+
+    first, second = (call.kwargs["params"] for call in mock_api.call_args_list)
+    assert (first["latitude"], first["longitude"]) == ("12.34", "56.78")
+    assert (second["latitude"], second["longitude"]) == ("12.34", "56.78")
+
+
+@pytest.mark.asyncio
+async def test_all_endpoints_share_one_upstream_call(tmp_path):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, content=build_forecast_payload())
+
+    client = OpenMeteoClient(SQLiteBackend(str(tmp_path / "cache.sqlite"), max_bytes=2**20), expire_after=60,
+                             http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    with patch("app.services.weather.forecast_client", client):
+        overview = await get_overview(52.52, 13.41)
+        hourly = await get_hourly_data(52.52, 13.41)
+        daily = await get_daily_data(52.52, 13.41)
+
+    assert len(calls) == 1
+    assert overview.today.temperature_min == 5.0
+    assert overview.today.temperature_max == 15.0
+    assert len(hourly.forecast) == 7
+    assert len(daily.days) == 7
+
+
+@pytest.mark.asyncio
+async def test_mapped_response_is_cached_per_grid_cell():
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api, \
+         patch("app.services.weather.map_openmeteo_overview", wraps=map_openmeteo_overview) as mock_mapper:
+        mock_api.return_value = PAYLOAD
+        first = await get_overview_response(52.5201, 13.4101)
+        second = await get_overview_response(52.5199, 13.4099)
+
+    assert first is second
+    assert mock_api.await_count == 1
+    assert mock_mapper.call_count == 1
+    assert second.body == first.model.model_dump_json().encode()
+
+
+@pytest.mark.asyncio
+async def test_mapped_response_expires_with_upstream_payload():
+    # expired longer ago than the stale-while-revalidate window: refetched before answering
+    expired = CachedPayload(PAYLOAD.content, time.time() - RESPONSE_STALE_WHILE_REVALIDATE - 1)
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api:
+        mock_api.return_value = expired
+        await get_overview_response(52.52, 13.41)
+        await get_overview_response(52.52, 13.41)
+
+    assert mock_api.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_upstream_call():
+    async def slow_fetch(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return PAYLOAD
+
+    with patch("app.services.weather.forecast_client.fetch", side_effect=slow_fetch) as mock_fetch:
+        results = await asyncio.gather(
+            *(get_overview_response(52.52, 13.41) for _ in range(5)),
+            get_hourly_data(52.52, 13.41),
+            get_daily_data(52.52, 13.41),
+        )
+
+    assert mock_fetch.call_count == 1
+    assert all(r is results[0] for r in results[:5])
+
+
+@pytest.mark.asyncio
+async def test_batch_responses_dedupe_cells_and_use_cache():
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_single, \
+         patch("app.services.weather.api_call_forecast_many", new_callable=AsyncMock) as mock_many:
+        mock_single.return_value = PAYLOAD
+        mock_many.side_effect = lambda cells: [PAYLOAD] * len(cells)
+        cached = await get_overview_response(52.52, 13.41)
+
+        entries = await get_overview_responses([(52.52, 13.41), (48.14, 11.58), (48.1401, 11.5799), (50.0, 8.0)])
+
+    mock_many.assert_awaited_once_with([(48.14, 11.58), (50.0, 8.0)])
+    assert entries[0] is cached
+    assert entries[1] is entries[2]
+    assert len(entries) == 4
+
+
+@pytest.mark.asyncio
+async def test_refresh_forecasts_replaces_only_cached_endpoint_entries():
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_single:
+        mock_single.return_value = PAYLOAD
+        stale = await get_overview_response(52.52, 13.41)
+
+    fresh = CachedPayload(PAYLOAD.content, time.time() + 1800)
+    with patch("app.services.weather.forecast_client.fetch_many", new_callable=AsyncMock) as mock_many:
+        mock_many.return_value = [fresh]
+        assert await refresh_forecasts([(52.52, 13.41)]) == [fresh]
+
+    assert mock_many.await_args.kwargs["refresh"] is True
+    assert mock_many.await_args.args[2] == [("52.52", "13.41")]
+    assert len(response_cache) == 1  # hourly and daily were not requested, so are not mapped
+    overview = await get_overview_response(52.52, 13.41)
+    assert overview is not stale
+    assert overview.model == stale.model
+
+
+async def background_refreshes_done():
+    while len(response_flights) or revalidating or revalidation_tasks:
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.asyncio
+async def test_recently_expired_response_is_served_while_revalidating():
+    expired = CachedPayload(PAYLOAD.content, time.time() - 1)
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api:
+        mock_api.return_value = expired
+        first = await get_overview_response(52.52, 13.41)
+        mock_api.return_value = PAYLOAD
+        second = await get_overview_response(52.52, 13.41)
+        third = await get_overview_response(52.52, 13.41)
+        await background_refreshes_done()
+        fresh = await get_overview_response(52.52, 13.41)
+
+    assert second is first and third is first and first.stale
+    assert mock_api.await_count == 2  # one background refresh for both stale hits
+    assert fresh is not first and not fresh.stale
+
 
-    assert result == {"foo": "bar"}
+@pytest.mark.asyncio
+async def test_failed_background_refreshes_are_logged(caplog):
+    expired = CachedPayload(PAYLOAD.content, time.time() - 1)
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api, \
+         patch("app.services.weather.api_call_forecast_many", new_callable=AsyncMock) as mock_many:
+        mock_api.return_value = expired
+        mock_many.side_effect = lambda cells: [expired] * len(cells)
+        await get_overview_response(52.52, 13.41)
+        await get_overview_responses([(48.14, 11.58)])
+
+        mock_api.side_effect = mock_many.side_effect = ExternalApiError("Failed to reach weather API")
+        await get_overview_response(52.52, 13.41)
+        await get_overview_responses([(48.14, 11.58)])
+        assert len(revalidation_tasks) == 1  # held until done, not only by the event loop
+        await background_refreshes_done()
+
+    warnings = [record.getMessage() for record in caplog.records if record.levelname == "WARNING"]
+    assert warnings == [
+        "Revalidating overview response failed: Failed to reach weather API",
+        "Revalidating 1 overview responses failed: Failed to reach weather API",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stale_response_is_served_when_upstream_fails():
+    expired = CachedPayload(PAYLOAD.content, time.time() - RESPONSE_STALE_WHILE_REVALIDATE - 1)
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api:
+        mock_api.return_value = expired
+        cached = await get_overview_response(52.52, 13.41)
+        mock_api.side_effect = ExternalApiError("Failed to reach weather API")
+        assert await get_overview_response(52.52, 13.41) is cached
+
+        # too old to serve: the error reaches the caller
+        response_cache.set(("overview", 52.52, 13.41), cached, expires_at=time.time() - RESPONSE_STALE_IF_ERROR - 1)
+        with pytest.raises(ExternalApiError):
+            await get_overview_response(52.52, 13.41)
+
+
+@pytest.mark.asyncio
+async def test_batch_serves_stale_and_revalidates_in_one_call():
+    expired = CachedPayload(PAYLOAD.content, time.time() - 1)
+    with patch("app.services.weather.api_call_forecast_many", new_callable=AsyncMock) as mock_many:
+        mock_many.side_effect = lambda cells: [expired] * len(cells)
+        first = await get_overview_responses([(52.52, 13.41), (48.14, 11.58)])
+        mock_many.side_effect = lambda cells: [PAYLOAD] * len(cells)
+        second = await get_overview_responses([(52.52, 13.41), (48.14, 11.58)])
+        await background_refreshes_done()
+        third = await get_overview_responses([(52.52, 13.41), (48.14, 11.58)])
+
+    assert second == first
+    assert mock_many.await_count == 2
+    assert mock_many.await_args_list[1].args[0] == [(52.52, 13.41), (48.14, 11.58)]
+    assert not any(entry.stale for entry in third)
+
+
+@pytest.mark.asyncio
+async def test_batch_serves_stale_when_upstream_fails():
+    expired = CachedPayload(PAYLOAD.content, time.time() - RESPONSE_STALE_WHILE_REVALIDATE - 1)
+    with patch("app.services.weather.api_call_forecast_many", new_callable=AsyncMock) as mock_many:
+        mock_many.side_effect = lambda cells: [expired] * len(cells)
+        first = await get_overview_responses([(52.52, 13.41)])
+        mock_many.side_effect = ExternalApiError("Failed to reach weather API")
+        assert await get_overview_responses([(52.52, 13.41)]) == first
+        with pytest.raises(ExternalApiError):
+            await get_overview_responses([(52.52, 13.41), (1.0, 2.0)])
 
 
 @pytest.mark.asyncio
-async def test_api_call_hourly_forecast_direct():
-    with patch("app.services.weather.hourly_forecast_client.weather_api") as mock_api:
-        mock_api.return_value = [{"hour": 1}, {"hour": 2}]  # dummy hourly response
-        result = await api_call_hourly_forecast(12.34, 56.78)
+async def test_selected_forecasts_share_the_upstream_payload():
+    today = int(time.time() // 86400 * 86400)
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api:
+        mock_api.return_value = CachedPayload(build_forecast_payload(start=today), time.time() + 60)
+        full = await get_hourly_response(52.52, 13.41)
+        selected = await get_hourly_response(52.52, 13.41, hours=24, variables=["temperature", "temperature"])
+        again = await get_hourly_response(52.52, 13.41, hours=24, variables=["temperature"])
+        days = await get_daily_response(52.52, 13.41, variables=["code"])
 
-    # Only the first response is returned
-    assert result == {"hour": 1}
+    assert mock_api.await_count == 3  # one per mapped cache entry, all from the same payload
+    assert again is selected and selected is not full
+    assert set(response_cache.get(("hourly", 52.52, 13.41)).model.forecast[0].hours[0].model_fields_set) == {
+        "timestamp", "description", "code", "temperature", "rain", "snowfall", "cloud_cover", "wind_speed"}
+    hours = [hour for day in selected.model.forecast for hour in day.hours]
+    assert len(hours) == 24
+    assert b'"rain"' not in selected.body and b'"temperature"' in selected.body
+    assert days.model.days[0].model_fields_set == {"timestamp", "code"}
 
 
 @pytest.mark.asyncio
-async def test_api_call_daily_forecast_direct():
-    with patch("app.services.weather.daily_forecast_client.weather_api") as mock_api:
-        mock_api.return_value = [{"day": "Monday"}, {"day": "Tuesday"}]  # dummy daily response
-        result = await api_call_daily_forecast(12.34, 56.78)
+async def test_columnar_forecasts_are_cached_apart_from_nested_ones():
+    with patch("app.services.weather.api_call_forecast", new_callable=AsyncMock) as mock_api:
+        mock_api.return_value = PAYLOAD
+        nested = await get_hourly_response(52.52, 13.41)
+        columns = await get_hourly_columns_response(52.52, 13.41)
+        assert await get_hourly_columns_response(52.52, 13.41) is columns
+        daily = await get_daily_columns_response(52.52, 13.41)
 
-    # Only the first response is returned
-    assert result == {"day": "Monday"}
\ No newline at end of file
+    assert isinstance(columns.model, ColumnarHourlyWeatherData) and isinstance(daily.model, ColumnarDailyWeatherData)
+    assert len(columns.model.timestamp) == sum(len(day.hours) for day in nested.model.forecast)
+    assert len(columns.body) < len(nested.body) / 2